@@ -0,0 +1,145 @@
+"""Benchmark the async chat worker against a thread per waiting turn
+
+SESSIONS sessions each send one turn to the stub model at once. In the
+threaded mode every turn blocks its own thread for the whole reply, as a
+Streamlit script thread did; in the worker mode every turn is a job on
+the ChatWorker's single event loop. Both go through the same LLMScheduler.
+Reports wall time, throughput, latency and the peak number of threads.
+
+A second run has every session send a follow-up before the first reply
+finishes, checking that superseded replies are cancelled rather than
+generated to the end. A third sends RATE_LIMITED_SESSIONS turns through
+a scheduler with the app's default limits, where the rate limit binds.
+
+    python -m benchmarks.bench_chat_worker
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stats import latency_summary
+from socialai.chat import ChatSession
+from socialai.chat_worker import JOB_CANCELLED, JOB_DONE, ChatWorker
+from socialai.llm import create_llm
+from socialai.llm_scheduler import DEFAULT_MAX_CONCURRENCY, DEFAULT_RATE_PER_MINUTE, LLMScheduler
+
+SESSIONS = 200
+MAX_CONCURRENCY = 64
+STUB = dict(latency=0.5, tokens_per_second=100, response_tokens=40)
+UNLIMITED_RATE = 1_000_000
+RATE_LIMITED_SESSIONS = 40
+
+
+class ThreadSampler:
+    """Records the peak number of live threads while running"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def make_sessions(llm, scheduler):
+    sessions = []
+    for i in range(SESSIONS):
+        chatbot = ChatSession(llm, "Window")
+        chatbot.scheduler = scheduler
+        chatbot.session_id = f"session-{i}"
+        sessions.append(chatbot)
+    return sessions
+
+
+def report(label, elapsed, latencies, peak_threads, baseline_threads):
+    print(f"{label:<22} {elapsed:6.2f}s  {len(latencies) / elapsed:7.1f} turns/s  "
+          f"threads +{peak_threads - baseline_threads:<4} {latency_summary(latencies)}")
+
+
+def run_threaded(llm, baseline):
+    scheduler = LLMScheduler(max_concurrency=MAX_CONCURRENCY, rate_per_minute=UNLIMITED_RATE)
+    sessions = make_sessions(llm, scheduler)
+
+    def turn(chatbot):
+        started = time.perf_counter()
+        "".join(chatbot.stream(f"Post ideas for {chatbot.session_id}"))
+        return time.perf_counter() - started
+
+    with ThreadSampler() as sampler:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=SESSIONS) as pool:
+            latencies = list(pool.map(turn, sessions))
+        elapsed = time.perf_counter() - started
+    report("thread per turn", elapsed, latencies, sampler.peak, baseline)
+
+
+def run_worker(llm, baseline):
+    scheduler = LLMScheduler(max_concurrency=MAX_CONCURRENCY, rate_per_minute=UNLIMITED_RATE)
+    sessions = make_sessions(llm, scheduler)
+    with ThreadSampler() as sampler:
+        worker = ChatWorker()
+        started = time.perf_counter()
+        jobs = [worker.submit(c.session_id, c, f"Post ideas for {c.session_id}") for c in sessions]
+        latencies = []
+        for job_id in jobs:
+            job = worker.wait(job_id)
+            latencies.append(job['finished'] - job['submitted'])
+        elapsed = time.perf_counter() - started
+    report("async chat worker", elapsed, latencies, sampler.peak, baseline)
+    return worker
+
+
+def run_superseded(llm, worker):
+    scheduler = LLMScheduler(max_concurrency=MAX_CONCURRENCY, rate_per_minute=UNLIMITED_RATE)
+    sessions = make_sessions(llm, scheduler)
+    started = time.perf_counter()
+    first = [worker.submit(c.session_id, c, "First question") for c in sessions]
+    time.sleep(STUB['latency'] / 2)
+    second = [worker.submit(c.session_id, c, "Actually, a different question") for c in sessions]
+    results = [worker.wait(job_id) for job_id in second]
+    elapsed = time.perf_counter() - started
+    cancelled = sum(worker.poll(job_id)['status'] == JOB_CANCELLED for job_id in first)
+    done = sum(job['status'] == JOB_DONE for job in results)
+    turns = sum(len(c.memory.chat_memory.messages) // 2 for c in sessions)
+    print(f"superseded turns:      {cancelled}/{SESSIONS} first replies cancelled, {done}/{SESSIONS} "
+          f"follow-ups answered in {elapsed:.2f}s, {turns} turns saved to memory")
+
+
+def run_rate_limited(llm, worker):
+    scheduler = LLMScheduler()
+    sessions = make_sessions(llm, scheduler)[:RATE_LIMITED_SESSIONS]
+    started = time.perf_counter()
+    jobs = [worker.submit(c.session_id, c, f"Post ideas for {c.session_id}") for c in sessions]
+    results = [worker.wait(job_id, timeout=60) for job_id in jobs]
+    elapsed = time.perf_counter() - started
+    done = sum(job['status'] == JOB_DONE for job in results)
+    print(f"default limits:        {done}/{len(jobs)} answered in {elapsed:.2f}s "
+          f"({DEFAULT_MAX_CONCURRENCY} in flight, {DEFAULT_RATE_PER_MINUTE}/min)")
+
+
+def main():
+    llm = create_llm("stub", **STUB)
+    baseline = threading.active_count()
+    print(f"{SESSIONS} sessions, one turn each; stub {STUB['latency']}s + "
+          f"{STUB['response_tokens']} tokens at {STUB['tokens_per_second']}/s; "
+          f"scheduler allows {MAX_CONCURRENCY} in flight")
+    run_threaded(llm, baseline)
+    worker = run_worker(llm, baseline)
+    run_superseded(llm, worker)
+    run_rate_limited(llm, worker)
+    worker.close()
+
+
+if __name__ == "__main__":
+    main()
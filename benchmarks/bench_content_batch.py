@@ -0,0 +1,42 @@
+"""Benchmark content calendar throughput against the local stub model
+
+    python -m benchmarks.bench_content_batch
+"""
+import time
+from datetime import date, timedelta
+
+from socialai.content_batch import generate_calendar
+from socialai.llm import create_llm
+
+PLATFORMS = ["Facebook", "Twitter", "Instagram"]
+DAYS = 14
+FAKE_LATENCY = 0.25
+UNLIMITED = 1_000_000
+
+
+def run(workers, rate_per_minute):
+    start_day = date(2026, 11, 2)
+    end_day = start_day + timedelta(days=DAYS - 1)
+    llm = create_llm("stub", latency=FAKE_LATENCY, tokens_per_second=UNLIMITED)
+    started = time.perf_counter()
+    first = None
+    count = 0
+    for entry in generate_calendar(llm, {'name': "Stub Bakery"}, PLATFORMS, start_day, end_day,
+                                   workers=workers, rate_per_minute=rate_per_minute):
+        first = first or time.perf_counter() - started
+        count += 1
+    elapsed = time.perf_counter() - started
+    return count, elapsed, first
+
+
+def main():
+    print(f"{DAYS} days x {len(PLATFORMS)} platforms, stub model latency {FAKE_LATENCY * 1000:.0f} ms")
+    for workers, rate in [(1, UNLIMITED), (4, UNLIMITED), (8, UNLIMITED), (16, UNLIMITED), (8, 60)]:
+        count, elapsed, first = run(workers, rate)
+        limit = "none" if rate == UNLIMITED else f"{rate}/min"
+        print(f"workers {workers:>2}  rate limit {limit:>7}: {count} posts in {elapsed:6.2f}s  "
+              f"{count / elapsed * 60:8.1f} posts/min  first result {first:5.2f}s")
+
+
+if __name__ == "__main__":
+    main()
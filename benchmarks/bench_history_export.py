@@ -0,0 +1,109 @@
+"""Benchmark the incremental history export and the offline aggregation
+
+Fills a session store with SESSIONS sessions of TURNS question/reply
+pairs, then compares:
+
+- a full first export against an incremental export of one new turn per
+  session in every tenth session, and against re-serializing every
+  session's full history as a snapshot export would
+- aggregating the exported file (records per second)
+- importing the file into an empty store, and importing it again, which
+  must add nothing
+
+    python -m benchmarks.bench_history_export
+"""
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+
+from socialai.history_export import export_messages, import_messages, read_records
+from socialai.history_stats import aggregate
+from socialai.messages import mentioned_platforms, new_message
+from socialai.session_store import SQLiteSessionStore
+
+SESSIONS = 2000
+TURNS = 10
+PLATFORMS = ("Facebook", "Twitter", "Instagram")
+QUESTIONS = [
+    "What should I post on {} this week?",
+    "How often should a bakery post on {}?",
+    "Write three captions for {} about our new menu",
+    "Which hashtags work best for local businesses?",
+]
+
+
+def add_turn(store, session_id, rng):
+    question = rng.choice(QUESTIONS).format(rng.choice(PLATFORMS))
+    reply = "Here are some ideas. " * rng.randint(5, 60)
+    store.append_messages(session_id, [
+        new_message('user', question, platforms=mentioned_platforms(question, PLATFORMS)),
+        new_message('ai', reply, latency=round(rng.uniform(0.8, 6.0), 3),
+                    first_token_latency=round(rng.uniform(0.2, 0.9), 3), failed=False,
+                    prompt_tokens=rng.randint(200, 1500), response_tokens=len(reply) // 4)
+    ])
+
+
+def snapshot_export(store, path):
+    """The alternative: write every session's full history on every export"""
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        for i in range(SESSIONS):
+            session_id = f"session-{i}"
+            for msg in store.load_messages(session_id, limit=store.count_messages(session_id)):
+                out.write(json.dumps({'session_id': session_id, **msg}) + "\n")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "sessions.sqlite3"))
+        for i in range(SESSIONS):
+            for _ in range(TURNS):
+                add_turn(store, f"session-{i}", rng)
+        store.flush()
+        total = SESSIONS * TURNS * 2
+        print(f"{SESSIONS} sessions x {TURNS} turns = {total} messages")
+
+        path = os.path.join(tmp, "history.jsonl.gz")
+        count, first = timed(export_messages, store, path)
+        size = os.path.getsize(path)
+        print(f"first export         {count:>7} records  {first * 1000:8.1f} ms  "
+              f"{size / 1024:8.1f} KiB ({size / count:.0f} bytes/record)")
+
+        for i in range(0, SESSIONS, 10):
+            add_turn(store, f"session-{i}", rng)
+        store.flush()
+        count, incremental = timed(export_messages, store, path)
+        print(f"incremental export   {count:>7} records  {incremental * 1000:8.1f} ms")
+        _, snapshot = timed(snapshot_export, store, os.path.join(tmp, "snapshot.jsonl.gz"))
+        print(f"full snapshot        {total + count:>7} records  {snapshot * 1000:8.1f} ms  "
+              f"({snapshot / incremental:.0f}x the incremental export)")
+        count, idle = timed(export_messages, store, path)
+        print(f"nothing new          {count:>7} records  {idle * 1000:8.1f} ms")
+
+        stats, elapsed = timed(aggregate, read_records([path]))
+        print(f"aggregate            {stats['messages']:>7} records  {elapsed * 1000:8.1f} ms  "
+              f"({stats['messages'] / elapsed:,.0f} records/s)")
+        print(f"    questions per platform {stats['questions_per_platform']}")
+        print(f"    latency p50 {stats['latency']['p50']:.2f}s p95 {stats['latency']['p95']:.2f}s, "
+              f"reply chars p50 {stats['reply_chars']['p50']}")
+        store.close()
+
+        restored = SQLiteSessionStore(os.path.join(tmp, "restored.sqlite3"))
+        count, elapsed = timed(import_messages, restored, [path])
+        again = import_messages(restored, [path])
+        print(f"import               {count:>7} records  {elapsed * 1000:8.1f} ms  "
+              f"(imported again: {again} added)")
+        restored.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark chat history render time and payload size against history length
+
+Run from the repository root:
+
+    python -m benchmarks.bench_history_render
+"""
+import base64
+import os
+import time
+
+from socialai.messages import new_message
+from socialai.rendering import HISTORY_PAGE_SIZE, HistoryRenderer, render_user_message
+
+HISTORY_LENGTHS = [10, 50, 100, 250, 500, 1000]
+RERUNS = 20
+LOGO_BASE64 = base64.b64encode(os.urandom(20_000)).decode()
+
+
+def make_history(length):
+    history = []
+    for i in range(length):
+        role = 'user' if i % 2 == 0 else 'ai'
+        history.append(new_message(role, f"Message {i}: " + "content ideas for a bakery " * 8))
+    return history
+
+
+def legacy_ai_message(msg):
+    """AI bubble as it used to be built, with the logo inlined as base64"""
+    return f"""
+    <div class="ai-message">
+        <div class="message-header">
+            <img src="data:image/png;base64,{LOGO_BASE64}" class="message-icon">
+            <strong>3hree.io</strong>
+        </div>
+        {msg['content']}
+        <div class="message-timestamp">{msg['time']}</div>
+    </div>
+    """
+
+
+def naive_rerun(history):
+    """What every rerun did before: rebuild every bubble from scratch"""
+    parts = []
+    for msg in history:
+        if msg['role'] == 'user':
+            parts.append(render_user_message(msg))
+        else:
+            parts.append(legacy_ai_message(msg))
+    return "".join(parts)
+
+
+def time_reruns(render):
+    start = time.perf_counter()
+    for _ in range(RERUNS):
+        html = render()
+    return (time.perf_counter() - start) / RERUNS * 1000, len(html)
+
+
+def main():
+    print(f"{'messages':>8} | {'naive ms':>9} {'naive KB':>9} | {'cached ms':>9} | "
+          f"{'window ms':>9} {'window KB':>9}")
+    for length in HISTORY_LENGTHS:
+        history = make_history(length)
+
+        naive_ms, naive_bytes = time_reruns(lambda: naive_rerun(history))
+
+        full = HistoryRenderer()
+        full.render(history, window=None)
+        cached_ms, _ = time_reruns(lambda: full.render(history, window=None))
+
+        windowed = HistoryRenderer()
+        windowed.render(history)
+        window_ms, window_bytes = time_reruns(lambda: windowed.render(history))
+
+        print(f"{length:>8} | {naive_ms:>9.3f} {naive_bytes / 1024:>9.1f} | {cached_ms:>9.3f} | "
+              f"{window_ms:>9.3f} {window_bytes / 1024:>9.1f}")
+    print(f"(window = last {HISTORY_PAGE_SIZE} messages, {RERUNS} reruns per row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Burst-load benchmark for the LLM scheduler, backed by the stub model
+
+The stub is wrapped in a quota that fails calls beyond QUOTA concurrent
+requests, the way a provider returns 429s during a spike.
+
+    python -m benchmarks.bench_llm_scheduler
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stats import latency_summary
+from socialai.llm import create_llm
+from socialai.llm_scheduler import LLMScheduler
+
+QUOTA = 8
+STUB_LATENCY = 0.1
+UNLIMITED_RATE = 1_000_000
+
+
+class QuotaModel:
+    """Stub model that rejects calls beyond a concurrency quota and counts calls"""
+
+    def __init__(self, quota):
+        self.llm = create_llm("stub", latency=STUB_LATENCY, tokens_per_second=UNLIMITED_RATE, response_tokens=20)
+        self.quota = quota
+        self.active = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            over = self.active > self.quota
+        try:
+            if over:
+                raise RuntimeError("429 Resource has been exhausted (quota)")
+            return self.llm.invoke(prompt)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def burst(requests, scheduler=None, fair=True):
+    """Fire (session_id, prompt) requests all at once; return latencies, errors and wall time
+
+    With fair=False every request is queued under one id, which turns the
+    scheduler into a plain FIFO semaphore.
+    """
+    model = QuotaModel(QUOTA)
+    latencies, errors = {}, 0
+    lock = threading.Lock()
+
+    def run(item):
+        nonlocal errors
+        session_id, prompt = item
+        started = time.perf_counter()
+        try:
+            if scheduler is None:
+                model.invoke(prompt)
+            else:
+                scheduler.call(session_id if fair else "all", prompt, lambda: model.invoke(prompt))
+        except RuntimeError:
+            with lock:
+                errors += 1
+        with lock:
+            latencies.setdefault(session_id, []).append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        list(pool.map(run, requests))
+    return latencies, errors, time.perf_counter() - started, model.calls
+
+
+def main():
+    spike = [(f"session-{s}", f"session {s} question {q}") for s in range(20) for q in range(5)]
+    print(f"--- spike: {len(spike)} requests from 20 sessions, provider quota {QUOTA} concurrent ---")
+    for label, scheduler in [("no scheduler", None),
+                             ("scheduler", LLMScheduler(max_concurrency=QUOTA, rate_per_minute=UNLIMITED_RATE))]:
+        latencies, errors, wall, _ = burst(spike, scheduler)
+        flat = [x for values in latencies.values() for x in values]
+        print(f"{label:<14} errors {errors:>3}  {len(spike) / wall:6.1f} req/s  {latency_summary(flat)}")
+        if scheduler:
+            m = scheduler.metrics()
+            print(f"{'':<14} peak queue depth {m['peak_queue_depth']}, "
+                  f"wait p50 {m['wait_p50'] * 1000:.0f} ms, p95 {m['wait_p95'] * 1000:.0f} ms")
+
+    print("--- fairness: one session sends 60 requests, 6 others send 2 each ---")
+    heavy = [("heavy", f"heavy {i}") for i in range(60)]
+    light = [(f"light-{s}", f"light {s} {q}") for s in range(6) for q in range(2)]
+    for label, fair in [("plain semaphore", False), ("fair scheduler", True)]:
+        scheduler = LLMScheduler(max_concurrency=QUOTA, rate_per_minute=UNLIMITED_RATE)
+        latencies, errors, wall, _ = burst(heavy + light, scheduler, fair=fair)
+        light_latencies = [x for sid, values in latencies.items() if sid.startswith("light") for x in values]
+        print(f"{label:<16} light sessions {latency_summary(light_latencies)}")
+
+    print("--- rate limit: 40 requests at 600/min, burst 8 ---")
+    scheduler = LLMScheduler(max_concurrency=QUOTA, rate_per_minute=600)
+    latencies, errors, wall, _ = burst([(f"s{i % 10}", f"rate {i}") for i in range(40)], scheduler)
+    print(f"rate limited    {40 / wall * 60:6.0f} req/min over {wall:.2f}s, errors {errors}")
+
+    print("--- coalescing: 30 sessions send the same prompt at once ---")
+    scheduler = LLMScheduler(max_concurrency=QUOTA, rate_per_minute=UNLIMITED_RATE)
+    _, errors, wall, calls = burst([(f"s{i}", "best time to post on instagram") for i in range(30)], scheduler)
+    print(f"model calls {calls} for 30 requests, {scheduler.metrics()['coalesced']} coalesced, errors {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark the brand logo upload pipeline against keeping the raw upload
+
+For a large photo-like JPEG and a large flat-colour PNG logo, compares:
+
+- memory each session holds for the logo (raw upload vs a store key)
+- per-rerun cost of getting the logo (re-read and hash the upload vs a key lookup)
+- bytes sent to the browser for the header image and the icon CSS
+- one-off processing time at upload
+
+    python -m benchmarks.bench_logo_pipeline
+"""
+import base64
+import hashlib
+import io
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from socialai.assets import HEADER_LOGO_WIDTH, MESSAGE_ICON_SIZE, PIXEL_DENSITY, LogoStore, resize_image
+
+RERUNS = 200
+
+
+def photo_jpeg(width=4000, height=3000):
+    """Noisy gradient, the worst case for compression"""
+    rng = random.Random(3)
+    img = Image.new("RGB", (width // 8, height // 8))
+    img.putdata([(x % 256, y % 256, rng.randrange(256))
+                 for y in range(img.height) for x in range(img.width)])
+    img = img.resize((width, height), Image.BICUBIC)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=95)
+    return out.getvalue()
+
+
+def flat_png(size=2400):
+    """Typical logo: a few flat shapes on transparency"""
+    img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((size // 10, size // 10, size * 9 // 10, size * 9 // 10), fill=(139, 92, 246, 255))
+    draw.rectangle((size // 3, size // 3, size * 2 // 3, size * 2 // 3), fill=(236, 72, 153, 255))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def legacy_variants(data):
+    """What each distinct upload used to cost: PNGs resized from the full original twice"""
+    icon = resize_image(data, MESSAGE_ICON_SIZE * PIXEL_DENSITY)
+    header = resize_image(data, HEADER_LOGO_WIDTH * PIXEL_DENSITY)
+    return icon, header
+
+
+def per_rerun(fn):
+    start = time.perf_counter()
+    for _ in range(RERUNS):
+        fn()
+    return (time.perf_counter() - start) / RERUNS * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LogoStore(tmp)
+        for label, data in (("photo JPEG", photo_jpeg()), ("flat PNG", flat_png())):
+            start = time.perf_counter()
+            legacy_icon, legacy_header = legacy_variants(data)
+            legacy_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            logo = store.put(data)
+            pipeline_ms = (time.perf_counter() - start) * 1000
+
+            legacy_payload = len(legacy_header) + len(base64.b64encode(legacy_icon))
+            payload = len(logo.header) + len(logo.icon_base64)
+            uncached = LogoStore(tmp, max_cached=0)
+            cold_ms = per_rerun(lambda: uncached.get(logo.key))
+            warm_ms = per_rerun(lambda: store.get(logo.key))
+            legacy_rerun_ms = per_rerun(lambda: hashlib.sha256(bytes(data)).hexdigest())
+
+            print(f"{label}: upload {len(data) / 1024:,.0f} KiB")
+            print(f"    held per session   raw upload {len(data) / 1024:9,.1f} KiB   key {len(logo.key)} bytes")
+            print(f"    per rerun          re-read + hash {legacy_rerun_ms:7.3f} ms   "
+                  f"key lookup {warm_ms:7.3f} ms (from disk {cold_ms:.3f} ms)")
+            print(f"    render payload     PNG {legacy_payload / 1024:7.1f} KiB   "
+                  f"{logo.header_format.upper()} {payload / 1024:7.1f} KiB")
+            print(f"    processing         legacy {legacy_ms:7.1f} ms   pipeline {pipeline_ms:7.1f} ms")
+        print(f"variants on disk: {sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
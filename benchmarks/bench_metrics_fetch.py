@@ -0,0 +1,85 @@
+"""Benchmark fetching metrics for several connected platforms
+
+Serves fake Graph/Twitter/Instagram metrics endpoints from the stub server,
+each with a fixed delay, and compares one-by-one fetches with a concurrent
+MetricsFetcher.refresh. Then measures what a rerun waits for: fetch() on a
+cold cache (it starts the background fetch and returns placeholders), on a
+warm cache, and with a platform that times out.
+
+    python -m benchmarks.bench_metrics_fetch
+"""
+import time
+
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.metrics import MetricsFetcher, summarize_metrics
+
+ENDPOINT_LATENCY = 0.2
+
+
+def install_metrics_routes(server):
+    server.route("GET", "/facebook/me/accounts", lambda q, f, h: (200, {
+        "data": [{"name": "Stub Bakery", "followers_count": 1250, "fan_count": 1100}]
+    }))
+    server.route("GET", "/twitter/users/me", lambda q, f, h: (200, {
+        "data": {"id": "42", "public_metrics": {"followers_count": 830, "following_count": 120,
+                                                "tweet_count": 2100, "like_count": 560}}
+    }))
+    server.route("GET", "/instagram/me", lambda q, f, h: (200, {
+        "id": "42", "username": "stubbakery", "account_type": "BUSINESS", "media_count": 310
+    }))
+
+
+def main():
+    with StubPlatformServer(latency=ENDPOINT_LATENCY) as server:
+        install_metrics_routes(server)
+        platforms = {
+            name: server.platform(metrics_url=f"{server.url}/{path}")
+            for name, path in [("Facebook", "facebook/me/accounts"),
+                               ("Twitter", "twitter/users/me"),
+                               ("Instagram", "instagram/me")]
+        }
+        connections = {name: f"token-{name}" for name in platforms}
+        client = HttpClient()
+
+        start = time.perf_counter()
+        for name, token in connections.items():
+            client.get(platforms[name]["metrics_url"], headers={"Authorization": f"Bearer {token}"}).json()
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics = MetricsFetcher(client, platforms).refresh(connections)
+        concurrent = time.perf_counter() - start
+
+        fetcher = MetricsFetcher(client, platforms)
+        start = time.perf_counter()
+        placeholders = fetcher.fetch(connections)
+        cold = time.perf_counter() - start
+        while fetcher.fetch(connections) == placeholders:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        fetcher.fetch(connections)
+        warm = time.perf_counter() - start
+
+        # A platform that never answers in time: the rerun still doesn't wait
+        server.route("GET", "/slow", lambda q, f, h: time.sleep(2) or (200, {}))
+        slow_client = HttpClient(timeout=(1, 0.5), retries=1, backoff=0)
+        slow = MetricsFetcher(slow_client, {**platforms, "Twitter": server.platform(metrics_url=f"{server.url}/slow")})
+        start = time.perf_counter()
+        slow.fetch(connections)
+        slow_rerun = time.perf_counter() - start
+        slow.close()
+
+        print(f"one by one:              {sequential * 1000:8.1f} ms")
+        print(f"concurrent refresh:      {concurrent * 1000:8.1f} ms")
+        print(f"rerun, cold cache:       {cold * 1000:8.3f} ms")
+        print(f"rerun, cached:           {warm * 1000:8.3f} ms")
+        print(f"rerun, platform down:    {slow_rerun * 1000:8.3f} ms")
+        print(f"prompt context: {summarize_metrics(metrics)}")
+        fetcher.close()
+        client.close()
+        slow_client.close()
+
+
+if __name__ == "__main__":
+    main()
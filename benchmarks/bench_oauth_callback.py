@@ -0,0 +1,92 @@
+"""Benchmark OAuth callback latency against a local stub OAuth server
+
+Compares bare requests.post/requests.get (a new connection per call, no
+retries) with the pooled HttpClient, sequentially and under concurrent
+callbacks, and with injected failures to show what the retry layer
+changes: a 503 on the user info GET is retried by the pooled client, and
+so is a 429 on either request. A 503 on the token exchange POST is not
+retried by either client (it may already have used the one-time code), so
+it is left out.
+
+    python -m benchmarks.bench_oauth_callback
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.stats import latency_summary
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.oauth import exchange_code, fetch_user_info
+
+CALLBACKS = 300
+CONCURRENT_SESSIONS = 16
+SERVER_LATENCY = 0.002
+REDIRECT_URI = "http://localhost:8501/"
+
+
+def bare_callback(platform):
+    """The callback as it used to be: unpooled, no timeout, no retry"""
+    data = {"grant_type": "authorization_code", "client_id": platform["client_id"],
+            "client_secret": platform["client_secret"], "redirect_uri": REDIRECT_URI,
+            "code": "stub-code", "code_verifier": "stub-verifier"}
+    token_data = requests.post(platform["token_url"], data=data).json()
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+    return requests.get(platform["userinfo_url"], headers=headers).json()
+
+
+def pooled_callback(client, platform):
+    token_data = exchange_code(client, platform, "stub-code", "stub-verifier", REDIRECT_URI)
+    return fetch_user_info(client, platform, token_data['access_token'])
+
+
+def run(callback, workers):
+    """Run CALLBACKS callbacks; return (latencies, failures, wall seconds)
+
+    A callback fails if it raises or ends without the user's profile.
+    """
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            failed = 'id' not in callback()
+        except Exception:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(timed, range(CALLBACKS)))
+    wall = time.perf_counter() - start
+    return [r[0] for r in results], sum(r[1] for r in results), wall
+
+
+def report(label, server, latencies, failures, wall):
+    print(f"{label:<28} {latency_summary(latencies)}  {CALLBACKS / wall:7.1f} cb/s  "
+          f"failures {failures:>3}  connections {server.connection_count}")
+
+
+def main():
+    for workers in (1, CONCURRENT_SESSIONS):
+        print(f"--- {CALLBACKS} callbacks, {workers} concurrent ---")
+        with StubPlatformServer(latency=SERVER_LATENCY) as server:
+            report("bare requests", server, *run(lambda: bare_callback(server.platform()), workers))
+        with StubPlatformServer(latency=SERVER_LATENCY) as server:
+            client = HttpClient()
+            report("pooled HttpClient", server, *run(lambda: pooled_callback(client, server.platform()), workers))
+            client.close()
+
+    for label, failures in (("every 10th user info GET returns 503", dict(failure_methods=("GET",))),
+                            ("every 10th request returns 429", dict(failure_status=429))):
+        print(f"--- {label} ---")
+        with StubPlatformServer(latency=SERVER_LATENCY, failure_every=10, **failures) as server:
+            report("bare requests", server, *run(lambda: bare_callback(server.platform()), CONCURRENT_SESSIONS))
+        with StubPlatformServer(latency=SERVER_LATENCY, failure_every=10, **failures) as server:
+            client = HttpClient(backoff=0.01)
+            report("pooled (retried)", server,
+                   *run(lambda: pooled_callback(client, server.platform()), CONCURRENT_SESSIONS))
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
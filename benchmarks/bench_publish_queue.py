@@ -0,0 +1,120 @@
+"""Benchmark the publish queue against local mock platform endpoints
+
+Queues POSTS Facebook posts and TWEETS tweets due immediately, then runs
+the Publisher until the queue drains. Reports throughput, HTTP requests
+made and publish latency (due time to published), with and without Graph
+API batching, and again with injected 503s to check that retries never
+publish a post twice: tweets are retried, Facebook posts hit by a 503 are
+left uncertain for review.
+
+    python -m benchmarks.bench_publish_queue
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from benchmarks.stats import latency_summary
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.publishing import (
+    FACEBOOK_BATCH_SIZE,
+    STATUS_PUBLISHED,
+    STATUS_UNCERTAIN,
+    PublishQueue,
+    Publisher,
+    publish_facebook,
+    publish_twitter,
+)
+
+POSTS = 500
+TWEETS = 100
+SERVER_LATENCY = 0.005
+# High enough that the rate limiters don't dominate the measurement
+RATES = {"Facebook": 100_000, "Twitter": 100_000}
+
+
+class MockPlatforms:
+    """Feed, Graph batch and tweet endpoints that record every post they create"""
+
+    def __init__(self):
+        self.created = []
+        self.lock = threading.Lock()
+
+    def create(self, message):
+        post_id = uuid.uuid4().hex
+        with self.lock:
+            self.created.append(message)
+        return post_id
+
+    def feed(self, query, form, headers):
+        return 200, {"id": self.create(form["message"])}
+
+    def batch(self, query, form, headers):
+        results = []
+        for item in json.loads(form["batch"]):
+            message = parse_qs(item["body"])["message"][0]
+            results.append({"code": 200, "body": json.dumps({"id": self.create(message)})})
+        return 200, results
+
+    def tweet(self, query, form, headers):
+        return 201, {"data": {"id": self.create(form["text"]), "text": form["text"]}}
+
+
+def run(label, facebook_batch, failure_every=0):
+    mock = MockPlatforms()
+    client = HttpClient(retries=0)
+    with StubPlatformServer(latency=SERVER_LATENCY, failure_every=failure_every) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        server.route("POST", "/page-1/feed", mock.feed)
+        server.route("POST", "/graph", mock.batch)
+        server.route("POST", "/2/tweets", mock.tweet)
+        platforms = {
+            "Facebook": server.platform(publish_url=f"{server.url}/{{page_id}}/feed",
+                                        batch_url=f"{server.url}/graph", publish_path="{page_id}/feed"),
+            "Twitter": server.platform(publish_url=f"{server.url}/2/tweets")
+        }
+        queue = PublishQueue(os.path.join(tmp, "publish_queue.sqlite3"), backoff=0.05)
+        credentials = {'access_token': "token", 'page_id': "page-1"}
+        publisher = Publisher(queue, client, platforms, lambda owner, platform: credentials, rates=RATES,
+                              publishers={"Facebook": (publish_facebook, facebook_batch),
+                                          "Twitter": (publish_twitter, 1)})
+
+        now = time.time()
+        for i in range(POSTS):
+            queue.enqueue(f"owner-{i % 10}", "Facebook", f"Facebook post {i}", now)
+        for i in range(TWEETS):
+            queue.enqueue(f"owner-{i % 10}", "Twitter", f"Tweet {i}", now)
+
+        start = time.perf_counter()
+        total = POSTS + TWEETS
+        while sum(queue.counts().get(status, 0) for status in (STATUS_PUBLISHED, STATUS_UNCERTAIN)) < total:
+            if not publisher.run_once():
+                time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+        latencies = [post['published_at'] - post['publish_at']
+                     for owner in range(10) for post in queue.posts(f"owner-{owner}", limit=total)
+                     if post['status'] == STATUS_PUBLISHED]
+        duplicates = len(mock.created) - len(set(mock.created))
+        print(f"{label:<24} {total / elapsed:8.0f} posts/s  {publisher.stats['requests']:>5} requests  "
+              f"{publisher.stats['retried']:>4} retries  {publisher.stats['uncertain']:>4} uncertain  "
+              f"{duplicates} duplicates")
+        print(f"{'':<24} latency {latency_summary(latencies)}")
+        publisher.close()
+        queue.close()
+    client.close()
+
+
+def main():
+    print(f"{POSTS} Facebook posts + {TWEETS} tweets, {SERVER_LATENCY * 1000:.0f} ms per request")
+    run("one request per post", facebook_batch=1)
+    run(f"batches of {FACEBOOK_BATCH_SIZE}", facebook_batch=FACEBOOK_BATCH_SIZE)
+    run("batched, 1 in 7 fails", facebook_batch=FACEBOOK_BATCH_SIZE, failure_every=7)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark the static payload (stylesheet and welcome card) sent per rerun
+
+Compares the old behaviour, where every rerun rebuilt and re-sent the
+themed <style> block and the welcome card, with the stylesheet injected
+into the page head once per theme and the card dropped after the first turn.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rerun_payload
+"""
+import base64
+import os
+import time
+
+from socialai.rendering import WELCOME_CARD
+from socialai.theming import (
+    STYLESHEET_TEMPLATE,
+    build_stylesheet,
+    compile_stylesheet,
+    theme_injection_html,
+)
+
+TURNS = [1, 5, 20, 50, 100]
+BRAND_COLOR = "#8B5CF6"
+LOGO_CSS = (
+    ".brand-logo { background-image: url('data:image/png;base64,"
+    + base64.b64encode(os.urandom(3_000)).decode()
+    + "'); }"
+)
+
+
+def legacy_rerun():
+    """Style block and welcome card as every rerun used to send them"""
+    css = STYLESHEET_TEMPLATE.format(brand_color=BRAND_COLOR, logo_css=LOGO_CSS)
+    return f"<style>{css}</style>" + WELCOME_CARD
+
+
+def injected_rerun(state, turn):
+    """Style injected only when the theme changes, welcome card before the first turn"""
+    payload = ""
+    theme = (BRAND_COLOR, LOGO_CSS)
+    if state.get('injected_theme') != theme:
+        payload += theme_injection_html(compile_stylesheet(*theme))
+        state['injected_theme'] = theme
+    if turn == 0:
+        payload += WELCOME_CARD
+    return payload
+
+
+def run(turns, render):
+    """Total bytes sent and ms spent over `turns` reruns"""
+    sent = 0
+    start = time.perf_counter()
+    for turn in range(turns):
+        sent += len(render(turn).encode())
+    return sent, (time.perf_counter() - start) * 1000
+
+
+def main():
+    print(f"stylesheet: {len(build_stylesheet(BRAND_COLOR, LOGO_CSS)):,} bytes compiled, "
+          f"{len(STYLESHEET_TEMPLATE):,} bytes template")
+    print(f"{'reruns':>6} | {'legacy KB':>9} {'legacy ms':>9} | {'injected KB':>11} {'injected ms':>11}")
+    for turns in TURNS:
+        compile_stylesheet.cache_clear()
+        legacy_bytes, legacy_ms = run(turns, lambda turn: legacy_rerun())
+        state = {}
+        injected_bytes, injected_ms = run(turns, lambda turn: injected_rerun(state, turn))
+        print(f"{turns:>6} | {legacy_bytes / 1024:>9.1f} {legacy_ms:>9.3f} | "
+              f"{injected_bytes / 1024:>11.1f} {injected_ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
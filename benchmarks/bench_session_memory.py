@@ -0,0 +1,81 @@
+"""Benchmark memory held by many chat sessions, with and without the session store
+
+Simulates SESSIONS sessions of MESSAGES messages each. The in-memory mode
+keeps every message in RAM as chat_history used to; the store mode appends
+through the write-behind SQLiteSessionStore and keeps only the visible
+window in RAM.
+
+    python -m benchmarks.bench_session_memory
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stats import latency_summary
+from socialai.messages import new_message
+from socialai.rendering import HISTORY_PAGE_SIZE
+from socialai.session_store import SQLiteSessionStore
+
+SESSIONS = 500
+MESSAGES = 400
+REPLY = "Here are five content ideas for your bakery this week. " * 12
+
+
+def simulate(add_message):
+    sessions = {f"session-{i}": [] for i in range(SESSIONS)}
+    for turn in range(MESSAGES // 2):
+        for session_id, history in sessions.items():
+            add_message(session_id, history, new_message('user', f"Question {turn} about posting times"))
+            add_message(session_id, history, new_message('ai', REPLY))
+    return sessions
+
+
+def measure(label, add_message, finish=lambda: None):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sessions = simulate(add_message)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    flush_start = time.perf_counter()
+    finish()
+    flush = time.perf_counter() - flush_start
+    print(f"{label:<12} held {current / 2**20:8.1f} MiB  ({current / SESSIONS / 1024:7.1f} KiB/session)  "
+          f"peak {peak / 2**20:8.1f} MiB  run {elapsed:6.2f}s  final flush {flush:5.2f}s")
+    return sessions
+
+
+def main():
+    print(f"{SESSIONS} sessions x {MESSAGES} messages")
+
+    def in_memory(session_id, history, msg):
+        history.append(msg)
+
+    measure("in memory", in_memory)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "sessions.sqlite3"))
+        append_times = []
+
+        def with_store(session_id, history, msg):
+            start = time.perf_counter()
+            store.append_messages(session_id, [msg])
+            append_times.append(time.perf_counter() - start)
+            history.append(msg)
+            if len(history) > HISTORY_PAGE_SIZE:
+                del history[:len(history) - HISTORY_PAGE_SIZE]
+
+        measure("with store", with_store, store.flush)
+        print(f"append (write-behind enqueue): {latency_summary(append_times)}")
+
+        start = time.perf_counter()
+        page = store.load_messages("session-0", limit=HISTORY_PAGE_SIZE)
+        older = store.load_messages("session-0", before_id=page[0]['id'], limit=HISTORY_PAGE_SIZE)
+        print(f"load two history pages: {(time.perf_counter() - start) * 1000:.2f} ms "
+              f"({len(page) + len(older)} messages)")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Exercise the token manager against a local fake token endpoint
+
+The fake platform issues short-lived access tokens with rotating refresh
+tokens and rejects expired ones at its userinfo endpoint. Many connections
+use their tokens for DURATION seconds, first as the app used to (the token
+from the callback, used until it fails), then through the TokenManager
+with its background refresh. Also compares a "Connected as" status read
+from the manager's cache with a userinfo call on the render path.
+
+    python -m benchmarks.bench_token_refresh
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from benchmarks.stats import latency_summary
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.oauth import exchange_code, fetch_user_info
+from socialai.tokens import TokenManager
+
+CONNECTIONS = 40
+TOKEN_LIFETIME = 3
+DURATION = 8
+USE_INTERVAL = 0.25
+REDIRECT_URI = "http://localhost:8501/"
+
+
+class FakeAuthority:
+    """Token endpoint with expiring access tokens and single-use refresh tokens"""
+
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.access = {}
+        self.refresh = set()
+        self.lock = threading.Lock()
+
+    def token(self, query, form, headers):
+        with self.lock:
+            if form.get("grant_type") == "refresh_token":
+                if form.get("refresh_token") not in self.refresh:
+                    return 400, {"error": "invalid_grant"}
+                self.refresh.discard(form["refresh_token"])
+            elif form.get("grant_type") != "authorization_code":
+                return 400, {"error": "unsupported_grant_type"}
+            access, refresh = f"access-{uuid.uuid4().hex}", f"refresh-{uuid.uuid4().hex}"
+            self.access[access] = time.time() + self.lifetime
+            self.refresh.add(refresh)
+        return 200, {"access_token": access, "refresh_token": refresh,
+                     "token_type": "bearer", "expires_in": self.lifetime}
+
+    def user_info(self, query, form, headers):
+        token = headers.get("Authorization", "").removeprefix("Bearer ")
+        with self.lock:
+            expires_at = self.access.get(token)
+        if expires_at is None or expires_at < time.time():
+            return 401, {"error": "invalid_token"}
+        return 200, {"id": "42", "name": "Stub Bakery", "username": "stubbakery"}
+
+
+def use_tokens(client, platform, current_token):
+    """Call the API with each connection's current token every USE_INTERVAL; count failures"""
+    calls = failures = 0
+    deadline = time.time() + DURATION
+    while time.time() < deadline:
+        for i in range(CONNECTIONS):
+            response = client.get(platform["userinfo_url"],
+                                  headers={"Authorization": f"Bearer {current_token(i)}"})
+            calls += 1
+            failures += response.status_code == 401
+        time.sleep(USE_INTERVAL)
+    return calls, failures
+
+
+def main():
+    authority = FakeAuthority(TOKEN_LIFETIME)
+    client = HttpClient(retries=0)
+    with StubPlatformServer() as server, tempfile.TemporaryDirectory() as tmp:
+        server.route("POST", "/oauth/token", authority.token)
+        server.route("GET", "/me", authority.user_info)
+        platform = server.platform()
+        platforms = {"Stub": platform}
+        print(f"{CONNECTIONS} connections, tokens live {TOKEN_LIFETIME}s, used every {USE_INTERVAL}s "
+              f"for {DURATION}s")
+
+        # Before: the access token from the callback, kept until it fails
+        tokens = [exchange_code(client, platform, "code", "verifier", REDIRECT_URI)['access_token']
+                  for _ in range(CONNECTIONS)]
+        calls, failures = use_tokens(client, platform, lambda i: tokens[i])
+        print(f"callback token only: {failures}/{calls} calls rejected ({failures / calls:.0%})")
+
+        # After: refreshed in the background before expiry
+        manager = TokenManager(client, platforms, os.path.join(tmp, "tokens.sqlite3"),
+                               refresh_margin=1, health_interval=2, poll_interval=0.2)
+        for i in range(CONNECTIONS):
+            token_data = exchange_code(client, platform, "code", "verifier", REDIRECT_URI)
+            manager.store(str(i), "Stub", token_data)
+        manager.start()
+        calls, failures = use_tokens(client, platform, lambda i: manager.access_token(str(i), "Stub"))
+        manager.stop()
+        statuses = {}
+        for i in range(CONNECTIONS):
+            status = manager.get(str(i), "Stub")['status']
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f"token manager:       {failures}/{calls} calls rejected ({failures / calls:.0%}), "
+              f"{manager.stats['refreshed']} refreshes, {manager.stats['checks']} health checks, "
+              f"statuses {statuses}")
+
+        # Render path cost of the "Connected as" status
+        token = manager.access_token("0", "Stub")
+        network, cached = [], []
+        for _ in range(200):
+            start = time.perf_counter()
+            fetch_user_info(client, platform, token)
+            network.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            manager.get("0", "Stub")
+            cached.append(time.perf_counter() - start)
+        print(f"status via userinfo call: {latency_summary(network)}")
+        print(f"status from cache:        {latency_summary(cached)}")
+        manager.close()
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark workspace access with many tenants and a bounded set in memory
+
+Seeds TENANTS workspaces in a SQLiteSessionStore, then replays REQUESTS
+accesses with a skewed (Zipf-like) popularity, as a shared deployment sees
+it: a few busy clients and a long tail. Reports the LRU hit rate, access
+latency for hits and lazy loads, and memory held, per capacity.
+
+    python -m benchmarks.bench_workspaces
+"""
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stats import latency_summary
+from socialai.messages import new_message
+from socialai.session_store import SQLiteSessionStore
+from socialai.workspaces import WorkspaceManager
+
+TENANTS = 5000
+MESSAGES = 60
+REQUESTS = 20000
+CAPACITIES = [64, 256, 1024, TENANTS]
+ZIPF_EXPONENT = 1.1
+REPLY = "Here are five content ideas for your bakery this week. " * 12
+
+
+def seed(store):
+    manager = WorkspaceManager(store, capacity=TENANTS)
+    for i in range(TENANTS):
+        workspace = manager.get(f"tenant-{i}")
+        workspace.business_info['name'] = f"Business {i}"
+        workspace.connections['Facebook'] = f"token-{i}"
+        for turn in range(MESSAGES // 2):
+            manager.add_message(workspace, new_message('user', f"Question {turn} about posting times"))
+            manager.add_message(workspace, new_message('ai', REPLY))
+        manager.save(workspace)
+    store.flush()
+
+
+def workload(seed_value=7):
+    rng = random.Random(seed_value)
+    weights = [1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(TENANTS)]
+    return rng.choices(range(TENANTS), weights=weights, k=REQUESTS)
+
+
+def run(store, capacity, requests):
+    manager = WorkspaceManager(store, capacity=capacity)
+    hits, loads = [], []
+    tracemalloc.start()
+    for tenant in requests:
+        workspace_id = f"tenant-{tenant}"
+        cached = workspace_id in manager
+        start = time.perf_counter()
+        manager.get(workspace_id)
+        (hits if cached else loads).append(time.perf_counter() - start)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"capacity {capacity:>5}: hit rate {len(hits) / len(requests):6.1%}  "
+          f"active {len(manager):>5}  evicted {manager.stats['evictions']:>6}  "
+          f"held {held / 2**20:6.1f} MiB  peak {peak / 2**20:6.1f} MiB")
+    print(f"    hit  {latency_summary(hits)}")
+    print(f"    load {latency_summary(loads)}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "sessions.sqlite3"))
+        start = time.perf_counter()
+        seed(store)
+        print(f"{TENANTS} workspaces x {MESSAGES} messages seeded in {time.perf_counter() - start:.1f}s; "
+              f"{REQUESTS} requests, Zipf exponent {ZIPF_EXPONENT}")
+        requests = workload()
+        for capacity in CAPACITIES:
+            run(store, capacity, requests)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
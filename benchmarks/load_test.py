@@ -0,0 +1,137 @@
+"""Headless load test: many simulated dashboard sessions against a chat backend
+
+Each simulated session does what ai_chat_interface() does for a chat turn:
+append the user message, submit the turn to the shared ChatWorker (whose
+replies go through the shared LLMScheduler, at the app's limits unless
+overridden), poll the job every --poll-interval seconds the way the
+pending_reply fragment does, rendering the partial reply, then append the
+AI message and render the history window. Reports throughput, time to
+first token and turn latency (as generated, and as first seen by a poll),
+error rate and memory per session.
+
+    python -m benchmarks.load_test --sessions 50 --turns 5 --latency 0.2
+"""
+import argparse
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stats import latency_summary
+from socialai.chat import ChatSession
+from socialai.chat_worker import FINISHED, JOB_DONE, ChatWorker
+from socialai.llm import create_llm
+from socialai.llm_scheduler import DEFAULT_MAX_CONCURRENCY, DEFAULT_RATE_PER_MINUTE, LLMScheduler
+from socialai.memory import MEMORY_ENGINES
+from socialai.messages import new_message
+from socialai.rendering import HistoryRenderer, render_ai_message
+
+# The app's REPLY_POLL_INTERVAL
+POLL_INTERVAL = 0.5
+
+QUESTIONS = [
+    "What is the best time to post on Instagram?",
+    "Give me content ideas for a bakery",
+    "How do I grow my Twitter following?",
+    "Write a Facebook post announcing our weekend sale",
+    "How should I respond to a negative review?",
+]
+
+
+class SimulatedSession:
+    """The per-session state the dashboard keeps in st.session_state"""
+
+    def __init__(self, index, llm, engine, scheduler):
+        self.index = index
+        self.session_id = f"session-{index}"
+        self.chatbot = ChatSession(llm, engine)
+        self.chatbot.update_context(business_name=f"Business {index}", platforms="Instagram, Twitter")
+        self.chatbot.scheduler = scheduler
+        self.chatbot.session_id = self.session_id
+        self.chat_history = []
+        self.renderer = HistoryRenderer()
+
+    def turn(self, worker, question, poll_interval):
+        """One chat turn; returns (time to first token, generated in, seen after, failed) in seconds"""
+        self.chat_history.append(new_message('user', question))
+        job_id = worker.submit(self.session_id, self.chatbot, question)
+        while True:
+            time.sleep(poll_interval)
+            job = worker.poll(job_id)
+            if job['status'] in FINISHED:
+                break
+            render_ai_message({'content': job['text'] + "▌", 'time': ""})
+        seen = time.time() - job['submitted']
+        worker.discard(job_id)
+
+        failed = job['status'] != JOB_DONE
+        response = f"Sorry, I encountered an error: {job['error']}" if failed else job['text']
+        total = job['finished'] - job['submitted']
+        first = job['first_chunk'] - job['submitted'] if job['first_chunk'] else total
+        self.chat_history.append(new_message('ai', response, **job['tokens']))
+        self.renderer.render(self.chat_history)
+        return first, total, seen, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="stub")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--engine", choices=MEMORY_ENGINES, default=MEMORY_ENGINES[0])
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="seconds between polls of a pending reply")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="model calls in flight at once")
+    parser.add_argument("--rate", type=int, default=DEFAULT_RATE_PER_MINUTE, help="model calls started per minute")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub: seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="stub: tokens per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="stub: fraction of calls that fail")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.backend == "stub":
+        options = dict(latency=args.latency, tokens_per_second=args.token_rate, failure_rate=args.failure_rate)
+    llm = create_llm(args.backend, **options)
+
+    scheduler = LLMScheduler(max_concurrency=args.max_concurrency, rate_per_minute=args.rate)
+    worker = ChatWorker()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = [SimulatedSession(i, llm, args.engine, scheduler) for i in range(args.sessions)]
+
+    first_tokens, totals, seen, failures = [], [], [], []
+    lock = threading.Lock()
+
+    def drive(session):
+        for turn in range(args.turns):
+            question = QUESTIONS[(session.index + turn) % len(QUESTIONS)]
+            result = session.turn(worker, question, args.poll_interval)
+            with lock:
+                first_tokens.append(result[0])
+                totals.append(result[1])
+                seen.append(result[2])
+                failures.append(result[3])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(drive, sessions))
+    elapsed = time.perf_counter() - started
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    worker.close()
+
+    turns = len(totals)
+    print(f"{args.sessions} sessions x {args.turns} turns on {args.backend!r} ({args.engine} memory), "
+          f"scheduler {args.max_concurrency} concurrent / {args.rate} per minute, polled every {args.poll_interval}s")
+    print(f"throughput:   {turns / elapsed:8.1f} turns/s  ({turns} turns in {elapsed:.2f}s)")
+    print(f"first token:  {latency_summary(first_tokens)}")
+    print(f"turn latency: {latency_summary(totals)}")
+    print(f"seen by poll: {latency_summary(seen)}")
+    print(f"errors:       {sum(failures)} ({sum(failures) / turns:.1%})")
+    print(f"memory:       {held / args.sessions / 1024:8.1f} KiB per session")
+
+
+if __name__ == "__main__":
+    main()
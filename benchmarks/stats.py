@@ -0,0 +1,17 @@
+"""Small helpers shared by the benchmark scripts"""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds):
+    """Format p50/p99/max of a list of durations in milliseconds"""
+    return (f"p50 {percentile(seconds, 50) * 1000:7.2f} ms  "
+            f"p99 {percentile(seconds, 99) * 1000:7.2f} ms  "
+            f"max {max(seconds, default=0) * 1000:7.2f} ms")
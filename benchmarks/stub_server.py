@@ -0,0 +1,144 @@
+"""Local stand-in for the platform OAuth and API endpoints
+
+Serves on 127.0.0.1 with HTTP/1.1 keep-alive, an optional per-request delay
+and optional failure injection, so the HTTP layer can be exercised offline.
+Responses go out with TCP_NODELAY: headers and body are separate writes,
+and Nagle's algorithm would hold the body back for the client's delayed
+ACK, adding ~40 ms to every keep-alive request.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubPlatformServer:
+    """Fake token, user info and API endpoints on a free localhost port"""
+
+    def __init__(self, latency=0.0, failure_every=0, failure_status=503, failure_methods=None):
+        """Every `failure_every`th request (of `failure_methods`, or of all) gets `failure_status`"""
+        self.latency = latency
+        self.failure_every = failure_every
+        self.failure_status = failure_status
+        self.failure_methods = failure_methods
+        self.request_count = 0
+        self._failure_candidates = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self.routes = {
+            ("POST", "/oauth/token"): self.token,
+            ("GET", "/me"): self.user_info,
+        }
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = None
+
+    def platform(self, **overrides):
+        """A PLATFORMS-style config entry pointing at this server"""
+        config = {
+            "client_id": "stub-client",
+            "client_secret": "stub-secret",
+            "authorize_url": f"{self.url}/oauth/authorize",
+            "token_url": f"{self.url}/oauth/token",
+            "userinfo_url": f"{self.url}/me",
+            "scope": "stub.read"
+        }
+        config.update(overrides)
+        return config
+
+    def route(self, method, path, handler):
+        """Register handler(query, form, headers) -> (status, payload)"""
+        self.routes[(method, path)] = handler
+
+    # Default endpoints
+
+    def token(self, query, form, headers):
+        if form.get("grant_type") not in ("authorization_code", "refresh_token"):
+            return 400, {"error": "unsupported_grant_type"}
+        return 200, {
+            "access_token": f"access-{uuid.uuid4().hex}",
+            "refresh_token": f"refresh-{uuid.uuid4().hex}",
+            "token_type": "bearer",
+            "expires_in": 3600
+        }
+
+    def user_info(self, query, form, headers):
+        if not headers.get("Authorization", "").startswith("Bearer "):
+            return 401, {"error": "missing token"}
+        return 200, {"id": "42", "name": "Stub Bakery", "username": "stubbakery"}
+
+    # Server plumbing
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connection_count += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                form = {k: v[0] for k, v in parse_qs(body).items()}
+                if not form and body.startswith("{"):
+                    form = json.loads(body)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+                with server._lock:
+                    server.request_count += 1
+                    fail = False
+                    if server.failure_every and method in (server.failure_methods or (method,)):
+                        server._failure_candidates += 1
+                        fail = server._failure_candidates % server.failure_every == 0
+                if server.latency:
+                    time.sleep(server.latency)
+
+                handler = server.routes.get((method, parsed.path))
+                if fail:
+                    status, payload = server.failure_status, {"error": "injected failure"}
+                elif handler is None:
+                    status, payload = 404, {"error": "not found"}
+                else:
+                    status, payload = handler(query, form, self.headers)
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
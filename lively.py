@@ -4,13 +4,36 @@ import os
 import base64
 import hashlib
 import re
-import requests
-from langchain.chains import ConversationChain
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
+import json
+import secrets
+import threading
+import time
 import uuid
-from datetime import datetime
-from langchain.memory import ConversationBufferMemory  # Added import
+from datetime import date, datetime, timedelta
+from socialai.assets import HEADER_LOGO_WIDTH, PLATFORM_ICON_WIDTH, AssetRegistry, LogoError, LogoStore
+from socialai.chat import ChatSession
+from socialai.chat_worker import FINISHED, JOB_CANCELLED, JOB_FAILED, ChatWorker
+from socialai.content_batch import generate_calendar, plan_calendar
+from socialai.http_client import HttpClient
+from socialai.instrumentation import Profiler, start_metrics_server
+from socialai.llm import BACKEND_LABELS, create_llm
+from socialai.llm_scheduler import DEFAULT_MAX_CONCURRENCY, DEFAULT_RATE_PER_MINUTE, LLMScheduler
+from socialai.memory import DEFAULT_MEMORY_ENGINE, MEMORY_ENGINES, describe_memory
+from socialai.messages import mentioned_platforms, new_message
+from socialai.metrics import MetricsFetcher, summarize_metrics
+from socialai.oauth import exchange_code, fetch_pages, fetch_user_info
+from socialai.publishing import ADDED, KEPT, PUBLISHERS, STATUS_UNCERTAIN, UNCHANGED, UPDATED, PublishQueue, Publisher
+from socialai.response_cache import ResponseCache
+from socialai.session_store import SQLiteSessionStore
+from socialai.rendering import (
+    HISTORY_PAGE_SIZE,
+    WELCOME_CARD,
+    HistoryRenderer,
+    render_ai_message,
+)
+from socialai.theming import SCRIPT_FRAME_TITLE, compile_stylesheet, theme_injection_html
+from socialai.tokens import STATUS_OK, TokenManager
+from socialai.workspaces import DEFAULT_CAPACITY, WorkspaceManager
 
 # Initialize session state
 def init_session_state():
@@ -20,23 +43,45 @@ def init_session_state():
         st.session_state.user_info = {}
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
-    if 'session_id' not in st.session_state:
-        st.session_state.session_id = str(uuid.uuid4())
+    restoring = 'session_id' not in st.session_state
+    if restoring:
+        st.session_state.session_id = requested_session_id() or str(uuid.uuid4())
+    if 'memory_engine' not in st.session_state:
+        st.session_state.memory_engine = DEFAULT_MEMORY_ENGINE
     if 'memory_type' not in st.session_state:
-        st.session_state.memory_type = "Buffer"
+        st.session_state.memory_type = describe_memory(st.session_state.memory_engine)
+    if 'stream_responses' not in st.session_state:
+        st.session_state.stream_responses = True
+    if 'use_response_cache' not in st.session_state:
+        st.session_state.use_response_cache = False
+    if 'history_renderer' not in st.session_state:
+        st.session_state.history_renderer = HistoryRenderer()
+    if 'history_window' not in st.session_state:
+        st.session_state.history_window = HISTORY_PAGE_SIZE
     if 'business_info' not in st.session_state:
         st.session_state.business_info = {
             'name': '',
             'logo': None,
             'color': '#8B5CF6'  # Purple accent
         }
-
-init_session_state()
-
-st.image("logo33.png", width=99)
+    if 'history_total' not in st.session_state:
+        st.session_state.history_total = len(st.session_state.chat_history)
+    if 'workspace_id' not in st.session_state:
+        st.session_state.workspace_id = None
+    if restoring:
+        restore_session()
+        if 'ws' in st.query_params:
+            st.session_state.workspace_id = st.query_params['ws'] or None
 
 # --- Configuration ---
 GOOGLE_API_KEY = "YOUR_GOOGLE_API_KEY"  # Replace with your key
+# "gemini", or "stub" for offline development and load testing
+LLM_BACKEND = os.environ.get("SOCIALAI_LLM_BACKEND", "gemini")
+# Model calls allowed in flight and started per minute, across all sessions
+LLM_MAX_CONCURRENCY = int(os.environ.get("SOCIALAI_LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+LLM_RATE_PER_MINUTE = int(os.environ.get("SOCIALAI_LLM_RATE_PER_MINUTE", DEFAULT_RATE_PER_MINUTE))
+# Seconds between refreshes of a reply while it is being generated
+REPLY_POLL_INTERVAL = 0.5
 
 PLATFORMS = {
     "Facebook": {
@@ -45,7 +90,14 @@ PLATFORMS = {
         "authorize_url": "https://www.facebook.com/v19.0/dialog/oauth",
         "token_url": "https://graph.facebook.com/v19.0/oauth/access_token",
         "userinfo_url": "https://graph.facebook.com/me",
-        "scope": "pages_manage_posts,pages_read_engagement",
+        "scope": "pages_show_list,pages_manage_posts,pages_read_engagement",
+        "metrics_url": "https://graph.facebook.com/v19.0/me/accounts",
+        "metrics_params": {"fields": "name,followers_count,fan_count"},
+        # Posts go to a Page's feed with the Page's own token
+        "pages_url": "https://graph.facebook.com/v19.0/me/accounts",
+        "publish_url": "https://graph.facebook.com/v19.0/{page_id}/feed",
+        "batch_url": "https://graph.facebook.com/v19.0/",
+        "publish_path": "{page_id}/feed",
         "icon_path": "facebook.png"
     },
     "Twitter": {
@@ -55,6 +107,9 @@ PLATFORMS = {
         "token_url": "https://api.twitter.com/2/oauth2/token",
         "userinfo_url": "https://api.twitter.com/2/users/me",
         "scope": "tweet.read tweet.write users.read offline.access",
+        "metrics_url": "https://api.twitter.com/2/users/me",
+        "metrics_params": {"user.fields": "public_metrics"},
+        "publish_url": "https://api.twitter.com/2/tweets",
         "icon_path": "x.png"
     },
     "Instagram": {
@@ -64,88 +119,410 @@ PLATFORMS = {
         "token_url": "https://api.instagram.com/oauth/access_token",
         "userinfo_url": "https://graph.instagram.com/me",
         "scope": "user_profile,user_media",
+        "metrics_url": "https://graph.instagram.com/me",
+        "metrics_params": {"fields": "id,username,account_type,media_count"},
         "icon_path": "instagram.png"
     }
 }
 
 REDIRECT_URI = "http://localhost:8501/"
 
+# Rerun profiling: spans per stage, optional JSONL log and Prometheus /metrics port
+PROFILE_ENABLED = os.environ.get("SOCIALAI_PROFILE", "") not in ("", "0")
+PROFILE_JSONL = os.environ.get("SOCIALAI_PROFILE_JSONL")
+METRICS_PORT = int(os.environ.get("SOCIALAI_METRICS_PORT", 0))
+PROFILE_PANEL_RUNS = 10
+
+# Local storage for caches and stores that outlive the process
+DATA_DIR = os.environ.get("SOCIALAI_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".socialai"))
+# Hour of day calendar posts are scheduled for, local time
+CALENDAR_PUBLISH_HOUR = 10
+
+# Workspaces kept in memory at once; the least recently used are saved and dropped
+WORKSPACE_CAPACITY = int(os.environ.get("SOCIALAI_WORKSPACE_CAPACITY", DEFAULT_CAPACITY))
+
+DEFAULT_LOGO_PATH = "b1.jpg"
+APP_LOGO_PATH = "logo33.png"
+APP_LOGO_WIDTH = 99
+
 # --- Helper Functions ---
-def get_image_base64(path):
-    """Convert image to base64 string"""
+@st.cache_resource
+def get_asset_registry():
+    """Bundled images shared by every session, encoded once per file version"""
+    return AssetRegistry(os.path.dirname(os.path.abspath(__file__)))
+
+assets = get_asset_registry()
+
+@st.cache_resource
+def get_logo_store():
+    """Uploaded logos shared by every session, as small encoded variants keyed by content hash"""
+    return LogoStore(os.path.join(DATA_DIR, "logos"))
+
+@st.cache_resource
+def get_default_logo_key():
+    """Logo store key of the bundled logo shown until a business uploads its own"""
+    data = assets.raw(DEFAULT_LOGO_PATH)
     try:
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
-    except:
+        return get_logo_store().put(data).key if data else None
+    except LogoError:
         return None
 
-# Preload default logo
-DEFAULT_LOGO_BASE64 = get_image_base64("b1.jpg") if os.path.exists("b1.jpg") else ""
+@st.cache_resource
+def get_profiler():
+    """Rerun profiler shared by every session; off unless SOCIALAI_PROFILE is set"""
+    profiler = Profiler(enabled=PROFILE_ENABLED, jsonl_path=PROFILE_JSONL)
+    if PROFILE_ENABLED and METRICS_PORT:
+        start_metrics_server(profiler, METRICS_PORT)
+    return profiler
+
+profiler = get_profiler()
+profiler.start_run()
+
+# --- Session Persistence ---
+# Session state written to the store, besides business_info and PKCE verifiers
+PERSISTED_KEYS = ('connections', 'user_info', 'memory_engine', 'workspace_id')
+# Store rows mapping a one-time OAuth state to the session that started the flow
+OAUTH_STATE_PREFIX = "oauth-state:"
+OAUTH_STATE_TTL = 15 * 60
+# Sessions (and workspaces) not used for this long are deleted, chat history included
+SESSION_RETENTION = 90 * 24 * 60 * 60
+# Seconds between sweeps for abandoned sessions and OAuth states
+SESSION_SWEEP_INTERVAL = 60 * 60
+
+def sweep_sessions(store):
+    """Delete OAuth states of flows that were never completed, and abandoned sessions"""
+    while True:
+        store.expire_states(OAUTH_STATE_TTL, prefix=OAUTH_STATE_PREFIX)
+        store.expire_states(SESSION_RETENTION)
+        time.sleep(SESSION_SWEEP_INTERVAL)
+
+@st.cache_resource
+def get_session_store():
+    """Session store shared by every session, persisted in the data directory and swept hourly"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    store = SQLiteSessionStore(os.path.join(DATA_DIR, "sessions.sqlite3"))
+    threading.Thread(target=sweep_sessions, args=(store,), name="socialai-session-sweep", daemon=True).start()
+    return store
+
+def requested_session_id():
+    """Session id carried in the URL, or the session that started the OAuth flow being completed
+
+    The OAuth state holds a one-time nonce rather than the session id, so the
+    session never appears in the provider's redirect URLs or logs.
+    """
+    params = st.query_params
+    if 'sid' in params:
+        return params['sid']
+    state = params.get('state', '')
+    if '.' not in state:
+        return None
+    store = get_session_store()
+    key = OAUTH_STATE_PREFIX + state.split('.', 1)[1]
+    pending = store.load_state(key)
+    if pending is None:
+        return None
+    store.delete_state(key)
+    if time.time() - pending['created'] > OAUTH_STATE_TTL:
+        return None
+    return pending['session_id']
+
+def oauth_state(platform):
+    """One-time OAuth state for this session: the platform and a nonce the callback trades back"""
+    nonce = secrets.token_urlsafe(16)
+    get_session_store().save_state(OAUTH_STATE_PREFIX + nonce,
+                                   {'session_id': st.session_state.session_id, 'created': time.time()})
+    return f"{platform}.{nonce}"
+
+def session_snapshot():
+    """JSON-serializable copy of the state worth keeping across restarts
+
+    While the session is in a workspace, its profile, connections and user
+    info belong to the workspace; the private ones saved before joining are
+    kept as they were, and only the workspace id changes.
+    """
+    if st.session_state.workspace_id:
+        state = dict(st.session_state.get('saved_state') or {})
+        state['workspace_id'] = st.session_state.workspace_id
+    else:
+        state = {key: st.session_state[key] for key in PERSISTED_KEYS}
+        state['business_info'] = dict(st.session_state.business_info)
+    state['code_verifiers'] = {
+        key: st.session_state[key] for key in st.session_state if str(key).endswith('_code_verifier')
+    }
+    return state
+
+def restore_session():
+    """Load a returning session's state and its most recent page of history"""
+    store = get_session_store()
+    session_id = st.session_state.session_id
+    state = store.load_state(session_id)
+    if state:
+        for key in PERSISTED_KEYS:
+            if key in state:
+                st.session_state[key] = state[key]
+        st.session_state.business_info.update(state.get('business_info', {}))
+        for key, value in state.get('code_verifiers', {}).items():
+            st.session_state[key] = value
+        st.session_state.memory_type = describe_memory(st.session_state.memory_engine)
+        st.session_state.chat_history = store.load_messages(session_id, limit=HISTORY_PAGE_SIZE)
+        st.session_state.history_total = store.count_messages(session_id)
+    st.session_state.saved_state = state
+    st.query_params['sid'] = session_id
+
+def persist_session():
+    """Queue the session state for writing if it changed during this run"""
+    state = session_snapshot()
+    if state != st.session_state.get('saved_state'):
+        get_session_store().save_state(st.session_state.session_id, state)
+        st.session_state.saved_state = state
+
+def add_message(msg):
+    """Append a message to the history, queue it for the store and spill old messages from memory"""
+    workspace = active_workspace()
+    if workspace:
+        get_workspace_manager().add_message(workspace, msg, window=st.session_state.history_window)
+        st.session_state.history_total = workspace.history_total
+        st.session_state.history_renderer.prune(workspace.history)
+        return
+    
+    history = st.session_state.chat_history
+    history.append(msg)
+    st.session_state.history_total += 1
+    get_session_store().append_messages(st.session_state.session_id, [msg])
+    
+    # Only the visible window stays in memory; older messages are read back on demand
+    overflow = len(history) - st.session_state.history_window
+    if overflow > 0:
+        del history[:overflow]
+        st.session_state.history_renderer.prune(history)
+
+def load_earlier_messages():
+    """Widen the history window, reading older messages back from the store"""
+    st.session_state.history_window += HISTORY_PAGE_SIZE
+    workspace = active_workspace()
+    if workspace:
+        get_workspace_manager().load_earlier(workspace)
+        return
+    
+    history = st.session_state.chat_history
+    if history:
+        older = get_session_store().load_messages(
+            st.session_state.session_id, before_id=history[0]['id'], limit=HISTORY_PAGE_SIZE
+        )
+        history[:0] = older
+
+# --- Workspaces: Business State Shared Between Operators ---
+@st.cache_resource
+def get_workspace_manager():
+    """Active workspaces shared by every session, loaded lazily and saved on eviction"""
+    return WorkspaceManager(get_session_store(), capacity=WORKSPACE_CAPACITY)
+
+def active_workspace():
+    """The workspace this session has joined, loaded on first access, or None"""
+    workspace_id = st.session_state.get('workspace_id')
+    return get_workspace_manager().get(workspace_id) if workspace_id else None
+
+def bind_workspace():
+    """Point this session's profile, connections, history and chatbot at its workspace"""
+    workspace = active_workspace()
+    if workspace is None:
+        return
+    with workspace.lock:
+        st.session_state.business_info = workspace.business_info
+        st.session_state.connections = workspace.connections
+        st.session_state.user_info = workspace.user_info
+        st.session_state.chat_history = workspace.history
+        st.session_state.history_total = workspace.history_total
+        if st.session_state.memory_engine != workspace.memory_engine:
+            st.session_state.memory_engine = workspace.memory_engine
+            st.session_state.memory_type = describe_memory(workspace.memory_engine)
+        if workspace.chatbot:
+            st.session_state.chatbot = workspace.chatbot
+        else:
+            st.session_state.pop('chatbot', None)
+    st.query_params['ws'] = workspace.workspace_id
+
+def sync_workspace():
+    """Hand settings changed during this run back to the workspace and queue it for saving"""
+    workspace = active_workspace()
+    if workspace is None:
+        return
+    with workspace.lock:
+        workspace.memory_engine = st.session_state.memory_engine
+        if st.session_state.get('chatbot'):
+            workspace.chatbot = st.session_state.chatbot
+    get_workspace_manager().save(workspace)
+
+def join_workspace():
+    """Switch this session to the workspace typed in the sidebar, or back to a private one"""
+    workspace_id = st.session_state.workspace_input.strip() or None
+    if workspace_id == st.session_state.workspace_id:
+        return
+    # Save the private profile before the session starts sharing the workspace's
+    persist_session()
+    st.session_state.workspace_id = workspace_id
+    for key in ('business_info', 'connections', 'user_info', 'chat_history', 'history_total', 'chatbot'):
+        st.session_state.pop(key, None)
+    st.session_state.history_window = HISTORY_PAGE_SIZE
+    if workspace_id is None:
+        # Back to the private profile, connections and history saved in the session's row
+        init_session_state()
+        restore_session()
+        st.session_state.workspace_id = None
+        st.query_params.pop('ws', None)
+
+init_session_state()
+bind_workspace()
+
+st.image(assets.thumbnail(APP_LOGO_PATH, APP_LOGO_WIDTH), width=APP_LOGO_WIDTH)
+
+# --- Gemini Chatbot: Shared Model, Per-Session Memory ---
+@st.cache_resource
+def get_chat_model():
+    """Chat model client shared by every session, reusing its connections"""
+    return create_llm(LLM_BACKEND, api_key=GOOGLE_API_KEY)
+
+@st.cache_resource
+def get_llm_scheduler():
+    """Concurrency, rate and fairness limits shared by every session's replies and calendar posts"""
+    return LLMScheduler(max_concurrency=LLM_MAX_CONCURRENCY, rate_per_minute=LLM_RATE_PER_MINUTE)
+
+@st.cache_resource
+def get_response_cache():
+    """Response cache shared by every session, persisted in the data directory"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return ResponseCache(os.path.join(DATA_DIR, "response_cache.sqlite3"))
+
+@st.cache_resource
+def get_metrics_fetcher():
+    """Platform metrics fetcher shared by every session, cached per platform and token"""
+    return MetricsFetcher(get_http_client(), PLATFORMS)
+
+def chatbot_context(metrics):
+    """Prompt variables taken from the business profile and connected platforms"""
+    return {
+        'business_name': st.session_state.business_info['name'] or "Not provided",
+        'platforms': ", ".join(st.session_state.connections.keys()) if st.session_state.connections else "None",
+        'metrics': summarize_metrics(metrics)
+    }
 
-# --- Initialize Gemini Chatbot with Standard Memory ---
 def init_chatbot():
     if 'chatbot' not in st.session_state:
         try:
-            # Get context variables
-            platforms = ", ".join(st.session_state.connections.keys()) if st.session_state.connections else "None"
-            business_name = st.session_state.business_info['name'] or "Not provided"
-            
-            # Create memory with context variables
-            memory = ConversationBufferMemory(
-                memory_key="history",
-                return_messages=True,
-                input_key="input",
-                human_prefix="User",
-                ai_prefix="SocialAI"
-            )
-            
-            # Store context variables in memory
-            memory.save_context(
-                {"input": ""},
-                {"output": f"Business: {business_name}, Platforms: {platforms}"}
-            )
-            
-            st.session_state.memory_type = "Buffer"
-            
-            # Create Gemini 1.5 Flash model
-            llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                google_api_key=GOOGLE_API_KEY,
-                temperature=0.7,
-                convert_system_message_to_human=True
-            )
-            
-            # Custom prompt template
-            template = """
-            You are SocialAI, an expert social media strategist. You help users with:
-            - Content creation ideas
-            - Platform-specific strategies
-            - Audience engagement techniques
-            - Analytics interpretation
-            
-            Conversation History:
-            {history}
-            
-            Current Interaction:
-            User: {input}
-            SocialAI:"""
-            
-            prompt = PromptTemplate(
-                input_variables=["history", "input"],
-                template=template
-            )
-            
-            # Create conversation chain
-            st.session_state.chatbot = ConversationChain(
-                llm=llm,
-                prompt=prompt,
-                memory=memory,
-                verbose=True
-            )
+            engine = st.session_state.memory_engine
+            st.session_state.chatbot = ChatSession(get_chat_model(), engine)
+            st.session_state.chatbot.scheduler = get_llm_scheduler()
+            st.session_state.chatbot.session_id = st.session_state.session_id
+            # Pick up where a restored session left off: a workspace's saved memory,
+            # or the most recent messages of the history
+            workspace = active_workspace()
+            if workspace and workspace.saved_memory:
+                st.session_state.chatbot.restore_memory(workspace.saved_memory)
+            else:
+                st.session_state.chatbot.restore(st.session_state.chat_history)
+            st.session_state.memory_type = describe_memory(engine)
+            sync_workspace()
         except Exception as e:
             st.error(f"Error initializing chatbot: {str(e)}")
 
+def change_memory_engine():
+    """Move the conversation into the newly selected memory engine"""
+    engine = st.session_state.memory_engine
+    if st.session_state.get('chatbot'):
+        st.session_state.chatbot.set_memory_engine(engine)
+    st.session_state.memory_type = describe_memory(engine)
+
+@st.cache_resource
+def get_chat_worker():
+    """Event loop generating every session's replies off the script thread"""
+    return ChatWorker()
+
+def collect_reply():
+    """Move a finished background reply into the history"""
+    job_id = st.session_state.get('pending_reply')
+    if not job_id:
+        return
+    worker = get_chat_worker()
+    job = worker.poll(job_id)
+    if job and job['status'] not in FINISHED:
+        return
+    worker.discard(job_id)
+    st.session_state.pending_reply = None
+    if job is None or job['status'] == JOB_CANCELLED:
+        return
+    if job['status'] == JOB_FAILED:
+        response = f"Sorry, I encountered an error: {job['error']}"
+    else:
+        response = job['text']
+    first_chunk = job['first_chunk'] and job['first_chunk'] - job['submitted']
+    timings = {
+        'latency': round(job['finished'] - job['submitted'], 3),
+        'first_token_latency': first_chunk and round(first_chunk, 3)
+    }
+    profiler.record_reply(**timings, **job['tokens'])
+    add_message(new_message('ai', response, failed=job['status'] == JOB_FAILED, **timings, **job['tokens']))
+
+@st.fragment(run_every=REPLY_POLL_INTERVAL)
+def pending_reply():
+    """Reply bubble refreshed while the worker generates it
+
+    Once the reply is done the app reruns once: that run collects it into
+    the history (and the rerun profile) and no longer draws the fragment,
+    so its polling stops.
+    """
+    job = get_chat_worker().poll(st.session_state.pending_reply)
+    if job is None or job['status'] in FINISHED:
+        st.rerun()
+    text = job['text'] if st.session_state.stream_responses else ""
+    content = text + "▌" if text else "3hree.io is thinking..."
+    st.markdown(render_ai_message({'content': content, 'time': ""}), unsafe_allow_html=True)
+
 # --- Simplified OAuth Flow ---
+@st.cache_resource
+def get_http_client():
+    """Pooled HTTP client shared by every session for platform endpoints"""
+    return HttpClient()
+
+@st.cache_resource
+def get_token_manager():
+    """Tokens of every session, refreshed and health-checked in the background"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return TokenManager(get_http_client(), PLATFORMS, os.path.join(DATA_DIR, "tokens.sqlite3")).start()
+
+@st.cache_resource
+def get_publish_queue():
+    """Scheduled posts of every session, persisted in the data directory"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return PublishQueue(os.path.join(DATA_DIR, "publish_queue.sqlite3"))
+
+@st.cache_resource
+def get_publisher():
+    """Background workers publishing due posts with each owner's managed token"""
+    # No HTTP-level retries: a resent POST could publish twice, so the queue retries instead
+    client = HttpClient(retries=0)
+    return Publisher(get_publish_queue(), client, PLATFORMS, get_token_manager().publish_credentials).start()
+
+def token_owner():
+    """Key the token manager files this session's connections under"""
+    workspace = active_workspace()
+    return workspace.store_key if workspace else st.session_state.session_id
+
+def sync_connections():
+    """Pick up refreshed tokens and health check results; no network calls"""
+    tokens = get_token_manager()
+    owner = token_owner()
+    for platform, token in list(st.session_state.connections.items()):
+        record = tokens.get(owner, platform)
+        if record is None:
+            # Connected before tokens were managed: keep checking it, though it can't be refreshed
+            tokens.store(owner, platform, {'access_token': token},
+                         user=st.session_state.user_info.get(platform))
+            continue
+        if record['access_token'] != token:
+            st.session_state.connections[platform] = record['access_token']
+        if record['user']:
+            st.session_state.user_info[platform] = record['user']
+
 def start_oauth_flow(platform):
     """Generate authorization URL and redirect user"""
     # Generate PKCE codes
@@ -164,7 +541,7 @@ def start_oauth_flow(platform):
         "client_id": PLATFORMS[platform]["client_id"],
         "redirect_uri": REDIRECT_URI,
         "scope": PLATFORMS[platform]["scope"],
-        "state": platform,
+        "state": oauth_state(platform),
         "code_challenge": code_challenge,
         "code_challenge_method": "S256"
     }
@@ -181,36 +558,39 @@ def handle_oauth_callback():
     query_params = st.query_params.to_dict()
     if 'code' in query_params and 'state' in query_params:
         code = query_params['code'][0] if isinstance(query_params['code'], list) else query_params['code']
-        platform = query_params['state'][0] if isinstance(query_params['state'], list) else query_params['state']
+        state = query_params['state'][0] if isinstance(query_params['state'], list) else query_params['state']
+        platform = state.split('.', 1)[0]
         
-        # Get token
-        token_url = PLATFORMS[platform]["token_url"]
-        data = {
-            "grant_type": "authorization_code",
-            "client_id": PLATFORMS[platform]["client_id"],
-            "client_secret": PLATFORMS[platform]["client_secret"],
-            "redirect_uri": REDIRECT_URI,
-            "code": code,
-            "code_verifier": st.session_state.get(f"{platform}_code_verifier", "")
-        }
+        client = get_http_client()
+        code_verifier = st.session_state.get(f"{platform}_code_verifier", "")
         
         try:
-            response = requests.post(token_url, data=data)
-            token_data = response.json()
+            # Get token
+            token_data = exchange_code(client, PLATFORMS[platform], code, code_verifier, REDIRECT_URI)
             
             if 'access_token' in token_data:
                 st.session_state.connections[platform] = token_data['access_token']
                 
                 # Get user info
-                headers = {"Authorization": f"Bearer {token_data['access_token']}"}
-                user_info_url = PLATFORMS[platform]["userinfo_url"]
-                user_response = requests.get(user_info_url, headers=headers)
-                st.session_state.user_info[platform] = user_response.json()
+                st.session_state.user_info[platform] = fetch_user_info(
+                    client, PLATFORMS[platform], token_data['access_token']
+                )
+                
+                # Posts go to the first Page the user manages, with that Page's token
+                page = None
+                if 'pages_url' in PLATFORMS[platform]:
+                    pages = fetch_pages(client, PLATFORMS[platform], token_data['access_token'])
+                    page = pages[0] if pages else None
+                
+                # Keep the refresh token and expiry for background refresh
+                get_token_manager().store(token_owner(), platform, token_data,
+                                          user=st.session_state.user_info[platform], page=page)
                 
                 st.success(f"Connected to {platform}!")
                 
-                # Clear query parameters
+                # Clear query parameters, keeping the session id
                 st.query_params.clear()
+                st.query_params['sid'] = st.session_state.session_id
                 st.rerun()
             else:
                 st.error(f"Failed to get access token: {token_data.get('error_description', '')}")
@@ -221,7 +601,9 @@ def handle_oauth_callback():
 def app_sidebar():
     with st.sidebar:
         # Handle OAuth callback if needed
-        handle_oauth_callback()
+        with profiler.span("oauth_callback"):
+            handle_oauth_callback()
+            sync_connections()
         
         # Sidebar header with logo
         st.markdown("""
@@ -233,7 +615,8 @@ def app_sidebar():
         
         # Business Profile Section
         st.subheader("🏢 Business Profile", divider="gray")
-        with st.form("business_info_form"):
+        # Cleared on submit so the uploaded file isn't kept in the widget's state
+        with st.form("business_info_form", clear_on_submit=True):
             name = st.text_input("Business Name", 
                                 value=st.session_state.business_info['name'],
                                 placeholder="Enter your business name")
@@ -243,16 +626,21 @@ def app_sidebar():
             color = st.color_picker("Primary Brand Color", 
                                    value=st.session_state.business_info['color'])
             
-            if st.form_submit_button("💾 Save Profile", use_container_width=True):
-                st.session_state.business_info = {
+            if st.form_submit_button("💾 Save Profile", width="stretch"):
+                # Only the logo's key is kept; its resized variants live in the logo store
+                logo = st.session_state.business_info['logo']
+                if logo_file:
+                    try:
+                        logo = get_logo_store().put(logo_file.getvalue()).key
+                    except LogoError as e:
+                        st.error(str(e))
+                # Updated in place so a shared workspace profile changes for every operator
+                st.session_state.business_info.update({
                     'name': name,
-                    'logo': logo_file,
+                    'logo': logo,
                     'color': color
-                }
+                })
                 st.success("Business profile saved!")
-                # Reinitialize chatbot to update context
-                if 'chatbot' in st.session_state:
-                    del st.session_state['chatbot']
         
         # Social Connections Section
         st.subheader("🔗 Connect Accounts", divider="gray")
@@ -264,166 +652,270 @@ def app_sidebar():
             with col1:
                 # Use real platform icons if available
                 icon_path = PLATFORMS[platform].get("icon_path")
-                if icon_path and os.path.exists(icon_path):
-                    icon_base64 = get_image_base64(icon_path)
-                    st.image(f"data:image/png;base64,{icon_base64}", width=30)
+                with profiler.span("icons"):
+                    icon = assets.thumbnail(icon_path, PLATFORM_ICON_WIDTH) if icon_path else None
+                if icon:
+                    st.image(icon, width=PLATFORM_ICON_WIDTH)
                 else:
                     st.write("📱")
             with col2:
                 if platform in st.session_state.connections:
-                    user = st.session_state.user_info.get(platform, {})
+                    # Status as of the last background health check
+                    record = get_token_manager().get(token_owner(), platform) or {}
+                    user = record.get('user') or st.session_state.user_info.get(platform, {})
                     name = user.get('name', user.get('username', f"@{user.get('username', 'Connected')}"))
-                    st.success(f"Connected as {name}")
+                    if record.get('status', STATUS_OK) == STATUS_OK:
+                        st.success(f"Connected as {name}")
+                    else:
+                        st.warning(f"{name}: token {record['status']}, please reconnect")
                     if st.button(f"Disconnect {platform}", key=f"disconnect_{platform}", 
-                                type="secondary", use_container_width=True):
-                        st.session_state.connections.pop(platform, None)
+                                type="secondary", width="stretch"):
+                        token = st.session_state.connections.pop(platform, None)
+                        if token:
+                            get_metrics_fetcher().invalidate(platform, token)
+                        get_token_manager().remove(token_owner(), platform)
                         st.session_state.user_info.pop(platform, None)
-                        # Reinitialize chatbot to update context
-                        if 'chatbot' in st.session_state:
-                            del st.session_state['chatbot']
                         st.rerun()
                 else:
                     if st.button(f"Connect {platform}", key=f"connect_{platform}", 
-                                use_container_width=True, type="primary"):
+                                width="stretch", type="primary"):
                         auth_url = start_oauth_flow(platform)
                         st.markdown(f'<meta http-equiv="refresh" content="0; url={auth_url}">', unsafe_allow_html=True)
         
         # WhatsApp Connection
         st.subheader("💬 WhatsApp Business", divider="gray")
         st.info("Connect via Meta Business Suite")
-        if st.button("Open Business Suite", key="whatsapp_help", use_container_width=True):
+        if st.button("Open Business Suite", key="whatsapp_help", width="stretch"):
             js = "window.open('https://business.facebook.com')"
-            st.components.v1.html(f"<script>{js}</script>", height=0)
+            run_script(f"<script>{js}</script>")
         
         # System Status
         st.subheader("⚙️ System Status", divider="gray")
-        st.caption(f"**Session ID:** `{st.session_state.session_id[:8]}...`")
+        st.caption(f"**Session ID:** `{st.session_state.session_id[:8]}...`",
+                   help="The page link (its `sid`) resumes this session, connected accounts included. "
+                        "Treat it like a password: don't share or post it.")
+        st.text_input("Workspace", value=st.session_state.workspace_id or "", key="workspace_input",
+                      on_change=join_workspace, placeholder="Private session",
+                      help="Operators in the same workspace share its profile, accounts and chat. "
+                           "The name is the only key: anyone who enters it can use the connected "
+                           "accounts and publish queue, so pick one that is hard to guess.")
+        if st.session_state.workspace_id:
+            workspaces = get_workspace_manager()
+            st.caption(f"**Workspaces:** {len(workspaces)}/{WORKSPACE_CAPACITY} active, "
+                       f"{workspaces.stats['loads']} loaded, {workspaces.stats['evictions']} evicted")
         st.caption(f"**Memory:** {st.session_state.memory_type}")
-        st.caption(f"**Model:** Gemini 1.5 Flash")
+        last_ai = next((m for m in reversed(st.session_state.chat_history) if m['role'] == 'ai'), None)
+        if last_ai and 'prompt_tokens' in last_ai:
+            st.caption(f"**Last prompt:** {last_ai['prompt_tokens']} tokens "
+                       f"(reply {last_ai['response_tokens']})")
+        st.caption(f"**Model:** {BACKEND_LABELS.get(LLM_BACKEND, LLM_BACKEND)}")
+        queue = get_llm_scheduler().metrics()
+        st.caption(f"**LLM queue:** {queue['queue_depth']} waiting, "
+                   f"{queue['active']}/{LLM_MAX_CONCURRENCY} running, "
+                   f"wait p95 {queue['wait_p95'] * 1000:.0f} ms, {queue['coalesced']} coalesced")
+        st.selectbox("Memory engine", MEMORY_ENGINES, key="memory_engine",
+                     on_change=change_memory_engine,
+                     help="How much conversation history is resent to the model each turn")
+        st.toggle("Stream responses", key="stream_responses",
+                  help="Show the answer as it is generated instead of waiting for the full reply")
+        st.toggle("Cache responses", key="use_response_cache",
+                  help="Answer repeated questions for the same business from a local cache")
+        if st.session_state.use_response_cache:
+            cache = get_response_cache()
+            hits = cache.stats['exact_hits'] + cache.stats['similar_hits']
+            st.caption(f"**Cache:** {hits} hits ({cache.hit_rate():.0%}, "
+                       f"{cache.stats['similar_hits']} similar), "
+                       f"{cache.stats['saved_seconds']:.1f}s saved")
+        
+        # Timing breakdown of this session's recent reruns
+        if profiler.enabled:
+            with st.expander("⏱️ Rerun profile"):
+                runs = profiler.recent_runs(PROFILE_PANEL_RUNS, session=st.session_state.session_id)
+                st.dataframe([
+                    {
+                        'time': datetime.fromtimestamp(run['time']).strftime("%H:%M:%S"),
+                        'total ms': round(run['total'] * 1000, 1),
+                        **{f"{name} ms": round(seconds * 1000, 1) for name, seconds in run['spans'].items()},
+                        **{f"{kind} tokens": count for kind, count in run['tokens'].items()},
+                        **{f"llm {name} ms": round(seconds * 1000, 1)
+                           for reply in run['replies'] for name, seconds in reply.items()}
+                    }
+                    for run in runs
+                ], width="stretch", hide_index=True)
+
+# --- Content Calendar: Batch Post Generation ---
+def content_calendar_panel():
+    with st.expander("📅 Content Calendar", expanded=False):
+        with st.form("content_calendar_form"):
+            platforms = st.multiselect("Platforms", list(PLATFORMS),
+                                       default=list(st.session_state.connections) or list(PLATFORMS))
+            today = date.today()
+            days = st.date_input("Dates", value=(today, today + timedelta(days=6)))
+            submitted = st.form_submit_button("✨ Generate Calendar", width="stretch")
+        
+        table = st.empty()
+        if submitted and platforms and len(days) == 2:
+            start, end = days
+            total = len(plan_calendar(platforms, start, end))
+            progress = st.progress(0.0)
+            entries = []
+            
+            # Show each post as soon as it is generated
+            for entry in generate_calendar(get_chat_model(), st.session_state.business_info,
+                                           platforms, start, end, scheduler=get_llm_scheduler(),
+                                           session_id=st.session_state.session_id):
+                entries.append(entry)
+                entries.sort(key=lambda e: (e['date'], e['platform']))
+                progress.progress(len(entries) / total, text=f"{len(entries)}/{total} posts")
+                table.dataframe(entries, width="stretch", hide_index=True)
+            st.session_state.content_calendar = entries
+        elif st.session_state.get('content_calendar'):
+            table.dataframe(st.session_state.content_calendar, width="stretch", hide_index=True)
+        
+        if st.session_state.get('content_calendar'):
+            st.download_button(
+                "⬇️ Download calendar (JSONL)",
+                "\n".join(json.dumps(e) for e in st.session_state.content_calendar),
+                file_name="content_calendar.jsonl",
+                width="stretch"
+            )
+            if st.button("📤 Schedule calendar posts", width="stretch",
+                         help=f"Queue posts for connected platforms at {CALENDAR_PUBLISH_HOUR}:00 on their day"):
+                counts = schedule_calendar(st.session_state.content_calendar)
+                st.success(f"Scheduled {counts[ADDED]} new posts, updated {counts[UPDATED]}, "
+                           f"{counts[UNCHANGED]} already scheduled")
+                if counts['past']:
+                    st.warning(f"Skipped {counts['past']} posts whose {CALENDAR_PUBLISH_HOUR}:00 slot has passed; "
+                               "schedule them from the Publish Queue")
+                if counts[KEPT]:
+                    st.warning(f"Left {counts[KEPT]} posts that were already sent, cancelled or in review as they were")
+
+def schedule_calendar(entries, now=None):
+    """Queue the calendar's posts for connected platforms
+
+    Scheduling again updates posts that are still queued with the entry's
+    current text. Entries whose publish time has passed are skipped.
+    Returns how many posts were ADDED, UPDATED, UNCHANGED, KEPT or 'past'.
+    """
+    queue = get_publish_queue()
+    owner = token_owner()
+    now = now or time.time()
+    counts = dict.fromkeys((ADDED, UPDATED, UNCHANGED, KEPT, 'past'), 0)
+    for entry in entries:
+        if entry['platform'] not in PUBLISHERS or entry['platform'] not in st.session_state.connections:
+            continue
+        if 'content' not in entry:
+            continue
+        publish_at = datetime.combine(date.fromisoformat(entry['date']), datetime.min.time())
+        publish_at = (publish_at + timedelta(hours=CALENDAR_PUBLISH_HOUR)).timestamp()
+        if publish_at < now:
+            counts['past'] += 1
+            continue
+        post_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{owner}/{entry['date']}/{entry['platform']}"))
+        counts[queue.schedule(owner, entry['platform'], entry['content'], publish_at, post_id)] += 1
+    return counts
+
+# --- Publish Queue: Scheduled Posts ---
+def publish_queue_panel():
+    get_publisher()
+    tokens = get_token_manager()
+    connected = [p for p in st.session_state.connections if p in PUBLISHERS]
+    publishable = [p for p in connected if tokens.publish_credentials(token_owner(), p)]
+    with st.expander("📤 Publish Queue", expanded=False):
+        for platform in connected:
+            if platform not in publishable:
+                st.caption(f"{platform} has no Page to post to; reconnect with an account that manages one")
+        if not publishable:
+            st.caption(f"Connect {' or '.join(PUBLISHERS)} to publish posts")
+            return
+        queue = get_publish_queue()
+        
+        # Draft from the latest reply in the chat
+        last_ai = next((m for m in reversed(st.session_state.chat_history) if m['role'] == 'ai'), None)
+        with st.form("publish_form", clear_on_submit=True):
+            platform = st.selectbox("Platform", publishable)
+            content = st.text_area("Post", value=last_ai['content'] if last_ai else "")
+            col1, col2 = st.columns(2)
+            day = col1.date_input("Date", value=date.today())
+            at = col2.time_input("Time", value=datetime.now().time().replace(second=0, microsecond=0))
+            if st.form_submit_button("🗓️ Schedule post", width="stretch") and content.strip():
+                publish_at = datetime.combine(day, at).timestamp()
+                queue.enqueue(token_owner(), platform, content.strip(), publish_at)
+                st.success(f"Post scheduled for {platform}")
+        
+        posts = queue.posts(token_owner())
+        if posts:
+            st.dataframe([
+                {
+                    'when': datetime.fromtimestamp(post['publish_at']).strftime("%Y-%m-%d %H:%M"),
+                    'platform': post['platform'],
+                    'status': post['status'],
+                    'attempts': post['attempts'],
+                    'post': post['content'][:80],
+                    'error': post['error'] or ""
+                }
+                for post in posts
+            ], width="stretch", hide_index=True)
+            
+            # Posts whose last attempt may have gone out: the user checks the page and settles them
+            for post in posts:
+                if post['status'] != STATUS_UNCERTAIN:
+                    continue
+                st.warning(f"**{post['platform']}:** {post['content'][:80]} — this post may already be "
+                           f"live ({post['error']}). Check the page before sending it again.")
+                col1, col2 = st.columns(2)
+                if col1.button("It's live", key=f"resolve_live_{post['id']}", width="stretch"):
+                    queue.resolve(post['id'], published=True)
+                    st.rerun()
+                if col2.button("Send again", key=f"resolve_retry_{post['id']}", width="stretch"):
+                    queue.resolve(post['id'], published=False)
+                    st.rerun()
 
 # --- Main Area: AI Chat Interface ---
+def inject_chat_styles(brand_color, brand_logo):
+    """Put the chat stylesheet into the page head, once per session and theme"""
+    theme = (brand_color, brand_logo.key if brand_logo else None)
+    if st.session_state.get('injected_theme') == theme:
+        return
+    css = compile_stylesheet(brand_color, brand_logo.css() if brand_logo else "")
+    run_script(theme_injection_html(css))
+    st.session_state.injected_theme = theme
+
+def run_script(html):
+    """Run a script in a frame that takes no room on the page; it can reach the page through window.parent"""
+    st.iframe(html, height=1, tab_index=-1, alt=SCRIPT_FRAME_TITLE)
+
 def ai_chat_interface():
     # Initialize chatbot if not done
     if not st.session_state.get('chatbot'):
-        init_chatbot()
+        with profiler.span("init_chatbot"):
+            init_chatbot()
+    
+    # A reply finished by the chat worker since the last run
+    collect_reply()
+    
+    # Metrics for every connected platform from the cache; missing or stale ones are fetched in the background
+    with profiler.span("metrics_fetch"):
+        metrics = get_metrics_fetcher().fetch(st.session_state.connections) if st.session_state.connections else {}
+    
+    # Keep the prompt context in step with the profile, connections and metrics
+    if st.session_state.get('chatbot'):
+        st.session_state.chatbot.update_context(**chatbot_context(metrics))
+        st.session_state.chatbot.response_cache = (
+            get_response_cache() if st.session_state.use_response_cache else None
+        )
     
     # Get business info
     business_info = st.session_state.business_info
     brand_color = business_info['color']
     
-    # Get logo for AI
-    if business_info['logo']:
-        logo_bytes = business_info['logo'].getvalue()
-        logo_base64 = base64.b64encode(logo_bytes).decode()
-    else:
-        logo_base64 = DEFAULT_LOGO_BASE64
+    # Get logo for AI, resized and encoded once per distinct upload
+    with profiler.span("brand_logo"):
+        logo_key = business_info['logo'] or get_default_logo_key()
+        brand_logo = get_logo_store().get(logo_key) if logo_key else None
     
-    # Responsive CSS for both light and dark themes
-    st.markdown(f"""
-    <style>
-        :root {{
-            --primary: {brand_color};
-            --secondary: #EC4899;
-        }}
-        
-        /* Light theme variables */
-        [data-theme="light"] {{
-            --background: #FFFFFF;
-            --card: #F8FAFC;
-            --text: #0F172A;
-            --border: #E2E8F0;
-            --input-bg: #FFFFFF;
-        }}
-        
-        /* Dark theme variables */
-        [data-theme="dark"] {{
-            --background: #0F172A;
-            --card: #1E293B;
-            --text: #FFFFFF;
-            --border: #334155;
-            --input-bg: #1E293B;
-        }}
-        
-        .chat-container {{
-            max-height: 70vh;
-            overflow-y: auto;
-            width: 200%;
-            padding: 1px;
-            border-radius: 19px;
-            background: var(--card);
-            margin-bottom: 20px;
-            border: 1px solid var(--border);
-        }}
-        
-        .user-message {{
-            background: linear-gradient(45deg, var(--primary), var(--secondary));
-            color: white;
-            border-radius: 20px 20px 0 20px;
-            padding: 1px;
-            margin: 15px 0;
-            max-width: 90%;
-            float: right;
-            clear: both;
-        }}
-        
-        .ai-message {{
-            background: var(--card);
-            color: var(--text);
-            border-radius: 18px 18px 18px 0;
-            padding: 1px;
-            margin: 15px 0;
-            max-width: 80%;
-            float: left;
-            clear: both;
-            border: 1px solid var(--border);
-        }}
-        
-        .message-header {{
-            display: flex;
-            align-items: center;
-            margin-bottom: 8px;
-        }}
-        
-        .message-icon {{
-            width: 30px;
-            height: 30px;
-            border-radius: 50%;
-            object-fit: contain;
-            margin-right: 10px;
-            border: none;
-            background: transparent;
-        }}
-
-        
-        .message-timestamp {{
-            font-size: 0.75rem;
-            opacity: 0.7;
-            margin-top: 8px;
-            text-align: right;
-        }}
-        
-        .stTextInput>div>div>input {{
-            background: var(--input-bg) !important;
-            color: var(--text) !important;
-            border: 1px solid var(--border) !important;
-            border-radius: 16px !important;
-            padding: 10px 10px !important;
-        }}
-        
-        .stChatInput button {{
-            background: linear-gradient(45deg, var(--primary), var(--secondary)) !important;
-            border-radius: 16px !important;
-        }}
-        
-        .welcome-card {{
-            background: var(--card);
-            border-radius: 16px;
-            padding: 2px;
-            border: 1px solid var(--border);
-            margin-bottom: 20px;
-        }}
-    </style>
-    """, unsafe_allow_html=True)
+    with profiler.span("css"):
+        inject_chat_styles(brand_color, brand_logo)
     
     # Header with business info
     col1, col2 = st.columns([0.8, 0.1])
@@ -432,34 +924,39 @@ def ai_chat_interface():
         st.caption("Your AI-Powered Social Media Assistant")
     
     with col2:
-        if business_info['logo']:
-            st.image(business_info['logo'], width=80)
-        elif DEFAULT_LOGO_BASE64:
-            st.image(f"data:image/png;base64,{DEFAULT_LOGO_BASE64}", width=80)
+        if brand_logo:
+            st.image(brand_logo.header, width=HEADER_LOGO_WIDTH)
     
     # Display connected platforms
     if st.session_state.connections:
         platforms = " | ".join([f"**{p}**" for p in st.session_state.connections.keys()])
         st.info(f"🔗 Connected platforms: {platforms}")
+        
+        # Audience metrics per platform
+        if metrics:
+            metric_cols = st.columns(len(metrics))
+            for metric_col, (platform, values) in zip(metric_cols, metrics.items()):
+                with metric_col:
+                    if 'error' in values:
+                        st.caption(f"{platform}: metrics unavailable")
+                    elif 'loading' in values:
+                        st.caption(f"{platform}: loading metrics...")
+                    else:
+                        label = 'followers' if 'followers' in values else 'posts'
+                        st.metric(f"{platform} {label}", f"{values.get(label, 0):,}",
+                                  help=", ".join(f"{k}: {v}" for k, v in values.items()))
     
     # Display business name if set
     if business_info['name']:
         st.info(f"🏢 Business: {business_info['name']}")
     
-    # Welcome card
-    st.markdown("""
-    <div class="welcome-card">
-        <h3 style="margin-top: 0;">Hello! I'm your AI-powered social media strategist</h3>
-        <p>I can help you with:</p>
-        <ul>
-            <li>💡 Content creation ideas</li>
-            <li>📊 Platform-specific strategies</li>
-            <li>🤝 Audience engagement techniques</li>
-            <li>📈 Analytics interpretation</li>
-        </ul>
-        <p>How can I assist with your social media today?</p>
-    </div>
-    """, unsafe_allow_html=True)
+    content_calendar_panel()
+    publish_queue_panel()
+    
+    # Welcome card, until the conversation starts
+    welcome = st.empty()
+    if not st.session_state.history_total:
+        welcome.markdown(WELCOME_CARD, unsafe_allow_html=True)
     
     # Chat container
     chat_container = st.container()
@@ -468,30 +965,24 @@ def ai_chat_interface():
     with chat_container:
         st.markdown('<div class="chat-container">', unsafe_allow_html=True)
         
-        if st.session_state.chat_history:
-            for msg in st.session_state.chat_history:
-                if msg['role'] == 'user':
-                    st.markdown(f"""
-                    <div class="user-message">
-                        <div class="message-header">
-                            <div>👤</div>
-                            <strong>You</strong>
-                        </div>
-                        {msg['content']}
-                        <div class="message-timestamp">{msg['time']}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="ai-message">
-                        <div class="message-header">
-                            <img src="data:image/png;base64,{logo_base64}" class="message-icon">
-                            <strong>3hree.io</strong>
-                        </div>
-                        {msg['content']}
-                        <div class="message-timestamp">{msg['time']}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+        history = st.session_state.chat_history
+        hidden = st.session_state.history_total - min(len(history), st.session_state.history_window)
+        if hidden > 0:
+            if st.button(f"⬆️ Load earlier messages ({hidden} hidden)", key="load_earlier"):
+                load_earlier_messages()
+                st.rerun()
+        
+        if history:
+            # Cached fragments for the visible window, sent as a single element
+            with profiler.span("history_render"):
+                html = st.session_state.history_renderer.render(
+                    history, window=st.session_state.history_window
+                )
+                st.markdown(html, unsafe_allow_html=True)
+        
+        # The reply being generated, if any
+        if st.session_state.get('pending_reply'):
+            pending_reply()
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -500,30 +991,34 @@ def ai_chat_interface():
     
     if user_input:
         # Add user message to history
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.session_state.chat_history.append({
-            'role': 'user',
-            'content': user_input,
-            'time': timestamp
-        })
+        question = new_message('user', user_input, platforms=mentioned_platforms(user_input, PLATFORMS))
+        add_message(question)
+        renderer = st.session_state.history_renderer
+        replacing = st.session_state.get('pending_reply')
+        chatbot = st.session_state.get('chatbot')
+        failure = None
         
-        # Get AI response
-        with st.spinner("3hree.io is thinking..."):
-            try:
-                response = st.session_state.chatbot.predict(input=user_input)
-            except Exception as e:
-                response = f"Sorry, I encountered an error: {str(e)}"
+        if chatbot:
+            # Generated on the chat worker, replacing any reply still in progress for this
+            # conversation (the workspace's, or the session's)
+            st.session_state.pending_reply = get_chat_worker().submit(token_owner(), chatbot, user_input)
+        else:
+            failure = new_message('ai', "Sorry, the assistant isn't available right now.", failed=True)
+            add_message(failure)
         
-        # Add AI response to history
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.session_state.chat_history.append({
-            'role': 'ai',
-            'content': response,
-            'time': timestamp
-        })
+        if replacing:
+            # The replaced reply's bubble is already on the page; redraw it all
+            st.rerun()
         
-        # Rerun to update display
-        st.rerun()
+        # Drawn in place rather than rerunning the script; the rerun once the reply is done
+        # shows them in the history
+        welcome.empty()
+        with chat_container:
+            st.markdown(renderer.fragment(question), unsafe_allow_html=True)
+            if failure:
+                st.markdown(renderer.fragment(failure), unsafe_allow_html=True)
+            else:
+                pending_reply()
 
 # --- Main App Layout ---
 st.set_page_config(
@@ -536,10 +1031,18 @@ st.set_page_config(
 # Create columns for layout
 col1, col2 = st.columns([0.5, 1.5])
 
-# Sidebar for business info and authentication
-with col1:
-    app_sidebar()
-
-# Main area for chatbot
-with col2:
-    ai_chat_interface()
+try:
+    # Sidebar for business info and authentication
+    with col1:
+        app_sidebar()
+    
+    # Main area for chatbot
+    with col2:
+        ai_chat_interface()
+    
+    # Save session state changes made during this run
+    with profiler.span("persist"):
+        persist_session()
+        sync_workspace()
+finally:
+    profiler.finish_run(session=st.session_state.session_id)
@@ -0,0 +1 @@
+"""Support modules for the 3hree.io SocialAI dashboard (lively.py)"""
@@ -0,0 +1,215 @@
+"""Image assets encoded once and shared across reruns and sessions, and uploaded brand logos"""
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, features
+
+# Display sizes used by the UI, in CSS pixels
+MESSAGE_ICON_SIZE = 30
+PLATFORM_ICON_WIDTH = 30
+HEADER_LOGO_WIDTH = 80
+# Encode at 2x so icons stay sharp on high-DPI screens
+PIXEL_DENSITY = 2
+
+# Brand logos held decoded in memory; the rest are read back from the logo directory
+MAX_CACHED_LOGOS = 64
+# Uploads are rejected above these sizes, before anything is decoded
+MAX_LOGO_BYTES = 5 * 2**20
+MAX_LOGO_PIXELS = 25_000_000
+LOGO_FORMATS = ("PNG", "JPEG")
+# Widths, in CSS pixels, the logo is shown at
+LOGO_WIDTHS = (MESSAGE_ICON_SIZE, HEADER_LOGO_WIDTH)
+WEBP_QUALITY = 90
+WEBP_SUPPORTED = features.check("webp")
+
+
+class LogoError(ValueError):
+    """An uploaded logo that can't be used, with a message fit for the user"""
+
+
+def resize_image(data, width):
+    """Downsize image bytes to at most `width` pixels wide and return PNG bytes"""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGBA")
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue()
+
+
+def encode_image(img):
+    """Encode as WebP where Pillow supports it, PNG otherwise; returns (bytes, extension)"""
+    out = io.BytesIO()
+    if WEBP_SUPPORTED:
+        img.save(out, format="WEBP", quality=WEBP_QUALITY)
+        return out.getvalue(), "webp"
+    img.save(out, format="PNG", optimize=True)
+    return out.getvalue(), "png"
+
+
+def validate_logo(data):
+    """Raise LogoError unless `data` is a PNG or JPEG of reasonable size"""
+    if not data:
+        raise LogoError("The logo file is empty.")
+    if len(data) > MAX_LOGO_BYTES:
+        raise LogoError(f"Logos must be under {MAX_LOGO_BYTES // 2**20} MB.")
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format not in LOGO_FORMATS:
+                raise LogoError("Logos must be PNG or JPEG images.")
+            if img.width * img.height > MAX_LOGO_PIXELS:
+                raise LogoError(f"Logos must be under {MAX_LOGO_PIXELS // 1_000_000} megapixels.")
+            img.verify()
+    except LogoError:
+        raise
+    except Exception as e:
+        raise LogoError("The logo could not be read as a PNG or JPEG image.") from e
+
+
+def logo_variants(data):
+    """Decode the image once and return {width: (bytes, extension)} for every LOGO_WIDTHS size"""
+    targets = sorted((width * PIXEL_DENSITY for width in LOGO_WIDTHS), reverse=True)
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEGs decode straight at a reduced scale, still at least the largest target
+        img.draft("RGB", (targets[0], targets[0]))
+        img = img.convert("RGBA")
+        variants = {}
+        # Targets run largest first, so each size is resampled from the previous, larger one
+        for target in targets:
+            if img.width > target:
+                height = max(1, round(img.height * target / img.width))
+                img = img.resize((target, height), Image.LANCZOS)
+            variants[target // PIXEL_DENSITY] = encode_image(img)
+    return variants
+
+
+class BrandLogo:
+    """A business logo's encoded display sizes, keyed by the upload's content hash"""
+
+    def __init__(self, key, variants):
+        self.key = key
+        self.icon, self.icon_format = variants[MESSAGE_ICON_SIZE]
+        self.icon_base64 = base64.b64encode(self.icon).decode()
+        self.header, self.header_format = variants[HEADER_LOGO_WIDTH]
+
+    def css(self):
+        """CSS rule that paints the logo into every `.brand-logo` element"""
+        return f"""
+        .brand-logo {{
+            background-image: url("data:image/{self.icon_format};base64,{self.icon_base64}");
+            background-size: contain;
+            background-repeat: no-repeat;
+            background-position: center;
+        }}
+        """
+
+
+class LogoStore:
+    """Uploaded logos kept as small encoded variants on disk, with an LRU in memory
+
+    `put` validates an upload and writes its variants once per content
+    hash; the app keeps only the returned key, never the upload itself.
+    """
+
+    def __init__(self, directory, max_cached=MAX_CACHED_LOGOS):
+        self.directory = directory
+        self.max_cached = max_cached
+        os.makedirs(directory, exist_ok=True)
+        self._logos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key, width, extension):
+        return os.path.join(self.directory, f"{key}-{width}.{extension}")
+
+    def put(self, data):
+        """Validate and store image bytes; returns the BrandLogo. Raises LogoError"""
+        key = hashlib.sha256(data).hexdigest()[:16]
+        logo = self.get(key)
+        if logo:
+            return logo
+        validate_logo(data)
+        variants = logo_variants(data)
+        for width, (encoded, extension) in variants.items():
+            path = self._path(key, width, extension)
+            with open(path + ".tmp", "wb") as f:
+                f.write(encoded)
+            os.replace(path + ".tmp", path)
+        logo = BrandLogo(key, variants)
+        self._remember(logo)
+        return logo
+
+    def get(self, key):
+        """The BrandLogo stored under `key`, or None"""
+        with self._lock:
+            if key in self._logos:
+                self._logos.move_to_end(key)
+                return self._logos[key]
+        variants = {}
+        for width in LOGO_WIDTHS:
+            for extension in ("webp", "png"):
+                path = self._path(key, width, extension)
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        variants[width] = (f.read(), extension)
+                    break
+            else:
+                return None
+        logo = BrandLogo(key, variants)
+        self._remember(logo)
+        return logo
+
+    def _remember(self, logo):
+        with self._lock:
+            self._logos[logo.key] = logo
+            while len(self._logos) > self.max_cached:
+                self._logos.popitem(last=False)
+
+
+class AssetRegistry:
+    """Bundled images read, downsized and encoded once per process
+
+    Entries are keyed by path and reloaded when the file's mtime changes.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, path):
+        full_path = os.path.join(self.base_dir, path)
+        try:
+            mtime = os.stat(full_path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry['mtime'] != mtime:
+                with open(full_path, "rb") as f:
+                    entry = {'mtime': mtime, 'data': f.read(), 'thumbnails': {}}
+                self._entries[path] = entry
+            return entry
+
+    def raw(self, path):
+        """Return the original file bytes, or None if the file is missing"""
+        entry = self._entry(path)
+        return entry['data'] if entry else None
+
+    def thumbnail(self, path, width):
+        """Return PNG bytes for the image downsized to a display width"""
+        entry = self._entry(path)
+        if entry is None:
+            return None
+        thumbnails = entry['thumbnails']
+        if width not in thumbnails:
+            try:
+                thumbnails[width] = resize_image(entry['data'], width * PIXEL_DENSITY)
+            except Exception:
+                thumbnails[width] = None
+        return thumbnails[width]
@@ -0,0 +1,216 @@
+"""Per-session chat state on top of a shared chat model"""
+import asyncio
+import time
+from contextlib import nullcontext
+
+from langchain.prompts import PromptTemplate
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from socialai.llm import estimate_tokens
+from socialai.memory import build_memory, switch_memory
+
+CHAT_TEMPLATE = """
+You are SocialAI, an expert social media strategist. You help users with:
+- Content creation ideas
+- Platform-specific strategies
+- Audience engagement techniques
+- Analytics interpretation
+
+Business: {business_name}
+Connected platforms: {platforms}
+Audience metrics: {metrics}
+
+Conversation History:
+{history}
+
+Current Interaction:
+User: {input}
+SocialAI:"""
+
+# Messages replayed into memory when a saved conversation is resumed
+RESTORE_MESSAGES = 12
+
+CHAT_PROMPT = PromptTemplate(
+    input_variables=["business_name", "platforms", "metrics", "history", "input"],
+    template=CHAT_TEMPLATE
+)
+
+
+class ChatSession:
+    """Memory and prompt context for one conversation
+
+    The model client is shared between sessions; only the memory and the
+    business context are per session, so profile edits are a dict update.
+    """
+
+    def __init__(self, llm, memory_engine, prompt=CHAT_PROMPT):
+        self.llm = llm
+        self.prompt = prompt
+        self.memory = build_memory(memory_engine, llm)
+        self.context = {'business_name': "Not provided", 'platforms': "None", 'metrics': "Not available"}
+        self.turn_tokens = {}
+        # Optional shared ResponseCache, set by the app when caching is enabled
+        self.response_cache = None
+        # Optional shared LLMScheduler and the session id it queues this session under
+        self.scheduler = None
+        self.session_id = None
+
+    def restore(self, messages):
+        """Seed memory with the most recent messages of a restored conversation"""
+        for msg in messages[-RESTORE_MESSAGES:]:
+            if msg['role'] == 'user':
+                self.memory.chat_memory.add_user_message(msg['content'])
+            else:
+                self.memory.chat_memory.add_ai_message(msg['content'])
+        if hasattr(self.memory, 'prune'):
+            self.memory.prune()
+
+    def memory_state(self):
+        """JSON-serializable copy of the memory: its messages and any running summary"""
+        return {
+            'messages': messages_to_dict(self.memory.chat_memory.messages),
+            'summary': getattr(self.memory, 'moving_summary_buffer', "")
+        }
+
+    def restore_memory(self, state):
+        """Load memory saved by `memory_state`, in place of replaying history"""
+        self.memory.chat_memory.add_messages(messages_from_dict(state.get('messages', [])))
+        if state.get('summary') and hasattr(self.memory, 'moving_summary_buffer'):
+            self.memory.moving_summary_buffer = state['summary']
+        if hasattr(self.memory, 'prune'):
+            self.memory.prune()
+
+    def update_context(self, **values):
+        """Change prompt variables such as the business name or connected platforms"""
+        self.context.update(values)
+
+    def set_memory_engine(self, engine):
+        """Move the conversation into another memory engine"""
+        self.memory = switch_memory(self.memory, engine, self.llm)
+
+    def build_prompt(self, user_input):
+        """Format the prompt from the context, the bounded memory and the new input"""
+        history = self.memory.load_memory_variables({})[self.memory.memory_key]
+        return self.prompt.format(history=history, input=user_input, **self.context)
+
+    def record_usage(self, prompt_text, message):
+        """Record the turn's token counts and return the response text"""
+        response = message.content if message is not None else ""
+
+        # Prefer the counts the model reports; estimate when they are missing
+        usage = getattr(message, 'usage_metadata', None) or {}
+        self.turn_tokens = {
+            'prompt_tokens': usage.get('input_tokens') or estimate_tokens(prompt_text),
+            'response_tokens': usage.get('output_tokens') or estimate_tokens(response)
+        }
+        return response
+
+    def finish_turn(self, user_input, prompt_text, message):
+        """Save the completed turn to memory and record its token counts"""
+        response = self.record_usage(prompt_text, message)
+        # Summarizing memories prune here, only when the history is over budget
+        self.memory.save_context({"input": user_input}, {"response": response})
+        return response
+
+    async def afinish_turn(self, user_input, prompt_text, message):
+        """Async counterpart of `finish_turn`; a summary update doesn't block the event loop"""
+        response = self.record_usage(prompt_text, message)
+        await self.memory.asave_context({"input": user_input}, {"response": response})
+        return response
+
+    def stands_alone(self):
+        """Whether the next answer depends only on the question and the business context
+
+        Only such turns use the response cache: a follow-up like "make it
+        shorter" means something different in every conversation.
+        """
+        return not self.memory.chat_memory.messages and not getattr(self.memory, 'moving_summary_buffer', "")
+
+    def cached_response(self, user_input):
+        """Return a cached answer for the input, saving the turn to memory on a hit"""
+        if self.response_cache is None or not self.stands_alone():
+            return None
+        response = self.response_cache.get(user_input, self.context)
+        if response is not None:
+            self.turn_tokens = {
+                'prompt_tokens': 0,
+                'response_tokens': estimate_tokens(response),
+                'cached': True
+            }
+            self.memory.save_context({"input": user_input}, {"response": response})
+        return response
+
+    def store_response(self, user_input, response, started, cacheable):
+        """Add a freshly generated response to the cache, if enabled and the turn stood alone"""
+        if self.response_cache is not None and cacheable and response:
+            self.response_cache.put(user_input, self.context, response, time.perf_counter() - started)
+
+    def predict(self, user_input):
+        """Return the full response for a user message"""
+        self.turn_tokens = {}
+        cached = self.cached_response(user_input)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        cacheable = self.stands_alone()
+        prompt_text = self.build_prompt(user_input)
+        if self.scheduler is None:
+            message = self.llm.invoke(prompt_text)
+        else:
+            # Identical prompts already in flight share one model call
+            message = self.scheduler.call(self.session_id, prompt_text, lambda: self.llm.invoke(prompt_text))
+        response = self.finish_turn(user_input, prompt_text, message)
+        self.store_response(user_input, response, started, cacheable)
+        return response
+
+    def stream(self, user_input):
+        """Yield response chunks and save the finished turn to memory once"""
+        self.turn_tokens = {}
+        cached = self.cached_response(user_input)
+        if cached is not None:
+            yield cached
+            return
+
+        started = time.perf_counter()
+        cacheable = self.stands_alone()
+        prompt_text = self.build_prompt(user_input)
+
+        message = None
+        slot = self.scheduler.slot(self.session_id) if self.scheduler else nullcontext()
+        with slot:
+            for chunk in self.llm.stream(prompt_text):
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    yield chunk.content
+
+        response = self.finish_turn(user_input, prompt_text, message)
+        self.store_response(user_input, response, started, cacheable)
+
+    async def astream(self, user_input):
+        """Async counterpart of `stream`, for the event-loop chat worker
+
+        If the consuming task is cancelled, the turn is dropped and memory
+        is left as it was.
+        """
+        self.turn_tokens = {}
+        # Cache lookups and writes touch SQLite, so they run off the event loop
+        cached = await asyncio.to_thread(self.cached_response, user_input)
+        if cached is not None:
+            yield cached
+            return
+
+        started = time.perf_counter()
+        cacheable = self.stands_alone()
+        prompt_text = self.build_prompt(user_input)
+
+        message = None
+        slot = self.scheduler.aslot(self.session_id) if self.scheduler else nullcontext()
+        async with slot:
+            async for chunk in self.llm.astream(prompt_text):
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    yield chunk.content
+
+        response = await self.afinish_turn(user_input, prompt_text, message)
+        await asyncio.to_thread(self.store_response, user_input, response, started, cacheable)
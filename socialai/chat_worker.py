@@ -0,0 +1,149 @@
+"""Chat turns run on one asyncio event loop, outside the Streamlit script thread
+
+A script run submits a user turn and gets a job id back straight away; the
+reply is generated on the worker's event loop, where every session's model
+calls are multiplexed without a thread each. Later runs poll the job for
+the text so far and collect it once finished. Submitting a new turn for a
+conversation cancels the one it supersedes.
+"""
+import asyncio
+import threading
+import time
+import uuid
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Finished jobs nobody collected are dropped after this many seconds
+JOB_TTL = 10 * 60
+
+
+class ChatWorker:
+    """Background event loop generating chat replies as pollable jobs"""
+
+    def __init__(self, job_ttl=JOB_TTL):
+        self.job_ttl = job_ttl
+        self.stats = {'submitted': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+        self._jobs = {}
+        self._futures = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="socialai-chat-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, conversation, chatbot, user_input):
+        """Start generating a reply; returns the job id
+
+        `conversation` identifies whose turn this is (a session or a
+        workspace). An unfinished earlier job for it is cancelled.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'conversation': conversation,
+            'status': JOB_QUEUED,
+            'text': "",
+            'tokens': {},
+            'error': None,
+            'submitted': time.time(),
+            'first_chunk': None,
+            'finished': None
+        }
+        with self._lock:
+            self._expire()
+            superseded = self._latest.get(conversation)
+            self._jobs[job_id] = job
+            self._latest[conversation] = job_id
+            self.stats['submitted'] += 1
+        if superseded:
+            self.cancel(superseded)
+        future = asyncio.run_coroutine_threadsafe(self._run(job, chatbot, user_input), self._loop)
+        with self._lock:
+            self._futures[job_id] = future
+        return job_id
+
+    async def _run(self, job, chatbot, user_input):
+        self._update(job, status=JOB_RUNNING)
+        try:
+            async for chunk in chatbot.astream(user_input):
+                with self._lock:
+                    if job['first_chunk'] is None:
+                        job['first_chunk'] = time.time()
+                    job['text'] += chunk
+            self._finish(job, JOB_DONE, tokens=dict(chatbot.turn_tokens))
+        except asyncio.CancelledError:
+            self._finish(job, JOB_CANCELLED)
+            raise
+        except Exception as e:
+            self._finish(job, JOB_FAILED, error=str(e))
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _finish(self, job, status, **fields):
+        with self._lock:
+            if job['status'] in FINISHED:
+                return
+            job.update(fields, status=status, finished=time.time())
+            self._futures.pop(job['id'], None)
+            self.stats[status] += 1
+
+    def cancel(self, job_id):
+        """Stop a job if it hasn't finished; returns whether it was cancelled"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None or job['status'] in FINISHED:
+            return False
+        if future is not None:
+            future.cancel()
+        # A job cancelled before it started never runs its own cleanup
+        self._finish(job, JOB_CANCELLED)
+        return True
+
+    def poll(self, job_id):
+        """Snapshot of a job: status, text so far, tokens, error and timestamps. None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def discard(self, job_id):
+        """Forget a collected job"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job and self._latest.get(job['conversation']) == job_id:
+                del self._latest[job['conversation']]
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes; for scripts and benchmarks, not the app's script thread"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout)
+            except BaseException:
+                pass
+        return self.poll(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job['finished'] and job['finished'] < cutoff:
+                del self._jobs[job_id]
+                if self._latest.get(job['conversation']) == job_id:
+                    del self._latest[job['conversation']]
+
+    def active(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return len(self._futures)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,139 @@
+"""Batch generation of a content calendar: one post per platform per day
+
+Usable from the dashboard or from the command line without Streamlit:
+
+    python -m socialai.content_batch --business "Stub Bakery" \\
+        --platforms Instagram Twitter --start 2026-11-02 --days 7 --output calendar.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+
+from langchain.prompts import PromptTemplate
+
+from socialai.llm import LLM_BACKENDS, create_llm
+from socialai.ratelimit import RateLimiter
+
+DEFAULT_WORKERS = 4
+# Gemini 1.5 Flash free tier allows 15 requests per minute
+DEFAULT_RATE_PER_MINUTE = 15
+
+PLATFORM_GUIDANCE = {
+    "Twitter": "Keep it under 280 characters with at most two hashtags.",
+    "Instagram": "Write a caption with a strong first line, emojis welcome, and 5-10 hashtags. Suggest the image.",
+    "Facebook": "Write a friendly post of 2-4 sentences ending with a question to drive comments."
+}
+
+POST_PROMPT = PromptTemplate(
+    input_variables=["business_name", "platform", "day", "guidance"],
+    template="""
+You are SocialAI, an expert social media strategist.
+Write one ready-to-publish {platform} post for {business_name} to go out on {day}.
+{guidance}
+Reply with the post text only."""
+)
+
+
+def plan_calendar(platforms, start, end):
+    """List (day, platform) slots from start to end inclusive"""
+    slots = []
+    day = start
+    while day <= end:
+        for platform in platforms:
+            slots.append((day, platform))
+        day += timedelta(days=1)
+    return slots
+
+
+def generate_post(llm, business_name, day, platform, scheduler=None, session_id=None):
+    """Generate a single calendar entry, through the scheduler if one is given"""
+    prompt_text = POST_PROMPT.format(
+        business_name=business_name or "a small business",
+        platform=platform,
+        day=day.strftime("%A %d %B %Y"),
+        guidance=PLATFORM_GUIDANCE.get(platform, "")
+    )
+    if scheduler is None:
+        result = llm.invoke(prompt_text)
+    else:
+        # Shares the app's model limits; the same post requested twice at once is generated once
+        result = scheduler.call(session_id, prompt_text, lambda: llm.invoke(prompt_text))
+    return getattr(result, 'content', result).strip()
+
+
+def generate_calendar(llm, business_info, platforms, start, end,
+                      workers=DEFAULT_WORKERS, rate_per_minute=DEFAULT_RATE_PER_MINUTE,
+                      scheduler=None, session_id=None):
+    """Yield calendar entries as they complete
+
+    At most `workers` requests are in flight and no more than `rate_per_minute`
+    start per minute. With an LLMScheduler, its limits apply instead of the
+    rate, shared with every other model call it schedules. Each entry is a
+    dict with date, platform and content, or error if that post failed.
+    """
+    limiter = RateLimiter(rate_per_minute, burst=workers) if scheduler is None else None
+    business_name = business_info.get('name', '')
+
+    def run(day, platform):
+        if limiter:
+            limiter.acquire()
+        started = time.perf_counter()
+        entry = {'date': day.isoformat(), 'platform': platform}
+        try:
+            entry['content'] = generate_post(llm, business_name, day, platform, scheduler, session_id)
+        except Exception as e:
+            entry['error'] = str(e)
+        entry['seconds'] = round(time.perf_counter() - started, 3)
+        return entry
+
+    slots = iter(plan_calendar(platforms, start, end))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="socialai-batch") as pool:
+        pending = set()
+
+        def submit_next():
+            slot = next(slots, None)
+            if slot is not None:
+                pending.add(pool.submit(run, *slot))
+
+        # Keep the queue only as deep as the pool so results stream out in step
+        for _ in range(workers):
+            submit_next()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                submit_next()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a social media content calendar")
+    parser.add_argument("--business", required=True, help="business name")
+    parser.add_argument("--platforms", nargs="+", required=True, help="e.g. Facebook Twitter Instagram")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today(), help="first day, YYYY-MM-DD")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_MINUTE, help="max requests per minute")
+    parser.add_argument("--output", help="JSONL file to write (default: stdout)")
+    parser.add_argument("--backend", choices=sorted(LLM_BACKENDS), default="gemini",
+                        help="chat model backend; gemini reads GOOGLE_API_KEY from the environment")
+    args = parser.parse_args(argv)
+
+    llm = create_llm(args.backend)
+
+    end = args.start + timedelta(days=args.days - 1)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for entry in generate_calendar(llm, {'name': args.business}, args.platforms, args.start, end,
+                                       workers=args.workers, rate_per_minute=args.rate):
+            out.write(json.dumps(entry) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Incremental export and import of the chat history of every session
+
+Messages are appended to a gzip-compressed JSONL file, one flat record per
+line: the message fields plus the `session_id` (the store key, so shared
+workspaces appear as `workspace:<id>`) and the store's `seq`. Each export
+run streams only the messages stored since the previous run, using a
+watermark kept in the session store, and adds them as a new gzip member,
+so earlier output is never rewritten. The file reads back as one stream
+with gzip or zcat, and loads directly into pandas, DuckDB or Polars.
+
+    python -m socialai.history_export export --db .socialai/sessions.sqlite3 \\
+        --output exports/history.jsonl.gz
+    python -m socialai.history_export import --db restored.sqlite3 exports/history.jsonl.gz
+
+The watermark only moves once the new records are synced to disk; a failed
+run truncates the file back to where it started.
+"""
+import argparse
+import gzip
+import json
+import os
+
+from socialai.session_store import SQLiteSessionStore
+
+# Records compressed per write
+EXPORT_CHUNK = 1000
+
+
+def export_messages(store, path, name=None, chunk=EXPORT_CHUNK):
+    """Append the messages stored since the last export to `path`; returns how many were written
+
+    `name` identifies the export's watermark and defaults to the absolute
+    output path, so exports to different files are independent.
+    """
+    name = name or os.path.abspath(path)
+    watermark = last = store.export_watermark(name)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    written = 0
+    with open(path, "ab") as raw:
+        start = raw.tell()
+        out = None
+        try:
+            lines = []
+            for seq, session_id, msg in store.messages_after(watermark):
+                lines.append(json.dumps({'session_id': session_id, 'seq': seq, **msg}, ensure_ascii=False))
+                last = seq
+                if len(lines) >= chunk:
+                    out = _write_lines(raw, out, lines)
+                    written += len(lines)
+                    lines = []
+            if lines:
+                out = _write_lines(raw, out, lines)
+                written += len(lines)
+            if out is not None:
+                out.close()
+                raw.flush()
+                os.fsync(raw.fileno())
+        except BaseException:
+            raw.truncate(start)
+            raise
+
+    if written:
+        store.set_export_watermark(name, last)
+        store.flush()
+    return written
+
+
+def _write_lines(raw, out, lines):
+    # The gzip member is only started once there is something to write
+    if out is None:
+        out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+    out.write(("\n".join(lines) + "\n").encode("utf-8"))
+    return out
+
+
+def read_records(paths):
+    """Yield the records of one or more exported files, in file order"""
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def import_messages(store, paths):
+    """Append exported records to the store; returns how many were imported
+
+    Messages a session already holds (by id) are skipped, so importing the
+    same file twice, or a file with duplicate records, adds each message once.
+    Imported messages get new sequence numbers and are exported again like
+    any others.
+    """
+    known = {}
+    imported = 0
+    for record in read_records(paths):
+        session_id = record.pop('session_id')
+        record.pop('seq', None)
+        ids = known.get(session_id)
+        if ids is None:
+            ids = known[session_id] = store.message_ids(session_id)
+        if record['id'] in ids:
+            continue
+        ids.add(record['id'])
+        store.append_messages(session_id, [record])
+        imported += 1
+    store.flush()
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import the chat history of every session")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="append messages stored since the last export")
+    export.add_argument("--db", required=True, help="session store, e.g. .socialai/sessions.sqlite3")
+    export.add_argument("--output", required=True, help="JSONL.gz file to append to")
+    export.add_argument("--name", help="watermark name (default: the output path)")
+    restore = commands.add_parser("import", help="add exported messages to a session store")
+    restore.add_argument("--db", required=True, help="session store to import into")
+    restore.add_argument("files", nargs="+", help="exported JSONL.gz files")
+    args = parser.parse_args(argv)
+
+    store = SQLiteSessionStore(args.db)
+    try:
+        if args.command == "export":
+            count = export_messages(store, args.output, name=args.name)
+            print(f"exported {count} messages to {args.output}")
+        else:
+            count = import_messages(store, args.files)
+            print(f"imported {count} messages")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Usage statistics over exported chat history, computed offline in one pass
+
+Reads the files written by socialai.history_export and reports questions
+per platform and per day, reply lengths, reply latency and token counts.
+Records exported more than once are counted once.
+
+    python -m socialai.history_stats exports/history.jsonl.gz
+    python -m socialai.history_stats exports/*.jsonl.gz --since 2026-10-01 --json
+"""
+import argparse
+import json
+from collections import Counter
+
+from socialai.history_export import read_records
+
+NO_PLATFORM = "(none)"
+
+
+def summarize(values):
+    """Count, mean and p50/p95/max of a list of numbers"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered),
+        'p50': pct(50),
+        'p95': pct(95),
+        'max': ordered[-1]
+    }
+
+
+def aggregate(records, since=None):
+    """Statistics of an iterable of exported records
+
+    `since` is an ISO date; messages created before it, and messages
+    from before timestamps were recorded, are left out.
+    """
+    seen = set()
+    sessions = set()
+    questions = Counter()
+    per_day = Counter()
+    reply_chars, reply_tokens, prompt_tokens = [], [], []
+    latency, first_token = [], []
+    counts = Counter()
+
+    for record in records:
+        key = (record['session_id'], record['id'])
+        if key in seen:
+            continue
+        seen.add(key)
+        created = record.get('created')
+        if since and (not created or created[:10] < since):
+            continue
+        sessions.add(record['session_id'])
+        counts['messages'] += 1
+
+        if record['role'] == 'user':
+            counts['questions'] += 1
+            questions.update(record.get('platforms') or (NO_PLATFORM,))
+            if created:
+                per_day[created[:10]] += 1
+            continue
+
+        counts['replies'] += 1
+        if record.get('failed'):
+            counts['failed'] += 1
+            continue
+        if record.get('cached'):
+            counts['cached'] += 1
+        reply_chars.append(len(record['content']))
+        if 'response_tokens' in record:
+            reply_tokens.append(record['response_tokens'])
+            prompt_tokens.append(record.get('prompt_tokens', 0))
+        if 'latency' in record:
+            latency.append(record['latency'])
+        if record.get('first_token_latency') is not None:
+            first_token.append(record['first_token_latency'])
+
+    return {
+        'sessions': len(sessions),
+        **{name: counts[name] for name in ('messages', 'questions', 'replies', 'failed', 'cached')},
+        'questions_per_platform': dict(questions.most_common()),
+        'questions_per_day': dict(sorted(per_day.items())),
+        'reply_chars': summarize(reply_chars),
+        'reply_tokens': summarize(reply_tokens),
+        'prompt_tokens': summarize(prompt_tokens),
+        'latency': summarize(latency),
+        'first_token_latency': summarize(first_token)
+    }
+
+
+def format_summary(summary, unit="", digits=0):
+    if not summary['count']:
+        return "no data"
+    return (f"n={summary['count']}  mean {summary['mean']:.{digits}f}{unit}  "
+            f"p50 {summary['p50']:.{digits}f}{unit}  p95 {summary['p95']:.{digits}f}{unit}  "
+            f"max {summary['max']:.{digits}f}{unit}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Usage statistics over exported chat history")
+    parser.add_argument("files", nargs="+", help="JSONL.gz files written by socialai.history_export")
+    parser.add_argument("--since", help="only messages created on or after this date, YYYY-MM-DD")
+    parser.add_argument("--json", action="store_true", help="print the statistics as JSON")
+    args = parser.parse_args(argv)
+
+    stats = aggregate(read_records(args.files), since=args.since)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+
+    print(f"{stats['sessions']} sessions, {stats['messages']} messages: {stats['questions']} questions, "
+          f"{stats['replies']} replies ({stats['failed']} failed, {stats['cached']} from cache)")
+    print("questions per platform:")
+    for platform, count in stats['questions_per_platform'].items():
+        print(f"    {platform:<12} {count:>8}")
+    print(f"reply length         {format_summary(stats['reply_chars'], ' chars')}")
+    print(f"reply tokens         {format_summary(stats['reply_tokens'])}")
+    print(f"prompt tokens        {format_summary(stats['prompt_tokens'])}")
+    print(f"latency              {format_summary(stats['latency'], 's', digits=2)}")
+    print(f"first token latency  {format_summary(stats['first_token_latency'], 's', digits=2)}")
+
+
+if __name__ == "__main__":
+    main()
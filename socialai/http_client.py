@@ -0,0 +1,92 @@
+"""Shared HTTP client for the social platform OAuth and API endpoints"""
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds; a slow platform fails fast instead of hanging the script thread
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_RETRIES = 3
+# Retries wait 0.5s, 1s, 2s, ... unless the server sends Retry-After
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest Retry-After honoured between attempts; longer waits are cut to this
+MAX_RETRY_AFTER = 3
+# Keep-alive connections kept per host
+POOL_SIZE = 20
+MAX_WORKERS = 8
+
+
+class CappedRetry(Retry):
+    """Retry that never sleeps longer than MAX_RETRY_AFTER, whatever Retry-After asks for
+
+    A 429 is retried for any method: the server refused the request without acting on it.
+    """
+
+    def parse_retry_after(self, retry_after):
+        return min(super().parse_retry_after(retry_after), MAX_RETRY_AFTER)
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class HttpClient:
+    """Pooled keep-alive session with timeouts, retries and concurrent fetches
+
+    Only idempotent methods are retried after a server error or a read
+    failure. A POST is resent only if the connection failed before it was
+    sent, or the server answered 429: replaying a token exchange whose response was lost would use a
+    one-time code or a rotated refresh token twice.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, pool_size=POOL_SIZE, max_workers=MAX_WORKERS):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = CappedRetry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="socialai-http")
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def fetch_all(self, calls):
+        """Run independent requests concurrently
+
+        `calls` maps a name to (method, url, kwargs). Returns a dict mapping
+        each name to its Response, or to the exception the request raised.
+        """
+        futures = {
+            name: self._executor.submit(self.request, method, url, **kwargs)
+            for name, (method, url, kwargs) in calls.items()
+        }
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
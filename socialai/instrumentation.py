@@ -0,0 +1,173 @@
+"""Lightweight timing spans for script reruns
+
+A Profiler collects named spans for each rerun of the dashboard script,
+along with the token counts and latency of the LLM replies collected in
+it, and exports them as JSONL records and Prometheus text. Replies are
+generated off the script thread, so their latency is reported next to the
+spans rather than as one. When disabled, span() hands back a shared
+no-op context manager, so instrumented code pays only a method call.
+"""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECENT_RUNS = 200
+_NOOP = nullcontext()
+
+
+class _Span:
+    __slots__ = ('run', 'name', 'started')
+
+    def __init__(self, run, name):
+        self.run = run
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        spans = self.run['spans']
+        spans[self.name] = spans.get(self.name, 0.0) + time.perf_counter() - self.started
+
+
+class Profiler:
+    """Per-rerun span timings shared across sessions; each script thread records its own run"""
+
+    def __init__(self, enabled=False, jsonl_path=None, recent=RECENT_RUNS):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.runs = deque(maxlen=recent)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._span_totals = defaultdict(lambda: [0.0, 0])
+        self._tokens = defaultdict(int)
+        self._llm_totals = defaultdict(lambda: [0.0, 0])
+        self._rerun_count = 0
+
+    def start_run(self):
+        if self.enabled:
+            self._local.run = {'started': time.time(), 'clock': time.perf_counter(), 'spans': {}, 'tokens': {},
+                               'replies': []}
+
+    def span(self, name):
+        """Context manager timing a named stage of the current rerun"""
+        run = getattr(self._local, 'run', None) if self.enabled else None
+        return _Span(run, name) if run is not None else _NOOP
+
+    def record_reply(self, latency, first_token_latency=None, prompt_tokens=0, response_tokens=0, **_):
+        """Count a finished LLM reply: its tokens and its latency, first token included
+
+        The reply is added to the current rerun, or straight to the totals
+        when collected outside one (from a fragment run, say).
+        """
+        if not self.enabled:
+            return
+        tokens = {'prompt': prompt_tokens, 'response': response_tokens}
+        reply = {'reply': latency}
+        if first_token_latency is not None:
+            reply['first_token'] = first_token_latency
+        run = getattr(self._local, 'run', None)
+        if run is not None:
+            for kind, count in tokens.items():
+                run['tokens'][kind] = run['tokens'].get(kind, 0) + count
+            run['replies'].append(reply)
+            return
+        with self._lock:
+            self._add_replies(tokens, [reply])
+
+    def _add_replies(self, tokens, replies):
+        for kind, count in tokens.items():
+            self._tokens[kind] += count
+        for reply in replies:
+            for name, seconds in reply.items():
+                totals = self._llm_totals[name]
+                totals[0] += seconds
+                totals[1] += 1
+
+    def finish_run(self, **labels):
+        """Close the current rerun, keep it for the debug panel and export it"""
+        run = getattr(self._local, 'run', None) if self.enabled else None
+        if run is None:
+            return
+        self._local.run = None
+        record = {
+            'time': run['started'],
+            'total': time.perf_counter() - run['clock'],
+            'spans': run['spans'],
+            'tokens': run['tokens'],
+            'replies': run['replies'],
+            **labels
+        }
+        with self._lock:
+            self.runs.append(record)
+            self._rerun_count += 1
+            for name, seconds in list(run['spans'].items()) + [('total', record['total'])]:
+                totals = self._span_totals[name]
+                totals[0] += seconds
+                totals[1] += 1
+            self._add_replies(run['tokens'], run['replies'])
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def recent_runs(self, n, **labels):
+        """The last n reruns matching the given labels, newest first"""
+        with self._lock:
+            runs = [r for r in reversed(self.runs) if all(r.get(k) == v for k, v in labels.items())]
+        return runs[:n]
+
+    def prometheus_text(self):
+        """Aggregates in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP socialai_reruns_total Script reruns profiled.",
+                "# TYPE socialai_reruns_total counter",
+                f"socialai_reruns_total {self._rerun_count}",
+                "# HELP socialai_rerun_span_seconds Time spent in each stage of a rerun.",
+                "# TYPE socialai_rerun_span_seconds summary",
+            ]
+            for name, (seconds, count) in sorted(self._span_totals.items()):
+                lines.append(f'socialai_rerun_span_seconds_sum{{span="{name}"}} {seconds:.6f}')
+                lines.append(f'socialai_rerun_span_seconds_count{{span="{name}"}} {count}')
+            lines += [
+                "# HELP socialai_llm_tokens_total LLM tokens used by chat turns.",
+                "# TYPE socialai_llm_tokens_total counter",
+            ]
+            for kind, count in sorted(self._tokens.items()):
+                lines.append(f'socialai_llm_tokens_total{{kind="{kind}"}} {count}')
+            lines += [
+                "# HELP socialai_llm_reply_seconds Time from submitting a chat turn to its full reply or first token.",
+                "# TYPE socialai_llm_reply_seconds summary",
+            ]
+            for name, (seconds, count) in sorted(self._llm_totals.items()):
+                lines.append(f'socialai_llm_reply_seconds_sum{{stage="{name}"}} {seconds:.6f}')
+                lines.append(f'socialai_llm_reply_seconds_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(profiler, port, host="127.0.0.1"):
+    """Serve profiler.prometheus_text() at http://host:port/metrics on a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = profiler.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="socialai-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,169 @@
+"""Chat model backends
+
+Backends are registered by name so the dashboard, the batch pipeline and the
+load tests can switch between Gemini and a local stub:
+
+    llm = create_llm("stub", latency=0.2, tokens_per_second=50)
+"""
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import PrivateAttr
+
+# Gemini averages roughly four characters of English text per token
+CHARS_PER_TOKEN = 4
+
+LLM_BACKENDS = {}
+BACKEND_LABELS = {}
+
+
+def estimate_tokens(text):
+    """Approximate token count without a network round trip"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def register_backend(name, label):
+    """Register a factory returning a chat model for `name`"""
+    def decorator(factory):
+        LLM_BACKENDS[name] = factory
+        BACKEND_LABELS[name] = label
+        return factory
+    return decorator
+
+
+def create_llm(name, **options):
+    """Build the chat model for a registered backend"""
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {', '.join(LLM_BACKENDS)}")
+    return LLM_BACKENDS[name](**options)
+
+
+class GeminiChat(ChatGoogleGenerativeAI):
+    """Gemini chat model that counts tokens locally
+
+    The upstream client calls the count_tokens API once per message, and the
+    bounded memory engines count tokens on every turn to decide when to prune.
+    """
+
+    def get_num_tokens(self, text):
+        return estimate_tokens(text)
+
+
+@register_backend("gemini", "Gemini 1.5 Flash")
+def gemini_backend(api_key=None, model="gemini-1.5-flash", temperature=0.7):
+    return GeminiChat(
+        model=model,
+        google_api_key=api_key or os.environ.get("GOOGLE_API_KEY"),
+        temperature=temperature,
+        convert_system_message_to_human=True
+    )
+
+
+STUB_VOCABULARY = (
+    "post consistently engage your audience with short videos behind the scenes "
+    "stories polls hashtags reels carousel captions mornings weekends community "
+    "launch offer customers reviews analytics reach growth schedule content ideas"
+).split()
+
+
+class StubChat(BaseChatModel):
+    """Deterministic local chat model for offline development and load tests
+
+    Replies are derived from a hash of the prompt, so the same prompt always
+    gets the same answer. Latency, token rate and failures are configurable.
+    """
+
+    latency: float = 0.05
+    """Seconds before the first token"""
+    tokens_per_second: float = 100.0
+    response_tokens: int = 60
+    failure_rate: float = 0.0
+    """Fraction of calls that raise an error"""
+    seed: int = 0
+
+    _random: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self):
+        return "socialai-stub"
+
+    def get_num_tokens(self, text):
+        return estimate_tokens(text)
+
+    def _prompt_text(self, messages):
+        return "\n".join(str(m.content) for m in messages)
+
+    def _reply_tokens(self, prompt):
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        words = [rng.choice(STUB_VOCABULARY) for _ in range(self.response_tokens)]
+        return [w + " " for w in words[:-1]] + [words[-1] + "."]
+
+    def _maybe_fail(self):
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+        if failed:
+            raise RuntimeError("Injected stub model failure")
+
+    def _usage(self, prompt, tokens):
+        prompt_tokens = estimate_tokens(prompt)
+        return {
+            'input_tokens': prompt_tokens,
+            'output_tokens': len(tokens),
+            'total_tokens': prompt_tokens + len(tokens)
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt_text(messages)
+        self._maybe_fail()
+        tokens = self._reply_tokens(prompt)
+        time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(prompt, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt_text(messages)
+        self._maybe_fail()
+        tokens = self._reply_tokens(prompt)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, tokens)))
+
+    # Native async versions, so event-loop callers don't tie up a thread per call
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt_text(messages)
+        self._maybe_fail()
+        tokens = self._reply_tokens(prompt)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(prompt, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt_text(messages)
+        self._maybe_fail()
+        tokens = self._reply_tokens(prompt)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, tokens)))
+
+
+@register_backend("stub", "Local stub model")
+def stub_backend(api_key=None, **options):
+    return StubChat(**options)
@@ -0,0 +1,204 @@
+"""Process-wide scheduling of chat model calls across all sessions
+
+Every session's chat replies and content calendar posts pass through one
+LLMScheduler, which
+- keeps at most `max_concurrency` calls in flight,
+- starts no more than `rate_per_minute` calls per minute (token bucket),
+- grants waiting calls round-robin by session id, so one busy session
+  cannot starve the others, and
+- coalesces identical prompts made through `call`: while a prompt is in
+  flight, later callers wait for and share its result instead of calling
+  the model again. This covers calendar posts and non-streamed replies;
+  a streamed reply holds a slot of its own.
+
+The summaries the summary memory engine writes call the model directly
+and are not scheduled.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+
+from socialai.ratelimit import RateLimiter
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RATE_PER_MINUTE = 300
+# Wait times kept for the percentile metrics
+WAIT_SAMPLES = 1000
+
+
+class _Ticket:
+    __slots__ = ('session_id', 'queued', 'granted', 'on_grant')
+
+    def __init__(self, session_id, on_grant=None):
+        self.session_id = session_id
+        self.queued = time.monotonic()
+        self.granted = False
+        # Called under the scheduler lock when granted; lets async waiters be woken from any thread
+        self.on_grant = on_grant
+
+
+class LLMScheduler:
+    """Concurrency, rate and fairness gate in front of the chat model"""
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, rate_per_minute=DEFAULT_RATE_PER_MINUTE,
+                 burst=None):
+        self.max_concurrency = max_concurrency
+        self._limiter = RateLimiter(rate_per_minute, burst=burst or max_concurrency)
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()
+        self._waiting = 0
+        self._active = 0
+        self._inflight = {}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._retry_timer = None
+        self.counters = {'calls': 0, 'coalesced': 0, 'peak_queue_depth': 0}
+
+    def _dispatch(self):
+        """Grant queued tickets while slots and rate tokens allow; return seconds until a token frees up
+
+        When the rate limit stops dispatch, a timer dispatches again once a
+        token is available, so no waiter depends on another call to wake it.
+        """
+        while self._queues and self._active < self.max_concurrency:
+            wait = self._limiter.try_acquire()
+            if wait:
+                self._schedule_retry(wait)
+                return wait
+            session_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            ticket.granted = True
+            self._waiting -= 1
+            self._active += 1
+            self._waits.append(time.monotonic() - ticket.queued)
+            if ticket.on_grant:
+                ticket.on_grant()
+            self._cond.notify_all()
+        return None
+
+    def _schedule_retry(self, wait):
+        if self._retry_timer is None:
+            self._retry_timer = threading.Timer(wait, self._retry)
+            self._retry_timer.daemon = True
+            self._retry_timer.start()
+
+    def _retry(self):
+        with self._cond:
+            self._retry_timer = None
+            self._dispatch()
+
+    def _enqueue(self, ticket):
+        self._queues.setdefault(ticket.session_id, deque()).append(ticket)
+        self._waiting += 1
+        self.counters['calls'] += 1
+        self.counters['peak_queue_depth'] = max(self.counters['peak_queue_depth'], self._waiting)
+
+    def acquire(self, session_id):
+        """Block until this session may call the model"""
+        ticket = _Ticket(session_id)
+        with self._cond:
+            self._enqueue(ticket)
+            while not ticket.granted:
+                retry_in = self._dispatch()
+                if not ticket.granted:
+                    self._cond.wait(timeout=retry_in)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._dispatch()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, session_id):
+        """Hold a model slot for the duration of the block, e.g. a streamed reply"""
+        self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire_async(self, session_id):
+        """Wait, without blocking the event loop, until this session may call the model
+
+        Shares the queue, limits and fairness of `acquire`. If the waiting
+        task is cancelled its ticket is withdrawn, or its slot released if
+        it was granted meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            if not granted.done():
+                granted.set_result(None)
+
+        ticket = _Ticket(session_id, on_grant=lambda: loop.call_soon_threadsafe(wake))
+        with self._cond:
+            self._enqueue(ticket)
+            self._dispatch()
+        try:
+            # Woken by whichever thread grants the ticket: a release, a new caller or the retry timer
+            await granted
+        except asyncio.CancelledError:
+            with self._cond:
+                if not ticket.granted:
+                    queue = self._queues.get(session_id)
+                    if queue and ticket in queue:
+                        queue.remove(ticket)
+                        if not queue:
+                            del self._queues[session_id]
+                        self._waiting -= 1
+                    raise
+            self.release()
+            raise
+
+    @asynccontextmanager
+    async def aslot(self, session_id):
+        """Async counterpart of `slot`"""
+        await self.acquire_async(session_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def call(self, session_id, key, fn):
+        """Run fn() in a slot, sharing the result with concurrent calls for the same key"""
+        with self._cond:
+            shared = self._inflight.get(key)
+            if shared is None:
+                future = self._inflight[key] = Future()
+            else:
+                self.counters['coalesced'] += 1
+        if shared is not None:
+            return shared.result()
+
+        try:
+            with self.slot(session_id):
+                result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def metrics(self):
+        """Current queue depth, in-flight calls and wait-time percentiles in seconds"""
+        with self._cond:
+            waits = sorted(self._waits)
+            snapshot = dict(self.counters)
+            snapshot.update(queue_depth=self._waiting, active=self._active, inflight_prompts=len(self._inflight))
+
+        def pct(p):
+            return waits[min(len(waits) - 1, int(p / 100 * len(waits)))] if waits else 0.0
+
+        snapshot.update(wait_p50=pct(50), wait_p95=pct(95), wait_max=waits[-1] if waits else 0.0)
+        return snapshot
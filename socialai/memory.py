@@ -0,0 +1,60 @@
+"""Conversation memory engines that keep the prompt history bounded"""
+from langchain.memory import (
+    ConversationBufferWindowMemory,
+    ConversationSummaryBufferMemory,
+    ConversationTokenBufferMemory,
+)
+
+MEMORY_ENGINES = ["Summary", "Window", "Token budget"]
+DEFAULT_MEMORY_ENGINE = "Summary"
+
+# Recent exchanges kept verbatim by the window engine
+WINDOW_TURNS = 6
+# History size, in tokens, above which the summary engine folds old turns into its summary
+SUMMARY_TOKEN_LIMIT = 1200
+# Hard cap, in tokens, for the token budget engine; oldest turns are dropped beyond it
+TOKEN_BUDGET = 1500
+
+
+def build_memory(engine, llm):
+    """Create the memory object for a memory engine name
+
+    The history is returned as "User: ..." / "SocialAI: ..." lines (and a
+    "System: ..." line for the running summary) to fill the prompt's
+    {history} slot, so the prompt holds the message text and nothing else.
+    """
+    options = dict(
+        memory_key="history",
+        return_messages=False,
+        input_key="input",
+        human_prefix="User",
+        ai_prefix="SocialAI"
+    )
+    if engine == "Window":
+        return ConversationBufferWindowMemory(k=WINDOW_TURNS, **options)
+    if engine == "Token budget":
+        return ConversationTokenBufferMemory(llm=llm, max_token_limit=TOKEN_BUDGET, **options)
+    # Summarization only runs once the buffer grows past the limit, and only
+    # over the turns being evicted, so most turns cost no extra LLM call
+    return ConversationSummaryBufferMemory(llm=llm, max_token_limit=SUMMARY_TOKEN_LIMIT, **options)
+
+
+def describe_memory(engine):
+    """Short label for the System Status indicator"""
+    if engine == "Window":
+        return f"Window (last {WINDOW_TURNS} turns)"
+    if engine == "Token budget":
+        return f"Token budget ({TOKEN_BUDGET} tokens)"
+    return f"Summary + recent ({SUMMARY_TOKEN_LIMIT} tokens)"
+
+
+def switch_memory(memory, engine, llm):
+    """Build a memory for another engine, carrying over the existing messages"""
+    new_memory = build_memory(engine, llm)
+    new_memory.chat_memory.add_messages(memory.chat_memory.messages)
+    summary = getattr(memory, 'moving_summary_buffer', "")
+    if summary and hasattr(new_memory, 'moving_summary_buffer'):
+        new_memory.moving_summary_buffer = summary
+    if hasattr(new_memory, 'prune'):
+        new_memory.prune()
+    return new_memory
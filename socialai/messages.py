@@ -0,0 +1,36 @@
+"""Chat message records
+
+Every message carries its full local timestamp (`created`, ISO 8601 with
+the UTC offset) next to the `time` shown in the chat. Replies also record
+their latency and token counts, and questions the platforms they name, so
+histories can be exported and analyzed offline (see socialai.history_export).
+"""
+import re
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+
+def new_message(role, content, **fields):
+    """Create a chat history entry with a stable id"""
+    now = datetime.now().astimezone()
+    msg = {
+        'id': uuid.uuid4().hex,
+        'role': role,
+        'content': content,
+        'created': now.isoformat(timespec="milliseconds"),
+        'time': now.strftime("%H:%M:%S")
+    }
+    msg.update(fields)
+    return msg
+
+
+@lru_cache(maxsize=8)
+def _platform_pattern(platforms):
+    return re.compile(r"\b(" + "|".join(re.escape(name) for name in platforms) + r")\b", re.IGNORECASE)
+
+
+def mentioned_platforms(text, platforms):
+    """Names from `platforms` that appear in the text as whole words, in the given order"""
+    found = {match.lower() for match in _platform_pattern(tuple(platforms)).findall(text)}
+    return [name for name in platforms if name.lower() in found]
@@ -0,0 +1,163 @@
+"""Profile and audience metrics for the connected platforms
+
+Metrics are fetched off the render path: a rerun reads the cache and, when
+a platform's entry is missing or out of date, starts a background fetch and
+shows the last metrics it had (or a loading placeholder) meanwhile. A slow
+or failing platform therefore never holds up the chat for its retries.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds before a platform's metrics are fetched again
+METRICS_TTL = 15 * 60
+# Failed fetches are retried sooner
+ERROR_TTL = 60
+# Seconds past expiry an entry is still shown while it is refetched; then it is dropped
+MAX_STALE = 60 * 60
+# Returned for a platform whose first fetch hasn't finished
+LOADING = {'loading': True}
+
+
+def parse_facebook(payload):
+    """Totals across the pages the user manages (from /me/accounts)"""
+    pages = payload.get('data', [])
+    return {
+        'pages': len(pages),
+        'followers': sum(page.get('followers_count', 0) for page in pages),
+        'likes': sum(page.get('fan_count', 0) for page in pages)
+    }
+
+
+def parse_twitter(payload):
+    public = payload.get('data', {}).get('public_metrics', {})
+    return {
+        'followers': public.get('followers_count', 0),
+        'following': public.get('following_count', 0),
+        'posts': public.get('tweet_count', 0),
+        'likes': public.get('like_count', 0)
+    }
+
+
+def parse_instagram(payload):
+    return {
+        'account_type': payload.get('account_type', ''),
+        'posts': payload.get('media_count', 0)
+    }
+
+
+METRIC_PARSERS = {
+    "Facebook": parse_facebook,
+    "Twitter": parse_twitter,
+    "Instagram": parse_instagram
+}
+
+
+def token_key(platform, token):
+    """Cache key that never holds the raw access token"""
+    return platform, hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class MetricsFetcher:
+    """Fetch metrics for every connected platform concurrently in the background, cached per platform and token"""
+
+    def __init__(self, client, platforms, ttl=METRICS_TTL, max_stale=MAX_STALE):
+        self.client = client
+        self.platforms = platforms
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._cache = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="socialai-metrics")
+
+    def fetch(self, connections):
+        """Return {platform: metrics} for `connections` ({platform: access token}) without waiting
+
+        Missing or expired entries are fetched in the background; until then
+        the expired metrics are returned, or LOADING if there are none.
+        """
+        now = time.time()
+        results, stale = {}, {}
+        with self._lock:
+            for platform, token in connections.items():
+                if 'metrics_url' not in self.platforms.get(platform, {}):
+                    continue
+                key = token_key(platform, token)
+                cached = self._cache.get(key)
+                results[platform] = cached[1] if cached else LOADING
+                if (not cached or cached[0] <= now) and key not in self._pending:
+                    self._pending.add(key)
+                    stale[platform] = token
+        if stale:
+            self._executor.submit(self.refresh, stale)
+        return results
+
+    def refresh(self, connections):
+        """Fetch metrics for `connections` now, concurrently; returns {platform: metrics}
+
+        A failed fetch keeps the metrics from the last good one, and is
+        retried after ERROR_TTL.
+        """
+        calls = {
+            platform: ("GET", self.platforms[platform]['metrics_url'], {
+                'params': self.platforms[platform].get('metrics_params', {}),
+                'headers': {"Authorization": f"Bearer {token}"}
+            })
+            for platform, token in connections.items()
+        }
+        try:
+            responses = self.client.fetch_all(calls)
+        except Exception as e:
+            responses = {platform: e for platform in calls}
+        now = time.time()
+        results = {}
+        with self._lock:
+            for platform, response in responses.items():
+                key = token_key(platform, connections[platform])
+                metrics, ttl = self._parse(platform, response)
+                previous = self._cache.get(key)
+                if 'error' in metrics and previous and 'error' not in previous[1]:
+                    metrics = previous[1]
+                self._cache[key] = (now + ttl, metrics)
+                self._pending.discard(key)
+                results[platform] = metrics
+            self._prune(now)
+        return results
+
+    def _prune(self, now):
+        # Tokens that are refreshed or disconnected leave entries nobody reads again
+        expired = [key for key, (expires, _) in self._cache.items()
+                   if expires + self.max_stale < now and key not in self._pending]
+        for key in expired:
+            del self._cache[key]
+
+    def _parse(self, platform, response):
+        if isinstance(response, Exception):
+            return {'error': str(response)}, ERROR_TTL
+        if not response.ok:
+            return {'error': f"HTTP {response.status_code}"}, ERROR_TTL
+        try:
+            return METRIC_PARSERS[platform](response.json()), self.ttl
+        except Exception as e:
+            return {'error': str(e)}, ERROR_TTL
+
+    def invalidate(self, platform, token):
+        with self._lock:
+            self._cache.pop(token_key(platform, token), None)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def summarize_metrics(metrics):
+    """One-line summary of the metrics for the chatbot prompt"""
+    parts = []
+    for platform, values in metrics.items():
+        if 'error' in values or 'loading' in values:
+            continue
+        stats = ", ".join(f"{value:,} {name}" for name, value in values.items()
+                          if isinstance(value, int))
+        parts.append(f"{platform}: {stats}")
+    return "; ".join(parts) or "Not available"
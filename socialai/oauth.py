@@ -0,0 +1,41 @@
+"""OAuth token exchange and user info requests for the social platforms"""
+
+
+def exchange_code(client, platform, code, code_verifier, redirect_uri):
+    """Trade an authorization code for tokens; returns the token response JSON"""
+    data = {
+        "grant_type": "authorization_code",
+        "client_id": platform["client_id"],
+        "client_secret": platform["client_secret"],
+        "redirect_uri": redirect_uri,
+        "code": code,
+        "code_verifier": code_verifier
+    }
+    response = client.post(platform["token_url"], data=data)
+    return response.json()
+
+
+def fetch_user_info(client, platform, access_token):
+    """Return the profile of the user the access token belongs to"""
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get(platform["userinfo_url"], headers=headers)
+    return response.json()
+
+
+def fetch_pages(client, platform, access_token):
+    """Pages the user manages, each with its `id`, `name` and Page `access_token`"""
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get(platform["pages_url"], params={"fields": "id,name,access_token"}, headers=headers)
+    return response.json().get("data", [])
+
+
+def refresh_access_token(client, platform, refresh_token):
+    """Trade a refresh token for a new access token; returns the token response JSON"""
+    data = {
+        "grant_type": "refresh_token",
+        "client_id": platform["client_id"],
+        "client_secret": platform["client_secret"],
+        "refresh_token": refresh_token
+    }
+    response = client.post(platform["token_url"], data=data)
+    return response.json()
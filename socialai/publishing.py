@@ -0,0 +1,436 @@
+"""Scheduled publishing of posts to the connected platforms
+
+Posts go into a durable SQLite queue with the time they should go out. A
+background publisher claims due posts per platform, groups them by owner
+and publishes them from a worker pool: Facebook posts in Graph API batch
+requests, tweets one at a time. Each platform has its own rate limit.
+
+Every state change is a conditional update on the post's row, so a post
+is only claimed by one worker at a time and a post that was published is
+never sent again. A claim is renewed just before its request is sent and
+expires otherwise: posts held by a crashed process are picked up again
+where a resend is safe, and marked uncertain where it is not. Throttling,
+and failures before the request left, are retried with backoff; other
+rejections fail the post for good.
+
+A server error or a lost response after the request was sent leaves it
+unknown whether the post went out. Twitter rejects a resent tweet as a
+duplicate, so those are retried; Facebook would post it twice, so such
+posts are marked uncertain until someone checks the page and resolves them.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlencode
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from socialai.ratelimit import RateLimiter
+
+STATUS_QUEUED = "queued"
+STATUS_PUBLISHING = "publishing"
+STATUS_PUBLISHED = "published"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_UNCERTAIN = "uncertain"  # may have been published; needs review
+
+# Posts per Graph API batch request (the API's limit)
+FACEBOOK_BATCH_SIZE = 50
+# Posts started per minute per platform
+DEFAULT_RATES = {
+    "Facebook": 60,
+    # Per-user tweet creation limit is 200 per 15 minutes
+    "Twitter": 13
+}
+DEFAULT_WORKERS = 4
+POLL_INTERVAL = 5
+# Seconds a claimed post is held before another worker may take it over,
+# counted again from when its request is sent
+CLAIM_LEASE = 120
+MAX_ATTEMPTS = 5
+# A failed attempt is retried after 30s, 60s, 120s, ...
+RETRY_BACKOFF = 30
+
+# Rejected before any work was done: always safe to send again
+THROTTLE_STATUSES = (429,)
+# Graph API error codes for throttling
+FACEBOOK_THROTTLE_CODES = {4, 17, 32, 341, 613}
+# Graph API error codes for unknown errors and outages, which may follow a completed post
+FACEBOOK_TRANSIENT_CODES = {1, 2}
+# Platforms that reject a resent post as a duplicate, so an uncertain attempt can be retried
+RESEND_SAFE = frozenset({"Twitter"})
+
+# Outcomes returned by the platform publishers, one per post
+PUBLISHED, RETRY, UNCERTAIN, FAILED = "published", "retry", "uncertain", "failed"
+
+# What PublishQueue.schedule() did with a post; KEPT posts were already past
+# the queue (publishing, published, failed, cancelled or uncertain)
+ADDED, UPDATED, UNCHANGED, KEPT = "added", "updated", "unchanged", "kept"
+
+
+def http_outcome(status, payload, remote_id, resend_safe=False):
+    """Classify a platform response as (PUBLISHED, id), or (RETRY, UNCERTAIN or FAILED, error)
+
+    Server errors may come after the post was created; they are retried
+    only where `resend_safe`, and are UNCERTAIN otherwise.
+    """
+    if 200 <= status < 300 and remote_id:
+        return PUBLISHED, remote_id
+    unknown = RETRY if resend_safe else UNCERTAIN
+    error = payload.get('error') if isinstance(payload, dict) else None
+    if isinstance(error, dict):
+        message = error.get('message', f"HTTP {status}")
+        if error.get('code') in FACEBOOK_THROTTLE_CODES:
+            return RETRY, message
+        if error.get('code') in FACEBOOK_TRANSIENT_CODES or status >= 500:
+            return unknown, message
+        return FAILED, message
+    message = (payload.get('detail') or error) if isinstance(payload, dict) else None
+    message = message or f"HTTP {status}"
+    if status in THROTTLE_STATUSES:
+        return RETRY, message
+    return (unknown if status >= 500 else FAILED), message
+
+
+def request_not_sent(error):
+    """Whether a request failed before reaching the platform, so sending it again can't duplicate it"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+    return False
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def publish_facebook(client, config, credentials, contents):
+    """Post to the Page's feed with its Page token, up to FACEBOOK_BATCH_SIZE posts per Graph batch request"""
+    headers = {"Authorization": f"Bearer {credentials['access_token']}"}
+    if len(contents) == 1:
+        response = client.post(config['publish_url'].format(page_id=credentials['page_id']),
+                               data={'message': contents[0]}, headers=headers)
+        payload = _json(response)
+        return [http_outcome(response.status_code, payload, payload.get('id'))]
+
+    path = config['publish_path'].format(page_id=credentials['page_id'])
+    batch = [
+        {'method': "POST", 'relative_url': path, 'body': urlencode({'message': content})}
+        for content in contents
+    ]
+    response = client.post(config['batch_url'], data={'batch': json.dumps(batch), 'include_headers': "false"},
+                           headers=headers)
+    if not response.ok:
+        outcome = http_outcome(response.status_code, _json(response), None)
+        return [outcome] * len(contents)
+    outcomes = []
+    for item in response.json():
+        if item is None:
+            # The batch timed out before reaching this request
+            outcomes.append((RETRY, "batch item timed out"))
+            continue
+        payload = json.loads(item.get('body') or "{}")
+        outcomes.append(http_outcome(item.get('code', 500), payload, payload.get('id')))
+    return outcomes
+
+
+def publish_twitter(client, config, credentials, contents):
+    """Create one tweet per post; the API has no batch endpoint"""
+    outcomes = []
+    for content in contents:
+        response = client.post(config['publish_url'], json={'text': content},
+                               headers={"Authorization": f"Bearer {credentials['access_token']}"})
+        payload = _json(response)
+        if response.status_code == 403 and "duplicate" in str(payload.get('detail', '')).lower():
+            # Sent by an earlier attempt whose response was lost
+            outcomes.append((PUBLISHED, None))
+        else:
+            outcomes.append(http_outcome(response.status_code, payload, (payload.get('data') or {}).get('id'),
+                                         resend_safe=True))
+    return outcomes
+
+
+# Platform name -> (publish function, posts per call)
+PUBLISHERS = {
+    "Facebook": (publish_facebook, FACEBOOK_BATCH_SIZE),
+    "Twitter": (publish_twitter, 1)
+}
+
+
+class PublishQueue:
+    """Durable queue of scheduled posts in a local SQLite file"""
+
+    def __init__(self, path, lease=CLAIM_LEASE, max_attempts=MAX_ATTEMPTS, backoff=RETRY_BACKOFF,
+                 resend_safe=RESEND_SAFE):
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.resend_safe = resend_safe
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS posts (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                content TEXT NOT NULL,
+                publish_at REAL NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                claim TEXT,
+                lease_until REAL,
+                remote_id TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                published_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS posts_due ON posts (platform, status, next_attempt);
+            CREATE INDEX IF NOT EXISTS posts_owner ON posts (owner, publish_at);
+        """)
+        self._db.commit()
+
+    def enqueue(self, owner, platform, content, publish_at=None, post_id=None):
+        """Schedule a post; enqueueing the same post_id twice keeps the first. Returns the post id"""
+        now = time.time()
+        post_id = post_id or str(uuid.uuid4())
+        publish_at = publish_at or now
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO posts (id, owner, platform, content, publish_at, status, "
+                "next_attempt, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (post_id, owner, platform, content, publish_at, STATUS_QUEUED, publish_at, now)
+            )
+        return post_id
+
+    def schedule(self, owner, platform, content, publish_at, post_id):
+        """Add a post under a known id, or update its content and time while it is still queued
+
+        Returns ADDED, UPDATED, UNCHANGED or KEPT.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO posts (id, owner, platform, content, publish_at, status, "
+                "next_attempt, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (post_id, owner, platform, content, publish_at, STATUS_QUEUED, publish_at, now)
+            )
+            if cursor.rowcount == 1:
+                return ADDED
+            cursor = self._db.execute(
+                "UPDATE posts SET content = ?, publish_at = ?, next_attempt = ? "
+                "WHERE id = ? AND status = ? AND (content != ? OR publish_at != ?)",
+                (content, publish_at, publish_at, post_id, STATUS_QUEUED, content, publish_at)
+            )
+            if cursor.rowcount == 1:
+                return UPDATED
+            status, = self._db.execute("SELECT status FROM posts WHERE id = ?", (post_id,)).fetchone()
+        return UNCHANGED if status == STATUS_QUEUED else KEPT
+
+    def cancel(self, post_id):
+        """Cancel a post that hasn't been claimed yet; returns whether it was"""
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE posts SET status = ? WHERE id = ? AND status = ?",
+                (STATUS_CANCELLED, post_id, STATUS_QUEUED)
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, platform, limit, now=None):
+        """Take up to `limit` due posts for a platform
+
+        Posts whose claim expired are taken again where the platform is
+        resend-safe. Elsewhere they are marked uncertain: the worker that
+        held them may have sent them before it stopped.
+        """
+        now = now or time.time()
+        claim = uuid.uuid4().hex
+        with self._lock, self._db:
+            if platform not in self.resend_safe:
+                self._db.execute(
+                    "UPDATE posts SET status = ?, error = ?, claim = NULL "
+                    "WHERE platform = ? AND status = ? AND lease_until < ?",
+                    (STATUS_UNCERTAIN, "claim expired while publishing", platform, STATUS_PUBLISHING, now)
+                )
+            ids = [row['id'] for row in self._db.execute(
+                "SELECT id FROM posts WHERE platform = ? AND ("
+                "(status = ? AND next_attempt <= ?) OR (status = ? AND lease_until < ?)"
+                ") ORDER BY next_attempt LIMIT ?",
+                (platform, STATUS_QUEUED, now, STATUS_PUBLISHING, now, limit)
+            )]
+            if not ids:
+                return []
+            marks = ",".join("?" * len(ids))
+            self._db.execute(
+                f"UPDATE posts SET status = ?, claim = ?, lease_until = ?, attempts = attempts + 1 "
+                f"WHERE id IN ({marks})",
+                (STATUS_PUBLISHING, claim, now + self.lease, *ids)
+            )
+            rows = self._db.execute(f"SELECT * FROM posts WHERE id IN ({marks})", ids).fetchall()
+        return [dict(row) for row in rows]
+
+    def renew(self, posts, now=None):
+        """Extend the claim on posts about to be sent; returns the ones still held"""
+        now = now or time.time()
+        held = []
+        with self._lock, self._db:
+            for post in posts:
+                cursor = self._db.execute(
+                    "UPDATE posts SET lease_until = ? WHERE id = ? AND status = ? AND claim = ?",
+                    (now + self.lease, post['id'], STATUS_PUBLISHING, post['claim'])
+                )
+                if cursor.rowcount == 1:
+                    held.append(post)
+        return held
+
+    def complete(self, post, outcome, value):
+        """Record a publish outcome for a claimed post; ignored if the claim was lost"""
+        now = time.time()
+        if outcome == PUBLISHED:
+            sql, params = ("UPDATE posts SET status = ?, remote_id = ?, error = NULL, published_at = ? ",
+                           (STATUS_PUBLISHED, value, now))
+        elif outcome == RETRY and post['attempts'] < self.max_attempts:
+            retry_at = now + self.backoff * 2 ** (post['attempts'] - 1)
+            sql, params = "UPDATE posts SET status = ?, error = ?, next_attempt = ? ", (STATUS_QUEUED, value, retry_at)
+        elif outcome == UNCERTAIN:
+            sql, params = "UPDATE posts SET status = ?, error = ? ", (STATUS_UNCERTAIN, value)
+        else:
+            sql, params = "UPDATE posts SET status = ?, error = ? ", (STATUS_FAILED, value)
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                sql + "WHERE id = ? AND status = ? AND claim = ?",
+                (*params, post['id'], STATUS_PUBLISHING, post['claim'])
+            )
+        return cursor.rowcount == 1
+
+    def resolve(self, post_id, published):
+        """Settle an uncertain post after checking the platform: mark it published, or send it again"""
+        now = time.time()
+        if published:
+            sql, params = "UPDATE posts SET status = ?, error = NULL, published_at = ? ", (STATUS_PUBLISHED, now)
+        else:
+            sql, params = "UPDATE posts SET status = ?, next_attempt = ? ", (STATUS_QUEUED, now)
+        with self._lock, self._db:
+            cursor = self._db.execute(sql + "WHERE id = ? AND status = ?", (*params, post_id, STATUS_UNCERTAIN))
+        return cursor.rowcount == 1
+
+    def posts(self, owner, limit=50):
+        """An owner's posts, soonest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM posts WHERE owner = ? ORDER BY publish_at LIMIT ?", (owner, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        """{status: number of posts}"""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM posts GROUP BY status").fetchall())
+
+    def close(self):
+        self._db.close()
+
+
+class Publisher:
+    """Background worker pool that publishes due posts from a PublishQueue
+
+    `credentials_for(owner, platform)` returns the credentials to publish
+    with, a dict with the `access_token` (and the `page_id` for Facebook),
+    or None if the owner has no usable connection to the platform.
+    """
+
+    def __init__(self, queue, client, platforms, credentials_for, workers=DEFAULT_WORKERS,
+                 rates=None, poll_interval=POLL_INTERVAL, publishers=PUBLISHERS):
+        self.queue = queue
+        self.client = client
+        self.platforms = platforms
+        self.credentials_for = credentials_for
+        self.poll_interval = poll_interval
+        self.publishers = {name: entry for name, entry in publishers.items() if name in platforms}
+        rates = {**DEFAULT_RATES, **(rates or {})}
+        self.limiters = {name: RateLimiter(rates[name]) for name in self.publishers}
+        self.stats = {'published': 0, 'retried': 0, 'uncertain': 0, 'failed': 0, 'requests': 0}
+        self._stats_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="socialai-publish")
+        self._stop = threading.Event()
+        self._worker = None
+
+    def start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="socialai-publisher", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
+
+    def claim_limit(self, platform):
+        """Posts to claim at once: no more than the rate limit starts in half a lease"""
+        _, batch_size = self.publishers[platform]
+        per_lease = int(self.limiters[platform].rate * self.queue.lease / 2)
+        return max(1, min(batch_size * 4, per_lease))
+
+    def run_once(self, now=None):
+        """Publish every post that is due; returns how many were attempted"""
+        futures = []
+        for platform, (_, batch_size) in self.publishers.items():
+            posts = self.queue.claim(platform, self.claim_limit(platform), now)
+            by_owner = {}
+            for post in posts:
+                by_owner.setdefault(post['owner'], []).append(post)
+            for owner, owned in by_owner.items():
+                for i in range(0, len(owned), batch_size):
+                    futures.append(self._pool.submit(self._publish, platform, owner, owned[i:i + batch_size]))
+        wait(futures)
+        return sum(len(future.result()) for future in futures)
+
+    def _publish(self, platform, owner, posts):
+        publish, batch_size = self.publishers[platform]
+        credentials = self.credentials_for(owner, platform)
+        if not credentials:
+            outcomes = [(RETRY, f"{platform} is not connected")] * len(posts)
+        else:
+            # Batched posts still count one each against the platform's limits
+            for _ in posts:
+                self.limiters[platform].acquire()
+            # Posts whose claim was taken over while waiting are left to the new holder
+            posts = self.queue.renew(posts)
+            if not posts:
+                return posts
+            try:
+                outcomes = publish(self.client, self.platforms[platform], credentials,
+                                   [p['content'] for p in posts])
+                with self._stats_lock:
+                    self.stats['requests'] += 1 if batch_size > 1 else len(posts)
+            except Exception as e:
+                # A timeout or dropped connection after sending may follow a completed post
+                safe = platform in RESEND_SAFE or request_not_sent(e)
+                outcomes = [(RETRY if safe else UNCERTAIN, str(e))] * len(posts)
+        for post, (outcome, value) in zip(posts, outcomes):
+            self.queue.complete(post, outcome, value)
+            with self._stats_lock:
+                self.stats[{PUBLISHED: 'published', RETRY: 'retried', UNCERTAIN: 'uncertain',
+                            FAILED: 'failed'}[outcome]] += 1
+        return posts
+
+    def close(self):
+        self.stop()
+        self._pool.shutdown(wait=True)
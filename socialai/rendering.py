@@ -0,0 +1,86 @@
+"""Chat history rendering with per-message fragment caching"""
+import textwrap
+
+# Number of messages shown at once; "Load earlier" widens the window by this much
+HISTORY_PAGE_SIZE = 50
+
+# Shown above an empty conversation only
+WELCOME_CARD = """
+<div class="welcome-card">
+    <h3 style="margin-top: 0;">Hello! I'm your AI-powered social media strategist</h3>
+    <p>I can help you with:</p>
+    <ul>
+        <li>💡 Content creation ideas</li>
+        <li>📊 Platform-specific strategies</li>
+        <li>🤝 Audience engagement techniques</li>
+        <li>📈 Analytics interpretation</li>
+    </ul>
+    <p>How can I assist with your social media today?</p>
+</div>
+"""
+
+
+def render_user_message(msg):
+    """Build the HTML bubble for a user message"""
+    return f"""
+    <div class="user-message">
+        <div class="message-header">
+            <div>👤</div>
+            <strong>You</strong>
+        </div>
+        {msg['content']}
+        <div class="message-timestamp">{msg['time']}</div>
+    </div>
+    """
+
+
+def render_ai_message(msg):
+    """Build the HTML bubble for an AI message
+
+    The logo is painted by the shared `.brand-logo` CSS rule, so the bubble
+    stays the same size whatever logo the business uploads.
+    """
+    return f"""
+    <div class="ai-message">
+        <div class="message-header">
+            <div class="message-icon brand-logo"></div>
+            <strong>3hree.io</strong>
+        </div>
+        {msg['content']}
+        <div class="message-timestamp">{msg['time']}</div>
+    </div>
+    """
+
+
+class HistoryRenderer:
+    """Render chat history, building each message's HTML only once"""
+
+    def __init__(self):
+        self.fragments = {}
+
+    def fragment(self, msg):
+        """Return the cached HTML fragment for a message, rendering it on first use
+
+        Fragments are dedented and stripped on their own: st.markdown dedents
+        the joined history as a whole, and a message with a line at column 0
+        would otherwise leave every later bubble indented into a code block.
+        """
+        html = self.fragments.get(msg['id'])
+        if html is None:
+            if msg['role'] == 'user':
+                html = render_user_message(msg)
+            else:
+                html = render_ai_message(msg)
+            html = textwrap.dedent(html).strip()
+            self.fragments[msg['id']] = html
+        return html
+
+    def prune(self, history):
+        """Drop fragments for messages no longer held in `history`"""
+        keep = {msg['id'] for msg in history}
+        self.fragments = {k: v for k, v in self.fragments.items() if k in keep}
+
+    def render(self, history, window=HISTORY_PAGE_SIZE):
+        """Return the HTML for the newest `window` messages (all of them if window is None)"""
+        visible = history[-window:] if window else history
+        return "\n".join(self.fragment(msg) for msg in visible)
@@ -0,0 +1,176 @@
+"""Opt-in cache of model responses for repeated questions
+
+Responses are keyed on the normalized question plus the business context and
+looked up in two tiers: an exact match on the normalized text, then the most
+similar earlier question by embedding cosine similarity. Entries expire after
+a TTL, the least recently used are evicted past a size cap, and everything is
+kept in SQLite so the cache survives restarts.
+
+The key holds no conversation history, so ChatSession only consults and
+fills the cache for turns that start a conversation.
+"""
+import array
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+# Cosine similarity above which two questions count as the same question
+DEFAULT_SIMILARITY = 0.9
+# Most recently used entries of a context compared by the similarity tier
+SIMILARITY_CANDIDATES = 500
+EMBEDDING_DIMENSIONS = 256
+
+# Prompt variables that change what a good answer is
+CONTEXT_KEYS = ('business_name', 'platforms')
+
+# Filler words ignored by the local embedding so phrasing differences don't matter
+STOPWORDS = frozenset("""
+    a an and any are at be can could do does for give i in is it me my of on or
+    our please should some tell that the this to was we what whats which how
+    would you your
+""".split())
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def hash_embedding(text):
+    """Cheap local embedding: hashed word and word-pair counts, L2-normalized
+
+    Pass a real embedding function (e.g. GoogleGenerativeAIEmbeddings().embed_query)
+    to ResponseCache for paraphrase-level matching.
+    """
+    words = [w for w in text.split() if w not in STOPWORDS] or text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """SQLite-backed response cache with exact and similarity tiers"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 similarity=DEFAULT_SIMILARITY, embed=hash_embedding, candidates=SIMILARITY_CANDIDATES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.candidates = candidates
+        self.embed = embed
+        self.stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'saved_seconds': 0.0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                context TEXT NOT NULL,
+                question TEXT NOT NULL,
+                response TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                latency REAL NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_context ON responses (context)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def _context_key(context):
+        return "|".join(str(context.get(k, "")).strip().lower() for k in CONTEXT_KEYS)
+
+    @staticmethod
+    def _key(context_key, question):
+        return hashlib.sha256(f"{context_key}\n{question}".encode()).hexdigest()
+
+    def get(self, question, context):
+        """Return a cached response for the question, or None"""
+        question = normalize_question(question)
+        context_key = self._context_key(context)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, response, latency FROM responses WHERE key = ? AND created > ?",
+                (self._key(context_key, question), now - self.ttl)
+            ).fetchone()
+        tier = 'exact_hits'
+        if row is None and self.similarity < 1:
+            row = self._most_similar(question, context_key, now)
+            tier = 'similar_hits'
+
+        with self._lock:
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            key, response, latency = row
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.stats[tier] += 1
+            self.stats['saved_seconds'] += latency
+            return response
+
+    def _most_similar(self, question, context_key, now):
+        """Best match among the context's most recently used entries
+
+        The scan is bounded by `candidates` and runs outside the lock, so a
+        lookup never holds up other sessions' cache reads and writes.
+        """
+        vector = self.embed(question)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, response, latency, embedding FROM responses WHERE context = ? AND created > ? "
+                "ORDER BY last_used DESC LIMIT ?",
+                (context_key, now - self.ttl, self.candidates)
+            ).fetchall()
+        best, best_score = None, self.similarity
+        for key, response, latency, blob in rows:
+            score = cosine(vector, array.array('f', blob))
+            if score >= best_score:
+                best, best_score = (key, response, latency), score
+        return best
+
+    def put(self, question, context, response, latency):
+        """Store a response along with how long the model took to produce it"""
+        question = normalize_question(question)
+        context_key = self._context_key(context)
+        embedding = array.array('f', self.embed(question)).tobytes()
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(context_key, question), context_key, question, response,
+                 embedding, latency, now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        self._db.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def hit_rate(self):
+        hits = self.stats['exact_hits'] + self.stats['similar_hits']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
@@ -0,0 +1,270 @@
+"""Persistent storage for dashboard sessions
+
+Sessions are keyed by the app's session_id. Chat messages are appended
+through a write-behind queue so a chat turn never waits on disk, and read
+back a page at a time so only recent history has to live in memory.
+
+Message sequence numbers only grow, so an export remembers the last one it
+wrote and the next export streams just the messages after it.
+
+Saving a session's state or appending to its messages marks it as used;
+expire_states deletes the sessions (and their messages) not used for a
+given time, so abandoned sessions and OAuth states don't pile up.
+"""
+import abc
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+
+# Writes are committed together once this many are queued or this many seconds pass
+WRITE_BATCH_SIZE = 200
+WRITE_INTERVAL = 0.5
+
+
+class SessionStore(abc.ABC):
+    """Interface for session storage backends; the app, workspaces and history export use all of it"""
+
+    @abc.abstractmethod
+    def load_state(self, session_id):
+        """Return the saved state dict for a session, or None"""
+
+    @abc.abstractmethod
+    def save_state(self, session_id, state):
+        """Save a session's state dict, replacing any earlier one"""
+
+    @abc.abstractmethod
+    def delete_state(self, session_id):
+        """Delete a session's saved state"""
+
+    @abc.abstractmethod
+    def expire_states(self, max_age, prefix=""):
+        """Delete the sessions with ids starting with `prefix` unused for `max_age` seconds, messages included"""
+
+    @abc.abstractmethod
+    def append_messages(self, session_id, messages):
+        """Add messages to the end of a session's history"""
+
+    @abc.abstractmethod
+    def load_messages(self, session_id, before_id=None, limit=50):
+        """Return up to `limit` messages older than `before_id` (newest if None), oldest first"""
+
+    @abc.abstractmethod
+    def count_messages(self, session_id):
+        """Number of stored messages of a session"""
+
+    @abc.abstractmethod
+    def message_ids(self, session_id):
+        """Ids of every stored message of a session"""
+
+    @abc.abstractmethod
+    def messages_after(self, seq, batch_size=1000):
+        """Yield (seq, session_id, message) for every message stored after `seq`, in order"""
+
+    @abc.abstractmethod
+    def export_watermark(self, name):
+        """Sequence number of the last message export `name` has written, 0 if it never ran"""
+
+    @abc.abstractmethod
+    def set_export_watermark(self, name, seq):
+        """Record that export `name` has written every message up to `seq`"""
+
+    def flush(self):
+        """Block until queued writes are on disk"""
+
+    def close(self):
+        self.flush()
+
+
+class SQLiteSessionStore(SessionStore):
+    """SessionStore backed by a local SQLite file with batched background writes"""
+
+    def __init__(self, path, batch_size=WRITE_BATCH_SIZE, interval=WRITE_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._reader.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq);
+            CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+            CREATE TABLE IF NOT EXISTS exports (
+                name TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        self._reader.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="socialai-session-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # Writes, applied by the background writer
+
+    def save_state(self, session_id, state):
+        self._queue.put((
+            "INSERT INTO sessions (session_id, state, updated) VALUES (?, ?, CURRENT_TIMESTAMP) "
+            "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+            (session_id, json.dumps(state))
+        ))
+
+    def append_messages(self, session_id, messages):
+        for msg in messages:
+            self._queue.put((
+                "INSERT INTO messages (session_id, id, data) VALUES (?, ?, ?)",
+                (session_id, msg['id'], json.dumps(msg))
+            ))
+        if messages:
+            self._queue.put((
+                "UPDATE sessions SET updated = CURRENT_TIMESTAMP WHERE session_id = ?", (session_id,)
+            ))
+
+    def delete_state(self, session_id):
+        self._queue.put(("DELETE FROM sessions WHERE session_id = ?", (session_id,)))
+
+    def expire_states(self, max_age, prefix=""):
+        stale = ("SELECT session_id FROM sessions WHERE updated < datetime('now', ?) "
+                 "AND substr(session_id, 1, ?) = ?")
+        params = (f"-{int(max_age)} seconds", len(prefix), prefix)
+        self._queue.put((f"DELETE FROM messages WHERE session_id IN ({stale})", params))
+        self._queue.put((f"DELETE FROM sessions WHERE session_id IN ({stale})", params))
+
+    def set_export_watermark(self, name, seq):
+        self._queue.put((
+            "INSERT INTO exports (name, seq, updated) VALUES (?, ?, CURRENT_TIMESTAMP) "
+            "ON CONFLICT(name) DO UPDATE SET seq = MAX(seq, excluded.seq), updated = excluded.updated",
+            (name, seq)
+        ))
+
+    def flush(self):
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write_loop(self):
+        db = self._connect()
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    self._commit(db, batch)
+                    for done in waiters:
+                        done.set()
+                    db.close()
+                    return
+                if isinstance(item, threading.Event):
+                    # A reader is waiting; commit now instead of at the end of the interval
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.interval if batch else 0.01)
+                except queue.Empty:
+                    break
+            self._commit(db, batch)
+            for done in waiters:
+                done.set()
+
+    @staticmethod
+    def _commit(db, batch):
+        if not batch:
+            return
+        with db:
+            for sql, params in batch:
+                db.execute(sql, params)
+
+    # Reads; queued writes are flushed first so reads see them
+
+    def load_state(self, session_id):
+        self.flush()
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_messages(self, session_id, before_id=None, limit=50):
+        self.flush()
+        with self._read_lock:
+            if before_id is None:
+                rows = self._reader.execute(
+                    "SELECT data FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                    (session_id, limit)
+                ).fetchall()
+            else:
+                rows = self._reader.execute(
+                    "SELECT data FROM messages WHERE session_id = ? AND seq < "
+                    "(SELECT seq FROM messages WHERE session_id = ? AND id = ?) "
+                    "ORDER BY seq DESC LIMIT ?",
+                    (session_id, session_id, before_id, limit)
+                ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def count_messages(self, session_id):
+        self.flush()
+        with self._read_lock:
+            return self._reader.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def message_ids(self, session_id):
+        self.flush()
+        with self._read_lock:
+            rows = self._reader.execute("SELECT id FROM messages WHERE session_id = ?", (session_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def export_watermark(self, name):
+        self.flush()
+        with self._read_lock:
+            row = self._reader.execute("SELECT seq FROM exports WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def messages_after(self, seq, batch_size=1000):
+        """Yield (seq, session_id, message) for every message stored after `seq`, in order
+
+        Reads on a connection of its own, so a long export doesn't hold up the
+        app's reads; it sees the messages committed when it started.
+        """
+        self.flush()
+        db = self._connect()
+        try:
+            cursor = db.execute(
+                "SELECT seq, session_id, data FROM messages WHERE seq > ? ORDER BY seq", (seq,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row_seq, session_id, data in rows:
+                    yield row_seq, session_id, json.loads(data)
+        finally:
+            db.close()
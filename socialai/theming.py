@@ -0,0 +1,159 @@
+"""Chat stylesheet compiled once per brand theme and injected only when it changes
+
+Streamlit drops any element a rerun doesn't emit, so a <style> sent with
+st.markdown has to be re-sent on every rerun. Instead the compiled
+stylesheet is written into the page <head> by a small script, which
+outlives the rerun; the app only sends it again when the theme changes.
+
+The script runs in an st.iframe. HTML given to it as a string is loaded as
+a same-origin srcdoc frame that may run scripts, so the script can reach
+window.parent.document. st.iframe takes no zero height, so script frames
+are 1px high and titled SCRIPT_FRAME_TITLE, and the stylesheet hides the
+elements that hold them. If a Streamlit release sandboxes srcdoc frames
+away from the parent, the fallback is to send the stylesheet with
+st.html on every rerun.
+"""
+import json
+import re
+from functools import lru_cache
+
+STYLE_ELEMENT_ID = "socialai-theme"
+# Title of the iframes that only run a script; the stylesheet hides them
+SCRIPT_FRAME_TITLE = "socialai-script"
+
+# Responsive CSS for both light and dark themes
+STYLESHEET_TEMPLATE = """
+    :root {{
+        --primary: {brand_color};
+        --secondary: #EC4899;
+    }}
+    
+    /* Light theme variables */
+    [data-theme="light"] {{
+        --background: #FFFFFF;
+        --card: #F8FAFC;
+        --text: #0F172A;
+        --border: #E2E8F0;
+        --input-bg: #FFFFFF;
+    }}
+    
+    /* Dark theme variables */
+    [data-theme="dark"] {{
+        --background: #0F172A;
+        --card: #1E293B;
+        --text: #FFFFFF;
+        --border: #334155;
+        --input-bg: #1E293B;
+    }}
+    
+    .chat-container {{
+        max-height: 70vh;
+        overflow-y: auto;
+        width: 200%;
+        padding: 1px;
+        border-radius: 19px;
+        background: var(--card);
+        margin-bottom: 20px;
+        border: 1px solid var(--border);
+    }}
+    
+    .user-message {{
+        background: linear-gradient(45deg, var(--primary), var(--secondary));
+        color: white;
+        border-radius: 20px 20px 0 20px;
+        padding: 1px;
+        margin: 15px 0;
+        max-width: 90%;
+        float: right;
+        clear: both;
+    }}
+    
+    .ai-message {{
+        background: var(--card);
+        color: var(--text);
+        border-radius: 18px 18px 18px 0;
+        padding: 1px;
+        margin: 15px 0;
+        max-width: 80%;
+        float: left;
+        clear: both;
+        border: 1px solid var(--border);
+    }}
+    
+    .message-header {{
+        display: flex;
+        align-items: center;
+        margin-bottom: 8px;
+    }}
+    
+    .message-icon {{
+        width: 30px;
+        height: 30px;
+        border-radius: 50%;
+        object-fit: contain;
+        margin-right: 10px;
+        border: none;
+        background: transparent;
+    }}
+    {logo_css}
+    
+    .message-timestamp {{
+        font-size: 0.75rem;
+        opacity: 0.7;
+        margin-top: 8px;
+        text-align: right;
+    }}
+    
+    .stTextInput>div>div>input {{
+        background: var(--input-bg) !important;
+        color: var(--text) !important;
+        border: 1px solid var(--border) !important;
+        border-radius: 16px !important;
+        padding: 10px 10px !important;
+    }}
+    
+    .stChatInput button {{
+        background: linear-gradient(45deg, var(--primary), var(--secondary)) !important;
+        border-radius: 16px !important;
+    }}
+    
+    .welcome-card {{
+        background: var(--card);
+        border-radius: 16px;
+        padding: 2px;
+        border: 1px solid var(--border);
+        margin-bottom: 20px;
+    }}
+    
+    /* Script frames (SCRIPT_FRAME_TITLE) take no room */
+    [data-testid="stElementContainer"]:has(iframe[title="socialai-script"]) {{
+        display: none;
+    }}
+"""
+
+
+def build_stylesheet(brand_color, logo_css=""):
+    """Fill in the theme and strip comments and indentation"""
+    css = STYLESHEET_TEMPLATE.format(brand_color=brand_color, logo_css=logo_css)
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    return re.sub(r"\s*\n\s*", "\n", css).strip()
+
+
+@lru_cache(maxsize=256)
+def compile_stylesheet(brand_color, logo_css=""):
+    """Stylesheet for a theme, built once per (color, logo) pair"""
+    return build_stylesheet(brand_color, logo_css)
+
+
+def theme_injection_html(css):
+    """Script that puts the stylesheet into the parent page's <head>, replacing an older theme"""
+    return f"""<script>
+const doc = window.parent.document;
+let style = doc.getElementById({json.dumps(STYLE_ELEMENT_ID)});
+if (!style) {{
+    style = doc.createElement("style");
+    style.id = {json.dumps(STYLE_ELEMENT_ID)};
+    doc.head.appendChild(style);
+}}
+style.textContent = {json.dumps(css)};
+</script>"""
@@ -0,0 +1,301 @@
+"""OAuth tokens with refresh, expiry and connection health kept off the render path
+
+The token manager keeps each connection's access token, refresh token and
+expiry in SQLite. A background worker refreshes tokens shortly before they
+expire and checks every connection against its platform's userinfo_url now
+and then, so the app's reruns only read the cached result: which token to
+use, who it belongs to and whether it still works.
+
+Only owners seen recently are kept in memory and in the worker's passes.
+An owner idle for IDLE_AFTER is dropped from both (its record stays in
+SQLite and is loaded again when the owner comes back), and one idle for
+RETENTION is deleted, so abandoned browser sessions stop costing refreshes
+and health checks.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from socialai.oauth import refresh_access_token
+
+# Refresh this many seconds before the token expires
+REFRESH_MARGIN = 5 * 60
+# Seconds between health checks of a connection
+HEALTH_INTERVAL = 10 * 60
+# Seconds between passes of the background worker
+POLL_INTERVAL = 30
+# A failed refresh is retried after this many seconds
+RETRY_INTERVAL = 60
+# Seconds unused before a record is dropped from memory and no longer refreshed or checked
+IDLE_AFTER = 24 * 60 * 60
+# Seconds unused before a record is deleted
+RETENTION = 90 * 24 * 60 * 60
+
+# Connection statuses; anything but STATUS_OK needs the user to reconnect
+STATUS_OK = "ok"
+STATUS_EXPIRED = "expired"    # past expiry and no refresh token
+STATUS_REJECTED = "rejected"  # the platform refused the token
+STATUS_REVOKED = "revoked"    # the platform refused the refresh token
+
+
+class TokenManager:
+    """Per-owner platform tokens, refreshed and health-checked by a background worker
+
+    An owner is whatever the app keys connections by: a session id or a
+    workspace. Records are plain dicts with the tokens, `expires_at`,
+    `status`, the last `user` info and the last `error`. Reading or
+    storing a record counts as using it.
+    """
+
+    def __init__(self, client, platforms, path, refresh_margin=REFRESH_MARGIN,
+                 health_interval=HEALTH_INTERVAL, poll_interval=POLL_INTERVAL, idle_after=IDLE_AFTER,
+                 retention=RETENTION, clock=time.time):
+        self.client = client
+        self.platforms = platforms
+        self.refresh_margin = refresh_margin
+        self.health_interval = health_interval
+        self.poll_interval = poll_interval
+        self.idle_after = idle_after
+        self.retention = retention
+        self.clock = clock
+        self.stats = {'refreshed': 0, 'refresh_failures': 0, 'checks': 0, 'check_failures': 0,
+                      'unloaded': 0, 'deleted': 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                owner TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                data TEXT NOT NULL,
+                used_at REAL,
+                PRIMARY KEY (owner, platform)
+            )
+        """)
+        # Stores from before records were expired count as used now
+        if 'used_at' not in {row[1] for row in self._db.execute("PRAGMA table_info(tokens)")}:
+            self._db.execute("ALTER TABLE tokens ADD COLUMN used_at REAL")
+        now = clock()
+        self._db.execute("UPDATE tokens SET used_at = ? WHERE used_at IS NULL", (now,))
+        self._db.execute("CREATE INDEX IF NOT EXISTS tokens_used ON tokens (used_at)")
+        self._db.commit()
+        self._records, self._used = {}, {}
+        for owner, platform, data, used_at in self._db.execute(
+                "SELECT owner, platform, data, used_at FROM tokens WHERE used_at > ?", (now - idle_after,)):
+            self._records[(owner, platform)] = json.loads(data)
+            self._used[(owner, platform)] = used_at
+        self._stop = threading.Event()
+        self._worker = None
+
+    # Render path: cached reads, and single-row writes on connect and disconnect
+
+    def store(self, owner, platform, token_data, user=None, page=None):
+        """Keep the tokens from a token response; returns the record
+
+        `page` is the Facebook Page posts go to: its `id`, `name` and Page
+        `access_token`.
+        """
+        now = self.clock()
+        expires_in = token_data.get('expires_in')
+        record = {
+            'access_token': token_data['access_token'],
+            'refresh_token': token_data.get('refresh_token'),
+            'expires_at': now + int(expires_in) if expires_in else None,
+            'status': STATUS_OK,
+            'user': user or {},
+            'page': page,
+            'checked_at': now if user else None,
+            'retry_at': None,
+            'error': None
+        }
+        with self._lock:
+            self._records[(owner, platform)] = record
+            self._used[(owner, platform)] = now
+            self._save(owner, platform, record)
+        return dict(record)
+
+    def get(self, owner, platform):
+        """Copy of the cached record, or None if the platform isn't connected"""
+        with self._lock:
+            record = self._load((owner, platform))
+            return dict(record) if record else None
+
+    def _load(self, key):
+        # An idle owner's record is read back from SQLite; the worker picks it up again
+        record = self._records.get(key)
+        if record is None:
+            row = self._db.execute("SELECT data FROM tokens WHERE owner = ? AND platform = ?", key).fetchone()
+            if row is None:
+                return None
+            record = self._records[key] = json.loads(row[0])
+        self._used[key] = self.clock()
+        return record
+
+    def access_token(self, owner, platform):
+        record = self.get(owner, platform)
+        return record['access_token'] if record else None
+
+    def publish_credentials(self, owner, platform):
+        """Token and target to publish with, or None if the connection can't publish now
+
+        Platforms with a `pages_url` publish as a Page, with the Page's own
+        token. An expired token gives None until the worker refreshes it,
+        which it does on its next pass once an idle owner's record is read.
+        """
+        record = self.get(owner, platform)
+        if record is None:
+            return None
+        page = record.get('page')
+        if page:
+            return {'access_token': page['access_token'], 'page_id': page['id']}
+        if 'pages_url' in self.platforms[platform]:
+            return None
+        if record['expires_at'] and record['expires_at'] <= self.clock():
+            return None
+        return {'access_token': record['access_token']}
+
+    def remove(self, owner, platform):
+        with self._lock:
+            self._records.pop((owner, platform), None)
+            self._used.pop((owner, platform), None)
+            with self._db:
+                self._db.execute("DELETE FROM tokens WHERE owner = ? AND platform = ?", (owner, platform))
+
+    def _save(self, owner, platform, record):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tokens (owner, platform, data, used_at) VALUES (?, ?, ?, ?)",
+                (owner, platform, json.dumps(record), self._used.get((owner, platform), self.clock()))
+            )
+
+    # Background worker
+
+    def start(self):
+        """Start the background worker if it isn't running"""
+        if self._worker is None or not self._worker.is_alive():
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="socialai-tokens", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.run_once()
+
+    def run_once(self):
+        """Expire idle records, then refresh tokens close to expiry and health-check connections that are due"""
+        now = self.clock()
+        refreshes, checks = [], []
+        with self._lock:
+            self._expire(now)
+            for key, record in self._records.items():
+                if record['status'] in (STATUS_EXPIRED, STATUS_REVOKED):
+                    continue
+                if record['retry_at'] and record['retry_at'] > now:
+                    continue
+                expires_at = record['expires_at']
+                if expires_at and expires_at - now <= self.refresh_margin:
+                    if record['refresh_token']:
+                        refreshes.append((key, record['refresh_token']))
+                    elif expires_at <= now:
+                        record['status'] = STATUS_EXPIRED
+                        self._save(*key, record)
+                elif record['status'] == STATUS_OK and (
+                        record['checked_at'] is None or now - record['checked_at'] >= self.health_interval):
+                    checks.append((key, record['access_token']))
+
+        for key, refresh_token in refreshes:
+            self._refresh(key, refresh_token)
+        if checks:
+            self._check(checks)
+
+    def _expire(self, now):
+        idle = [key for key, used_at in self._used.items() if now - used_at >= self.idle_after]
+        for key in idle:
+            # Saved with its last use, for the retention cutoff and the next load
+            self._save(*key, self._records.pop(key))
+            del self._used[key]
+        self.stats['unloaded'] += len(idle)
+        with self._db:
+            cursor = self._db.execute("DELETE FROM tokens WHERE used_at < ?", (now - self.retention,))
+        self.stats['deleted'] += cursor.rowcount
+
+    def _refresh(self, key, refresh_token):
+        owner, platform = key
+        try:
+            data = refresh_access_token(self.client, self.platforms[platform], refresh_token)
+            error = None if 'access_token' in data else data.get('error', "no access_token in response")
+        except Exception as e:
+            data, error = {}, str(e)
+        now = self.clock()
+        with self._lock:
+            record = self._records.get(key)
+            if record is None or record['refresh_token'] != refresh_token:
+                return  # disconnected or reconnected meanwhile
+            if error is None:
+                expires_in = data.get('expires_in')
+                record.update({
+                    'access_token': data['access_token'],
+                    # Some platforms rotate the refresh token on every use
+                    'refresh_token': data.get('refresh_token', refresh_token),
+                    'expires_at': now + int(expires_in) if expires_in else None,
+                    'status': STATUS_OK,
+                    'retry_at': None,
+                    'error': None
+                })
+                self.stats['refreshed'] += 1
+            else:
+                if error == "invalid_grant":
+                    record['status'] = STATUS_REVOKED
+                record['retry_at'] = now + RETRY_INTERVAL
+                record['error'] = str(error)
+                self.stats['refresh_failures'] += 1
+            self._save(owner, platform, record)
+
+    def _check(self, checks):
+        """Call each connection's userinfo_url concurrently and record who it belongs to"""
+        calls = {
+            key: ("GET", self.platforms[key[1]]['userinfo_url'],
+                  {'headers': {"Authorization": f"Bearer {token}"}})
+            for key, token in checks
+        }
+        responses = self.client.fetch_all(calls)
+        now = self.clock()
+        with self._lock:
+            for key, token in checks:
+                record = self._records.get(key)
+                if record is None or record['access_token'] != token:
+                    continue
+                response = responses[key]
+                record['checked_at'] = now
+                self.stats['checks'] += 1
+                if isinstance(response, Exception):
+                    # Network trouble says nothing about the token; try again next interval
+                    record['error'] = str(response)
+                    self.stats['check_failures'] += 1
+                elif response.status_code in (401, 403):
+                    record['error'] = f"HTTP {response.status_code}"
+                    self.stats['check_failures'] += 1
+                    if record['refresh_token']:
+                        record['expires_at'] = now  # refresh on the next pass
+                    else:
+                        record['status'] = STATUS_REJECTED
+                elif response.ok:
+                    try:
+                        record['user'] = response.json()
+                        record['error'] = None
+                    except ValueError as e:
+                        record['error'] = str(e)
+                else:
+                    record['error'] = f"HTTP {response.status_code}"
+                    self.stats['check_failures'] += 1
+                self._save(*key, record)
+
+    def close(self):
+        self.stop()
+        self._db.close()
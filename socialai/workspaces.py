@@ -0,0 +1,173 @@
+"""Workspaces: one business profile shared by several operators
+
+A workspace holds a client business's profile, connected platforms, chat
+history and chat memory. Operators whose sessions join the same workspace
+see and extend the same conversation. Workspaces are loaded from the
+session store the first time they are used and kept in a bounded LRU; the
+least recently used are saved back and dropped from memory, so one process
+can serve many more tenants than it holds at once.
+
+A workspace has no access control of its own: its id is the only secret,
+and whoever enters it shares the tenant's connected accounts, tokens and
+publish queue.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from socialai.memory import DEFAULT_MEMORY_ENGINE
+from socialai.rendering import HISTORY_PAGE_SIZE
+
+DEFAULT_CAPACITY = 256
+# Prefix for workspace rows in the session store, which also holds per-browser sessions
+STORE_PREFIX = "workspace:"
+
+
+def default_business_info():
+    return {'name': '', 'logo': None, 'color': '#8B5CF6'}
+
+
+class Workspace:
+    """In-memory state of one tenant
+
+    `lock` serializes history appends between the operators sharing the
+    workspace. `chatbot` is built by the app on first use; its memory is
+    saved with the workspace and kept in `saved_memory` until then.
+    """
+
+    def __init__(self, workspace_id):
+        self.workspace_id = workspace_id
+        self.store_key = STORE_PREFIX + workspace_id
+        self.business_info = default_business_info()
+        self.connections = {}
+        self.user_info = {}
+        self.memory_engine = DEFAULT_MEMORY_ENGINE
+        self.history = []
+        self.history_total = 0
+        self.chatbot = None
+        self.saved_memory = None
+        self.lock = threading.RLock()
+        self.saved_state = None
+
+    def snapshot(self):
+        """JSON-serializable copy of the state kept in the store"""
+        return {
+            'business_info': dict(self.business_info),
+            'connections': dict(self.connections),
+            'user_info': dict(self.user_info),
+            'memory_engine': self.memory_engine,
+            'memory': self.chatbot.memory_state() if self.chatbot else self.saved_memory,
+        }
+
+    def restore(self, state):
+        self.business_info.update(state.get('business_info', {}))
+        self.connections.update(state.get('connections', {}))
+        self.user_info.update(state.get('user_info', {}))
+        self.memory_engine = state.get('memory_engine', self.memory_engine)
+        self.saved_memory = state.get('memory')
+        self.saved_state = state
+
+
+class WorkspaceManager:
+    """Lazily loaded, LRU-bounded set of active workspaces backed by a SessionStore"""
+
+    def __init__(self, store, capacity=DEFAULT_CAPACITY, history_page=HISTORY_PAGE_SIZE):
+        self.store = store
+        self.capacity = capacity
+        self.history_page = history_page
+        self._active = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+    def get(self, workspace_id):
+        """Return the workspace, loading it from the store on first access
+
+        Loads run outside the manager lock, so one tenant's disk reads don't
+        hold up lookups of the others; concurrent requests for a workspace
+        being loaded wait for that one load.
+        """
+        with self._lock:
+            workspace = self._active.get(workspace_id)
+            if workspace is not None:
+                self._active.move_to_end(workspace_id)
+                self.stats['hits'] += 1
+                return workspace
+            loading = self._loading.get(workspace_id)
+            if loading is None:
+                loading = self._loading[workspace_id] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result()
+
+        try:
+            workspace = self._load(workspace_id)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[workspace_id]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[workspace_id]
+            self._active[workspace_id] = workspace
+            self.stats['loads'] += 1
+            evicted = []
+            while len(self._active) > self.capacity:
+                evicted.append(self._active.popitem(last=False)[1])
+                self.stats['evictions'] += 1
+        loading.set_result(workspace)
+        for old in evicted:
+            self.save(old)
+        return workspace
+
+    def _load(self, workspace_id):
+        workspace = Workspace(workspace_id)
+        state = self.store.load_state(workspace.store_key)
+        if state:
+            workspace.restore(state)
+            workspace.history = self.store.load_messages(workspace.store_key, limit=self.history_page)
+            workspace.history_total = self.store.count_messages(workspace.store_key)
+        return workspace
+
+    def save(self, workspace):
+        """Queue the workspace state for writing if it changed since the last save"""
+        with workspace.lock:
+            state = workspace.snapshot()
+            if state != workspace.saved_state:
+                self.store.save_state(workspace.store_key, state)
+                workspace.saved_state = state
+
+    def add_message(self, workspace, msg, window=HISTORY_PAGE_SIZE):
+        """Append a message to the shared history and keep at most `window` of it in memory"""
+        with workspace.lock:
+            workspace.history.append(msg)
+            workspace.history_total += 1
+            self.store.append_messages(workspace.store_key, [msg])
+            overflow = len(workspace.history) - window
+            if overflow > 0:
+                del workspace.history[:overflow]
+
+    def load_earlier(self, workspace, limit=HISTORY_PAGE_SIZE):
+        """Read the page of messages before the oldest one in memory back from the store"""
+        with workspace.lock:
+            if workspace.history:
+                older = self.store.load_messages(
+                    workspace.store_key, before_id=workspace.history[0]['id'], limit=limit
+                )
+                workspace.history[:0] = older
+
+    def evict_all(self):
+        """Save every active workspace and drop them from memory"""
+        with self._lock:
+            workspaces = list(self._active.values())
+            self._active.clear()
+        for workspace in workspaces:
+            self.save(workspace)
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, workspace_id):
+        return workspace_id in self._active
@@ -0,0 +1,31 @@
+"""ChatSession prompts, built from the bounded memory"""
+import pytest
+
+from socialai.chat import ChatSession
+from socialai.llm import create_llm
+from socialai.memory import MEMORY_ENGINES
+
+FAST_STUB = dict(latency=0, tokens_per_second=1_000_000, response_tokens=5)
+
+
+@pytest.mark.parametrize("engine", MEMORY_ENGINES)
+def test_prompt_history_is_a_plain_transcript(engine):
+    llm = create_llm("stub", **FAST_STUB)
+    session = ChatSession(llm, engine)
+    message = llm.invoke(session.build_prompt("What should I post?"))
+    session.finish_turn("What should I post?", "", message)
+
+    prompt = session.build_prompt("Make it shorter")
+    history = prompt.split("Conversation History:\n", 1)[1].split("\n\nCurrent Interaction:", 1)[0]
+    assert history == f"User: What should I post?\nSocialAI: {message.content}"
+
+
+def test_summary_is_part_of_the_transcript():
+    llm = create_llm("stub", **FAST_STUB)
+    session = ChatSession(llm, "Summary")
+    session.restore_memory({'messages': [], 'summary': "The user runs a bakery."})
+    session.memory.chat_memory.add_user_message("And on Sundays?")
+
+    prompt = session.build_prompt("Thanks")
+    assert "System: The user runs a bakery.\nUser: And on Sundays?" in prompt
+    assert "Message(" not in prompt
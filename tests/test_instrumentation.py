@@ -0,0 +1,36 @@
+"""Profiler accounting of LLM replies collected in and outside reruns"""
+from socialai.instrumentation import Profiler
+
+
+def test_reply_collected_in_a_rerun_is_part_of_it():
+    profiler = Profiler(enabled=True)
+    profiler.start_run()
+    profiler.record_reply(1.5, first_token_latency=0.25, prompt_tokens=90, response_tokens=40)
+    profiler.finish_run(session="s1")
+
+    run, = profiler.recent_runs(1, session="s1")
+    assert run['tokens'] == {'prompt': 90, 'response': 40}
+    assert run['replies'] == [{'reply': 1.5, 'first_token': 0.25}]
+    text = profiler.prometheus_text()
+    assert 'socialai_llm_tokens_total{kind="prompt"} 90' in text
+    assert 'socialai_llm_reply_seconds_count{stage="reply"} 1' in text
+
+
+def test_reply_collected_outside_a_rerun_still_counts():
+    profiler = Profiler(enabled=True)
+    profiler.record_reply(2.0, prompt_tokens=10, response_tokens=5)
+
+    text = profiler.prometheus_text()
+    assert 'socialai_llm_tokens_total{kind="response"} 5' in text
+    assert 'socialai_llm_reply_seconds_sum{stage="reply"} 2.000000' in text
+    assert 'stage="first_token"' not in text
+    assert profiler.recent_runs(10) == []
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    profiler.start_run()
+    profiler.record_reply(1.0, prompt_tokens=10)
+    profiler.finish_run()
+
+    assert 'kind=' not in profiler.prometheus_text()
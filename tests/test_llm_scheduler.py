@@ -0,0 +1,146 @@
+"""LLMScheduler under simulated burst load, backed by the stub model"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from socialai.chat import ChatSession
+from socialai.chat_worker import JOB_DONE, ChatWorker
+from socialai.content_batch import generate_calendar
+from socialai.llm import create_llm
+from socialai.llm_scheduler import LLMScheduler
+
+FAST_STUB = dict(latency=0.01, tokens_per_second=1000, response_tokens=5)
+UNLIMITED_RATE = 1_000_000
+
+
+class CountingModel:
+    """Stub model that records how many calls run at once and in total"""
+
+    def __init__(self, latency=0.05):
+        self.llm = create_llm("stub", latency=latency, tokens_per_second=UNLIMITED_RATE, response_tokens=5)
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return self.llm.invoke(prompt)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_burst_never_exceeds_max_concurrency():
+    scheduler = LLMScheduler(max_concurrency=4, rate_per_minute=UNLIMITED_RATE)
+    model = CountingModel()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(lambda i: scheduler.call(f"session-{i}", f"prompt {i}", lambda: model.invoke(f"prompt {i}")),
+                      range(32)))
+    assert model.calls == 32
+    assert model.peak == 4
+    assert scheduler.metrics()['active'] == 0
+
+
+def test_busy_session_does_not_starve_others():
+    scheduler = LLMScheduler(max_concurrency=1, rate_per_minute=UNLIMITED_RATE)
+    order = []
+    # Hold the only slot so every request below queues first
+    scheduler.acquire("holder")
+
+    def request(session_id):
+        with scheduler.slot(session_id):
+            order.append(session_id)
+
+    with ThreadPoolExecutor(max_workers=13) as pool:
+        futures = [pool.submit(request, "busy") for _ in range(10)]
+        while scheduler.metrics()['queue_depth'] < 10:
+            time.sleep(0.001)
+        futures += [pool.submit(request, f"light-{i}") for i in range(3)]
+        while scheduler.metrics()['queue_depth'] < 13:
+            time.sleep(0.001)
+        scheduler.release()
+        for future in futures:
+            future.result()
+    # Round-robin by session: each light session is served within the first few grants
+    assert max(order.index(f"light-{i}") for i in range(3)) <= 4
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    scheduler = LLMScheduler(max_concurrency=8, rate_per_minute=UNLIMITED_RATE)
+    model = CountingModel(latency=0.2)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        replies = list(pool.map(lambda i: scheduler.call(f"session-{i}", "same prompt",
+                                                         lambda: model.invoke("same prompt")), range(10)))
+    assert model.calls == 1
+    assert scheduler.counters['coalesced'] == 9
+    assert len({reply.content for reply in replies}) == 1
+
+
+def test_calendar_posts_go_through_the_scheduler():
+    scheduler = LLMScheduler(max_concurrency=2, rate_per_minute=UNLIMITED_RATE)
+    llm = create_llm("stub", **FAST_STUB)
+    entries = list(generate_calendar(llm, {'name': "Stub Bakery"}, ["Twitter", "Instagram"],
+                                     date(2026, 11, 2), date(2026, 11, 4), scheduler=scheduler,
+                                     session_id="session-1"))
+    assert len(entries) == 6 and all('content' in entry for entry in entries)
+    assert scheduler.counters['calls'] == 6
+
+
+def test_async_waiters_wake_when_only_the_rate_limit_binds():
+    scheduler = LLMScheduler(max_concurrency=1, rate_per_minute=600)
+
+    async def turn(i):
+        async with scheduler.aslot(f"session-{i}"):
+            await asyncio.sleep(0.01)
+
+    async def burst():
+        await asyncio.wait_for(asyncio.gather(*(turn(i) for i in range(3))), timeout=5)
+
+    started = time.monotonic()
+    asyncio.run(burst())
+    # One token up front, then one every 0.1 s
+    assert time.monotonic() - started < 1
+    metrics = scheduler.metrics()
+    assert metrics['active'] == 0 and metrics['queue_depth'] == 0
+
+
+def test_chat_worker_drains_a_burst_through_a_binding_rate_limit():
+    scheduler = LLMScheduler(max_concurrency=8, rate_per_minute=1200)
+    llm = create_llm("stub", **FAST_STUB)
+    worker = ChatWorker()
+    try:
+        jobs = []
+        for i in range(24):
+            chatbot = ChatSession(llm, "Window")
+            chatbot.scheduler = scheduler
+            chatbot.session_id = f"session-{i}"
+            jobs.append(worker.submit(chatbot.session_id, chatbot, f"Post ideas {i}"))
+        results = [worker.wait(job_id, timeout=10) for job_id in jobs]
+    finally:
+        worker.close()
+    assert [job['status'] for job in results] == [JOB_DONE] * 24
+    assert scheduler.metrics()['queue_depth'] == 0
+
+
+def test_cancelled_async_waiter_gives_up_its_place():
+    scheduler = LLMScheduler(max_concurrency=1, rate_per_minute=UNLIMITED_RATE)
+
+    async def scenario():
+        await scheduler.acquire_async("holder")
+        waiter = asyncio.create_task(scheduler.acquire_async("waiter"))
+        await asyncio.sleep(0.01)
+        assert scheduler.metrics()['queue_depth'] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+
+    asyncio.run(scenario())
+    metrics = scheduler.metrics()
+    assert metrics['queue_depth'] == 0 and metrics['active'] == 0
@@ -0,0 +1,92 @@
+"""MetricsFetcher: background fetches, stale values and cache eviction, against the stub server"""
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.metrics import LOADING, MetricsFetcher, summarize_metrics, token_key
+
+TWITTER = {"data": {"public_metrics": {"followers_count": 830, "following_count": 120,
+                                       "tweet_count": 2100, "like_count": 560}}}
+
+
+@pytest.fixture
+def server():
+    with StubPlatformServer() as server:
+        server.responses = [(200, TWITTER)]
+        server.route("GET", "/twitter/users/me", lambda q, f, h: server.responses[0])
+        yield server
+
+
+@pytest.fixture
+def fetcher(server):
+    client = HttpClient(retries=0)
+    fetcher = MetricsFetcher(client, {"Twitter": server.platform(metrics_url=f"{server.url}/twitter/users/me")})
+    yield fetcher
+    fetcher.close()
+    client.close()
+
+
+def settled(fetcher, connections, timeout=5):
+    """fetch() once the background fetches it started have finished"""
+    deadline = time.monotonic() + timeout
+    while fetcher._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return fetcher.fetch(connections)
+
+
+def test_first_fetch_returns_placeholder_then_metrics(fetcher):
+    connections = {"Twitter": "token"}
+    assert fetcher.fetch(connections) == {"Twitter": LOADING}
+    assert settled(fetcher, connections)["Twitter"]["followers"] == 830
+    assert summarize_metrics({"Twitter": LOADING}) == "Not available"
+
+
+def test_slow_platform_does_not_block_the_rerun(server):
+    release = threading.Event()
+    server.route("GET", "/slow", lambda q, f, h: release.wait(5) and (200, TWITTER))
+    client = HttpClient(retries=0)
+    fetcher = MetricsFetcher(client, {"Twitter": server.platform(metrics_url=f"{server.url}/slow")})
+    try:
+        start = time.perf_counter()
+        assert fetcher.fetch({"Twitter": "token"}) == {"Twitter": LOADING}
+        assert fetcher.fetch({"Twitter": "token"}) == {"Twitter": LOADING}
+        assert time.perf_counter() - start < 0.5
+        release.set()
+        assert settled(fetcher, {"Twitter": "token"})["Twitter"]["followers"] == 830
+    finally:
+        release.set()
+        fetcher.close()
+        client.close()
+
+
+def test_expired_metrics_are_shown_while_refetched(fetcher, server):
+    connections = {"Twitter": "token"}
+    fetcher.refresh(connections)
+    key = token_key("Twitter", "token")
+    fetcher._cache[key] = (time.time() - 1, fetcher._cache[key][1])
+    server.responses[0] = (200, {"data": {"public_metrics": {"followers_count": 900}}})
+
+    assert fetcher.fetch(connections)["Twitter"]["followers"] == 830
+    assert settled(fetcher, connections)["Twitter"]["followers"] == 900
+
+
+def test_failed_refetch_keeps_the_last_good_metrics(fetcher, server):
+    connections = {"Twitter": "token"}
+    fetcher.refresh(connections)
+    server.responses[0] = (503, {"error": "down"})
+
+    assert fetcher.refresh(connections)["Twitter"]["followers"] == 830
+    assert fetcher.refresh({"Twitter": "other-token"})["Twitter"] == {'error': "HTTP 503"}
+
+
+def test_entries_long_past_expiry_are_evicted(fetcher):
+    fetcher.refresh({"Twitter": "old-token"})
+    old = token_key("Twitter", "old-token")
+    fetcher._cache[old] = (time.time() - fetcher.max_stale - 1, fetcher._cache[old][1])
+
+    fetcher.refresh({"Twitter": "new-token"})
+    assert old not in fetcher._cache
+    assert token_key("Twitter", "new-token") in fetcher._cache
@@ -0,0 +1,277 @@
+"""PublishQueue state changes and Publisher outcomes, against the stub platform server"""
+import json
+import threading
+import uuid
+from urllib.parse import parse_qs
+
+import pytest
+
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.publishing import (
+    ADDED,
+    FAILED,
+    KEPT,
+    PUBLISHED,
+    RETRY,
+    STATUS_FAILED,
+    STATUS_PUBLISHED,
+    STATUS_PUBLISHING,
+    STATUS_QUEUED,
+    STATUS_UNCERTAIN,
+    UNCERTAIN,
+    UNCHANGED,
+    UPDATED,
+    PublishQueue,
+    Publisher,
+    http_outcome,
+)
+
+CREDENTIALS = {'access_token': "token", 'page_id': "page-1"}
+UNLIMITED = {"Facebook": 1_000_000, "Twitter": 1_000_000}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = PublishQueue(str(tmp_path / "publish_queue.sqlite3"), lease=60, backoff=0)
+    yield queue
+    queue.close()
+
+
+class MockPlatforms:
+    """Feed, Graph batch and tweet endpoints; `fail` holds the status the next requests get"""
+
+    def __init__(self):
+        self.created = []
+        self.fail = []
+        self.lock = threading.Lock()
+
+    def _failure(self):
+        with self.lock:
+            return self.fail.pop(0) if self.fail else None
+
+    def _create(self, message):
+        with self.lock:
+            self.created.append(message)
+        return uuid.uuid4().hex
+
+    def feed(self, query, form, headers):
+        status = self._failure()
+        if status:
+            return status, {"error": {"message": "outage", "code": 2}}
+        return 200, {"id": self._create(form["message"])}
+
+    def batch(self, query, form, headers):
+        results = []
+        for item in json.loads(form["batch"]):
+            message = parse_qs(item["body"])["message"][0]
+            results.append({"code": 200, "body": json.dumps({"id": self._create(message)})})
+        return 200, results
+
+    def tweet(self, query, form, headers):
+        status = self._failure()
+        if status:
+            return status, {"detail": "outage"}
+        if form["text"] in self.created:
+            return 403, {"detail": "You are not allowed to create a Tweet with duplicate content."}
+        return 201, {"data": {"id": self._create(form["text"])}}
+
+
+@pytest.fixture
+def platforms():
+    mock = MockPlatforms()
+    with StubPlatformServer() as server:
+        server.route("POST", "/page-1/feed", mock.feed)
+        server.route("POST", "/graph", mock.batch)
+        server.route("POST", "/2/tweets", mock.tweet)
+        config = {
+            "Facebook": server.platform(publish_url=f"{server.url}/{{page_id}}/feed",
+                                        batch_url=f"{server.url}/graph", publish_path="{page_id}/feed"),
+            "Twitter": server.platform(publish_url=f"{server.url}/2/tweets")
+        }
+        yield mock, config
+
+
+@pytest.fixture
+def client():
+    client = HttpClient(retries=0)
+    yield client
+    client.close()
+
+
+def publisher_for(queue, client, config, credentials=CREDENTIALS):
+    return Publisher(queue, client, config, lambda owner, platform: credentials, rates=UNLIMITED)
+
+
+def status_of(queue, post_id, owner="owner"):
+    return next(post for post in queue.posts(owner) if post['id'] == post_id)['status']
+
+
+@pytest.mark.parametrize("status, payload, resend_safe, expected", [
+    (200, {"id": "1"}, False, PUBLISHED),
+    (429, {}, False, RETRY),
+    (400, {"error": {"message": "throttled", "code": 4}}, False, RETRY),
+    (500, {"error": {"message": "unknown", "code": 1}}, False, UNCERTAIN),
+    (503, {}, False, UNCERTAIN),
+    (503, {}, True, RETRY),
+    (400, {"error": {"message": "bad", "code": 100}}, False, FAILED),
+    (403, {"detail": "forbidden"}, True, FAILED),
+])
+def test_http_outcome(status, payload, resend_safe, expected):
+    outcome, _ = http_outcome(status, payload, payload.get("id"), resend_safe=resend_safe)
+    assert outcome == expected
+
+
+def test_expired_facebook_claim_is_marked_uncertain_not_resent(queue):
+    post_id = queue.enqueue("owner", "Facebook", "hello", publish_at=1000)
+    assert [post['id'] for post in queue.claim("Facebook", 10, now=1000)] == [post_id]
+
+    assert queue.claim("Facebook", 10, now=1000 + queue.lease + 1) == []
+    assert status_of(queue, post_id) == STATUS_UNCERTAIN
+
+
+def test_expired_twitter_claim_is_taken_again(queue):
+    post_id = queue.enqueue("owner", "Twitter", "hello", publish_at=1000)
+    first, = queue.claim("Twitter", 10, now=1000)
+    second, = queue.claim("Twitter", 10, now=1000 + queue.lease + 1)
+
+    assert second['id'] == post_id and second['claim'] != first['claim']
+    assert second['attempts'] == 2
+    # The first worker's claim is gone: neither its renewal nor its outcome is recorded
+    assert queue.renew([first]) == []
+    assert not queue.complete(first, PUBLISHED, "remote-1")
+    assert status_of(queue, post_id) == STATUS_PUBLISHING
+
+
+def test_renewed_claim_does_not_expire(queue):
+    post_id = queue.enqueue("owner", "Facebook", "hello", publish_at=1000)
+    post, = queue.claim("Facebook", 10, now=1000)
+    assert queue.renew([post], now=1000 + queue.lease - 1) == [post]
+
+    assert queue.claim("Facebook", 10, now=1000 + queue.lease + 1) == []
+    assert status_of(queue, post_id) == STATUS_PUBLISHING
+    assert queue.complete(post, PUBLISHED, "remote-1")
+    assert status_of(queue, post_id) == STATUS_PUBLISHED
+
+
+def test_complete_retries_until_max_attempts(queue):
+    post_id = queue.enqueue("owner", "Twitter", "hello", publish_at=1000)
+    for _ in range(queue.max_attempts):
+        post, = queue.claim("Twitter", 10)
+        assert queue.complete(post, RETRY, "throttled")
+    assert status_of(queue, post_id) == STATUS_FAILED
+
+
+def test_schedule_updates_queued_posts_only(queue):
+    assert queue.schedule("owner", "Twitter", "draft", 1000, "post-1") == ADDED
+    assert queue.schedule("owner", "Twitter", "draft", 1000, "post-1") == UNCHANGED
+    assert queue.schedule("owner", "Twitter", "final", 2000, "post-1") == UPDATED
+    post, = queue.posts("owner")
+    assert (post['content'], post['publish_at'], post['status']) == ("final", 2000, STATUS_QUEUED)
+
+    assert queue.claim("Twitter", 10, now=1000) == []
+    post, = queue.claim("Twitter", 10, now=2000)
+    assert queue.schedule("owner", "Twitter", "too late", 3000, "post-1") == KEPT
+    assert queue.complete(post, PUBLISHED, "remote-1")
+    assert queue.schedule("owner", "Twitter", "too late", 3000, "post-1") == KEPT
+    assert queue.posts("owner")[0]['content'] == "final"
+
+
+def test_resolve_settles_only_uncertain_posts(queue):
+    sent = queue.enqueue("owner", "Facebook", "sent", publish_at=1000)
+    lost = queue.enqueue("owner", "Facebook", "lost", publish_at=1000)
+    for post in queue.claim("Facebook", 10, now=1000):
+        queue.complete(post, UNCERTAIN, "HTTP 503")
+
+    assert queue.resolve(sent, published=True)
+    assert queue.resolve(lost, published=False)
+    assert not queue.resolve(sent, published=False)
+    assert status_of(queue, sent) == STATUS_PUBLISHED
+    assert status_of(queue, lost) == STATUS_QUEUED
+
+
+def test_publisher_publishes_batches_once(queue, platforms, client):
+    mock, config = platforms
+    for i in range(60):
+        queue.enqueue("owner", "Facebook", f"post {i}")
+    publisher = publisher_for(queue, client, config)
+    try:
+        while publisher.run_once():
+            pass
+    finally:
+        publisher.close()
+
+    assert sorted(mock.created) == sorted(f"post {i}" for i in range(60))
+    assert queue.counts() == {STATUS_PUBLISHED: 60}
+    assert publisher.stats['requests'] == 2
+
+
+def test_server_error_leaves_facebook_post_uncertain(queue, platforms, client):
+    mock, config = platforms
+    mock.fail = [503]
+    post_id = queue.enqueue("owner", "Facebook", "hello")
+    publisher = publisher_for(queue, client, config)
+    try:
+        publisher.run_once()
+        assert publisher.run_once() == 0
+    finally:
+        publisher.close()
+
+    assert status_of(queue, post_id) == STATUS_UNCERTAIN
+    assert publisher.stats['uncertain'] == 1
+
+
+def test_server_error_retries_tweet_and_duplicate_counts_as_published(queue, platforms, client):
+    mock, config = platforms
+    mock.fail = [503]
+    post_id = queue.enqueue("owner", "Twitter", "hello")
+    mock.created.append("hello")  # sent by an attempt whose response was lost
+    publisher = publisher_for(queue, client, config)
+    try:
+        publisher.run_once()
+        assert status_of(queue, post_id) == STATUS_QUEUED
+        publisher.run_once()
+    finally:
+        publisher.close()
+
+    assert status_of(queue, post_id) == STATUS_PUBLISHED
+    assert mock.created == ["hello"]
+
+
+def test_publisher_without_credentials_retries(queue, platforms, client):
+    mock, config = platforms
+    post_id = queue.enqueue("owner", "Facebook", "hello")
+    publisher = publisher_for(queue, client, config, credentials=None)
+    try:
+        publisher.run_once()
+    finally:
+        publisher.close()
+
+    assert status_of(queue, post_id) == STATUS_QUEUED
+    assert mock.created == []
+
+
+def test_publisher_skips_posts_whose_claim_was_taken_over(queue, platforms, client):
+    mock, config = platforms
+    queue.enqueue("owner", "Twitter", "hello")
+    publisher = publisher_for(queue, client, config)
+    post, = queue.claim("Twitter", 10)
+    queue.claim("Twitter", 10, now=post['lease_until'] + 1)
+    try:
+        assert publisher._publish("Twitter", "owner", [post]) == []
+    finally:
+        publisher.close()
+
+    assert mock.created == []
+
+
+def test_claim_limit_follows_the_rate(queue, platforms, client):
+    _, config = platforms
+    publisher = Publisher(queue, client, config, lambda owner, platform: CREDENTIALS,
+                          rates={"Facebook": 60, "Twitter": 13})
+    try:
+        # 60 posts a minute start 30 in half of a 60 s lease
+        assert publisher.claim_limit("Facebook") == 30
+        assert publisher.claim_limit("Twitter") == 4
+    finally:
+        publisher.close()
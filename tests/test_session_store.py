@@ -0,0 +1,86 @@
+"""SQLiteSessionStore: the SessionStore interface and the retention sweep"""
+import sqlite3
+
+import pytest
+
+from socialai.messages import new_message
+from socialai.session_store import SessionStore, SQLiteSessionStore
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+@pytest.fixture
+def store(path):
+    store = SQLiteSessionStore(path)
+    yield store
+    store.close()
+
+
+def age(path, session_id, seconds):
+    """Move a session's last use `seconds` into the past"""
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE sessions SET updated = datetime('now', ?) WHERE session_id = ?",
+                   (f"-{seconds} seconds", session_id))
+
+
+def test_interface_is_complete():
+    assert SessionStore.__abstractmethods__ <= set(vars(SQLiteSessionStore))
+
+    class Partial(SessionStore):
+        def load_state(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_expire_states_deletes_abandoned_sessions_and_their_messages(store, path):
+    for session_id in ("old", "recent"):
+        store.save_state(session_id, {'connections': {}})
+        store.append_messages(session_id, [new_message('user', "hello")])
+    store.flush()
+    age(path, "old", 10 * DAY)
+
+    store.expire_states(7 * DAY)
+    assert store.load_state("old") is None
+    assert store.count_messages("old") == 0
+    assert store.load_state("recent") is not None
+    assert store.count_messages("recent") == 1
+
+
+def test_appending_messages_marks_the_session_used(store, path):
+    store.save_state("chatting", {'connections': {}})
+    store.flush()
+    age(path, "chatting", 10 * DAY)
+    store.append_messages("chatting", [new_message('user', "still here")])
+
+    store.expire_states(7 * DAY)
+    assert store.load_state("chatting") is not None
+
+
+def test_expire_states_only_touches_the_prefix(store, path):
+    store.save_state("oauth-state:abc", {'session_id': "s1"})
+    store.save_state("s1", {'connections': {}})
+    store.flush()
+    age(path, "oauth-state:abc", 20 * 60)
+    age(path, "s1", 20 * 60)
+
+    store.expire_states(15 * 60, prefix="oauth-state:")
+    assert store.load_state("oauth-state:abc") is None
+    assert store.load_state("s1") is not None
+
+
+def test_export_reads_every_message_after_the_watermark(store):
+    store.append_messages("a", [new_message('user', "one"), new_message('ai', "two")])
+    store.append_messages("b", [new_message('user', "three")])
+    first = list(store.messages_after(0))
+    store.set_export_watermark("nightly", first[1][0])
+
+    rest = list(store.messages_after(store.export_watermark("nightly")))
+    assert [(session_id, msg['content']) for _, session_id, msg in rest] == [("b", "three")]
+    assert store.message_ids("a") == {msg['id'] for _, _, msg in first[:2]}
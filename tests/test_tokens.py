@@ -0,0 +1,183 @@
+"""TokenManager refresh, rotation, revocation and expiry of idle owners, against a fake token endpoint"""
+import threading
+import uuid
+
+import pytest
+
+from benchmarks.stub_server import StubPlatformServer
+from socialai.http_client import HttpClient
+from socialai.tokens import STATUS_OK, STATUS_REJECTED, STATUS_REVOKED, TokenManager
+
+LIFETIME = 3600
+
+
+class FakeAuthority:
+    """Token endpoint with single-use, rotating refresh tokens and a userinfo endpoint that checks the token"""
+
+    def __init__(self):
+        self.access = set()
+        self.refresh = set()
+        self.refreshes = 0
+        self.checks = 0
+        self.lock = threading.Lock()
+
+    def issue(self):
+        access, refresh = f"access-{uuid.uuid4().hex}", f"refresh-{uuid.uuid4().hex}"
+        with self.lock:
+            self.access.add(access)
+            self.refresh.add(refresh)
+        return {"access_token": access, "refresh_token": refresh, "expires_in": LIFETIME}
+
+    def token(self, query, form, headers):
+        with self.lock:
+            if form.get("refresh_token") not in self.refresh:
+                return 400, {"error": "invalid_grant"}
+            self.refresh.discard(form["refresh_token"])
+            self.refreshes += 1
+        return 200, self.issue()
+
+    def user_info(self, query, form, headers):
+        with self.lock:
+            self.checks += 1
+            if headers.get("Authorization", "").removeprefix("Bearer ") not in self.access:
+                return 401, {"error": "invalid_token"}
+        return 200, {"id": "42", "name": "Stub Bakery"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def authority():
+    authority = FakeAuthority()
+    with StubPlatformServer() as server:
+        server.route("POST", "/oauth/token", authority.token)
+        server.route("GET", "/me", authority.user_info)
+        authority.platforms = {"Twitter": server.platform()}
+        yield authority
+
+
+@pytest.fixture
+def client():
+    client = HttpClient(retries=0)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def manager(authority, client, clock, tmp_path):
+    manager = TokenManager(client, authority.platforms, str(tmp_path / "tokens.sqlite3"), clock=clock)
+    yield manager
+    manager.close()
+
+
+def test_token_is_refreshed_before_expiry_and_rotated(manager, authority, clock):
+    first = authority.issue()
+    manager.store("owner", "Twitter", first)
+    manager.run_once()
+    assert authority.refreshes == 0
+
+    clock.now += LIFETIME - manager.refresh_margin + 1
+    manager.run_once()
+    record = manager.get("owner", "Twitter")
+    assert authority.refreshes == 1
+    assert record['access_token'] != first['access_token']
+    assert record['refresh_token'] != first['refresh_token']
+    assert record['expires_at'] == clock.now + LIFETIME
+
+    # The rotated refresh token works for the next refresh too
+    clock.now += LIFETIME
+    manager.run_once()
+    assert authority.refreshes == 2
+    assert manager.get("owner", "Twitter")['status'] == STATUS_OK
+
+
+def test_invalid_grant_marks_connection_revoked(manager, authority, clock):
+    manager.store("owner", "Twitter", {"access_token": "gone", "refresh_token": "unknown", "expires_in": 60})
+    manager.run_once()
+
+    record = manager.get("owner", "Twitter")
+    assert record['status'] == STATUS_REVOKED
+    assert record['error'] == "invalid_grant"
+
+    clock.now += LIFETIME
+    manager.run_once()
+    assert manager.stats['refresh_failures'] == 1
+
+
+def test_rejected_token_without_refresh_token(manager, authority, clock):
+    manager.store("owner", "Twitter", {"access_token": "forged"})
+    manager.run_once()
+
+    record = manager.get("owner", "Twitter")
+    assert record['status'] == STATUS_REJECTED
+    assert record['error'] == "HTTP 401"
+
+
+def test_health_check_records_the_user(manager, authority, clock):
+    manager.store("owner", "Twitter", authority.issue())
+    manager.run_once()
+    assert manager.get("owner", "Twitter")['user']['name'] == "Stub Bakery"
+
+    manager.run_once()
+    clock.now += manager.health_interval
+    manager.run_once()
+    assert authority.checks == 2
+
+
+def test_idle_owner_is_unloaded_then_loaded_on_use(manager, authority, clock):
+    manager.store("idle", "Twitter", authority.issue())
+    manager.store("active", "Twitter", authority.issue())
+    manager.run_once()
+
+    clock.now += manager.idle_after - manager.health_interval
+    manager.get("active", "Twitter")
+    clock.now += manager.health_interval
+    manager.run_once()
+    # Both tokens are past expiry; only the active owner's is refreshed
+    assert list(manager._records) == [("active", "Twitter")]
+    assert authority.refreshes == 1
+
+    # Coming back loads the record and brings it into the worker's passes again
+    assert manager.get("idle", "Twitter")['status'] == STATUS_OK
+    clock.now += LIFETIME
+    manager.run_once()
+    assert manager.get("idle", "Twitter")['expires_at'] > clock.now
+
+
+def test_unused_records_are_deleted_after_retention(manager, authority, clock, client, tmp_path):
+    manager.store("gone", "Twitter", authority.issue())
+    clock.now += manager.retention + 1
+    manager.store("kept", "Twitter", authority.issue())
+    manager.run_once()
+
+    assert manager.get("gone", "Twitter") is None
+    assert manager.get("kept", "Twitter") is not None
+    assert manager.stats['deleted'] == 1
+
+    # A new manager on the same file only loads owners seen recently
+    again = TokenManager(client, authority.platforms, str(tmp_path / "tokens.sqlite3"), clock=clock)
+    try:
+        assert list(again._records) == [("kept", "Twitter")]
+    finally:
+        again.close()
+
+
+def test_expired_token_gives_no_publish_credentials(manager, authority, clock):
+    manager.store("owner", "Twitter", authority.issue())
+    assert manager.publish_credentials("owner", "Twitter")['access_token']
+
+    clock.now += LIFETIME
+    assert manager.publish_credentials("owner", "Twitter") is None
+    manager.run_once()
+    assert manager.publish_credentials("owner", "Twitter")['access_token']